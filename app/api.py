@@ -0,0 +1,246 @@
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from app import jobs
+from app.batch import batch_results, batch_status, get_batch
+from app.db import get_case, list_cases_page
+from app.metrics import IDEMPOTENT_REPLAYS, request_served, request_usage
+from app.pipeline import run_pass_a, run_pass_b
+from app.results import friendly_error, job_output, manual_campaign, pass_a_output, stored_result
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is ~5x slower on large results
+    orjson = None
+
+# Versioned JSON API for machine clients: the same data as the HTML pages, without
+# rendering. Every endpoint takes `fields`, a comma-separated list of dotted paths
+# from the response root to keep, e.g. fields=headline,dm.decision_type or
+# fields=cases.id,cases.objective,next_cursor. The heavy `brief`, `brief_text` and
+# `decision_map_json` values are only sent when asked for (or with no `fields`).
+
+router = APIRouter(prefix="/api/v1")
+
+MAX_PAGE_SIZE = 200
+
+class APIResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _error(message: str, status_code: int) -> APIResponse:
+    return APIResponse({"error": message}, status_code=status_code)
+
+# -- projection -------------------------------------------------------------------
+
+Projection = Optional[Dict[str, Any]]
+
+def parse_fields(fields: str) -> Projection:
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}; None keeps everything."""
+    paths = [p.strip() for p in (fields or "").split(",") if p.strip()]
+    if not paths:
+        return None
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        for key in path.split("."):
+            node = node.setdefault(key, {})
+    return tree
+
+def project(value: Any, tree: Projection) -> Any:
+    # A leaf ({}) keeps the whole value; lists are projected item by item.
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(v, tree) for v in value]
+    if isinstance(value, dict):
+        return {k: project(value[k], sub) for k, sub in tree.items() if k in value}
+    return value
+
+def wants(tree: Projection, key: str) -> bool:
+    return tree is None or key in tree
+
+# -- generation ---------------------------------------------------------------------
+
+@router.post("/generate")
+async def api_generate(request: Request, fields: str = ""):
+    """
+    Body: a JSON object with the campaign fields, keyed like the form
+    (`category`, `audience_logic`, ...) or like the template (`Category`, ...).
+    Pass B only runs when `brief` is requested. With `Prefer: respond-async`
+    the generation is queued and the answer is 202 with a job id. A repeat with
+    the same `Idempotency-Key` gets the first submission's answer back.
+    """
+    from app import dedup  # off the startup path, like app.facets
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error("Body must be a JSON object.", 400)
+    if not isinstance(body, dict):
+        return _error("Body must be a JSON object.", 400)
+    tree = parse_fields(fields)
+    try:
+        idempotency_key = dedup.idempotency_key(request.headers)
+        campaign = manual_campaign({str(k).lower(): v if isinstance(v, str) else "" for k, v in body.items()})
+    except ValueError as e:
+        return _error(str(e), 400)
+    input_used = {"source": "api", "campaign": campaign}
+
+    request_hash = dedup.request_hash(campaign)
+    try:
+        stored = await dedup.reserve(idempotency_key, request_hash) if idempotency_key else None
+    except dedup.IdempotencyConflict as e:
+        return _error(str(e), e.status)
+    held = idempotency_key is not None and stored is None
+    try:
+        if stored is not None:
+            IDEMPOTENT_REPLAYS.inc()
+            if "job_id" in stored:
+                return _job_accepted(stored["job_id"], dedup.REPLAYED)
+        elif "respond-async" in request.headers.get("prefer", ""):
+            job_id = await jobs.enqueue(campaign, input_used)
+            if held:
+                await dedup.remember(idempotency_key, request_hash, job_id=job_id)
+                held = False
+            return _job_accepted(job_id)
+
+        try:
+            if stored is not None:
+                result = stored["result"]
+                decision_map_json, brief, input_used = result["decision_map_json"], result["brief"], result["input_used"]
+                dm = json.loads(decision_map_json)
+                served = dict(result.get("served") or {})
+            else:
+                dm, decision_map_json = await run_pass_a(campaign)
+                brief, served = None, {}
+            # Stored without a brief when the first request did not ask for one.
+            if brief is None and wants(tree, "brief"):
+                brief = await run_pass_b(decision_map_json)
+        except Exception as e:
+            return _error(friendly_error(e), 502)
+        served.update(request_served())
+        if held:
+            await dedup.remember(idempotency_key, request_hash, stored_result(decision_map_json, brief, input_used, served))
+            held = False
+    finally:
+        # A failed first submission gives its key back for the retry.
+        if held:
+            await dedup.release(idempotency_key, request_hash)
+
+    output = pass_a_output(dm, decision_map_json, served)
+    if brief is not None:
+        output["brief"] = brief
+    output["input_used"] = input_used
+    output["usage"] = request_usage()
+    return APIResponse(project(output, tree), headers=dedup.REPLAYED if stored is not None else None)
+
+def _job_accepted(job_id: str, headers: Optional[Dict[str, str]] = None) -> APIResponse:
+    return APIResponse(
+        {"job_id": job_id, "status": "queued", "status_url": f"/api/v1/jobs/{job_id}"},
+        status_code=202,
+        headers={"Location": f"/api/v1/jobs/{job_id}", **(headers or {})},
+    )
+
+@router.get("/jobs/{job_id}")
+async def api_job(job_id: str, fields: str = ""):
+    job = await jobs.get(job_id)
+    if job is None:
+        return _error("Unknown job.", 404)
+    return APIResponse(project(job_output(job), parse_fields(fields)))
+
+@router.get("/batches/{batch_id}")
+def api_batch(batch_id: str, fields: str = ""):
+    batch = get_batch(batch_id)
+    if batch is None:
+        return _error("Unknown batch.", 404)
+    body = batch_status(batch)
+    tree = parse_fields(fields)
+    if batch["status"] == "done" and wants(tree, "results"):
+        body["results"] = batch_results(batch)
+    return APIResponse(project(body, tree))
+
+# -- library ------------------------------------------------------------------------
+
+@router.get("/cases")
+def api_cases(
+    q: str = "",
+    category: str = "",
+    market: str = "",
+    decision_type: str = "",
+    primary_tension: str = "",
+    decision_window: str = "",
+    channel: str = "",
+    cursor: str = "",
+    limit: int = 50,
+    fields: str = "",
+):
+    """Newest first, or ranked with snippets for `q`; keyset-paged like /library: pass `next_cursor` back as `cursor`."""
+    filters = {
+        "q": q.strip() or None,
+        "category": category.strip() or None,
+        "market": market.strip() or None,
+        "decision_type": decision_type.strip() or None,
+        "primary_tension": primary_tension.strip() or None,
+        "decision_window": decision_window.strip() or None,
+        "channel": channel.strip() or None,
+    }
+    tree = parse_fields(fields)
+    try:
+        cases, next_cursor = list_cases_page(limit=max(1, min(limit, MAX_PAGE_SIZE)), cursor=cursor or None, **filters)
+    except ValueError:
+        return _error("Invalid cursor.", 400)
+    body: Dict[str, Any] = {"cases": cases, "next_cursor": next_cursor}
+    # Totals and facets come from the in-memory facet index; skipped unless asked for.
+    if wants(tree, "total") or wants(tree, "facets"):
+        from app.facets import library_summary  # numpy stays off the startup path
+        summary = library_summary(**filters)
+        body["total"] = summary["total"]
+        body["facets"] = {f: [{"value": v, "count": n} for v, n in counts] for f, counts in summary["facets"].items()}
+    return APIResponse(project(body, tree))
+
+@router.get("/cases/{case_id}")
+def api_case(case_id: int, fields: str = ""):
+    # Columns as stored, the same shape as a line of the JSONL export.
+    case = get_case(case_id)
+    if case is None:
+        return _error("Unknown case.", 404)
+    return APIResponse(project(case, parse_fields(fields)))
+
+@router.get("/cases/{case_id}/similar")
+def api_similar_to_case(case_id: int, top_k: int = 3, fields: str = ""):
+    case = get_case(case_id)
+    if case is None:
+        return _error("Unknown case.", 404)
+    try:
+        campaign = json.loads(case["input_json"]).get("campaign") or {}
+    except (ValueError, AttributeError):
+        campaign = {}
+    if not campaign:
+        campaign = {"Category": case["category"], "Market": case["market"], "Channels": case["channels"],
+                    "Objective": case["objective"]}
+    return _similar(campaign, top_k, fields, exclude=case_id)
+
+@router.post("/similar")
+async def api_similar(request: Request, top_k: int = 3, fields: str = ""):
+    """Body: a campaign object, keyed like the template (`Category`, `Channels`, ...)."""
+    try:
+        campaign = await request.json()
+    except ValueError:
+        return _error("Body must be a JSON object.", 400)
+    if not isinstance(campaign, dict):
+        return _error("Body must be a JSON object.", 400)
+    return await run_in_threadpool(_similar, campaign, top_k, fields)
+
+def _similar(campaign: Dict[str, Any], top_k: int, fields: str, exclude: Optional[int] = None) -> APIResponse:
+    from app.retrieval import find_similar_cases
+    top_k = max(1, min(top_k, 50))
+    cases = find_similar_cases(campaign, top_k=top_k + (exclude is not None))
+    cases = [c for c in cases if c["id"] != exclude][:top_k]
+    return APIResponse(project({"cases": cases}, parse_fields(fields)))
@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+# Static files and compressed responses.
+#
+# Templates link assets through asset_url("styles.css") -> /static/styles.<hash>.css.
+# The hash changes with the content, so those URLs are cached for a year as
+# immutable; a deploy changes the URL rather than waiting for caches to expire.
+# Every file is compressed once (gzip, and brotli when installed) the first time
+# the asset table is built, and served in the best encoding the client accepts.
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unfingerprinted or stale-hash URLs: usable, but always revalidated.
+REVALIDATE = "public, no-cache"
+
+HASH_LEN = 10
+
+COMPRESSIBLE_TYPES = ("application/javascript", "application/json", "image/svg+xml")
+
+class Asset(NamedTuple):
+    name: str
+    digest: str
+    media_type: str
+    # encoding ("identity", "br", "gzip") -> body; only encodings that are smaller are kept
+    bodies: Dict[str, bytes]
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    bodies = {"identity": data}
+    variants = [("gzip", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", brotli.compress(data, quality=11)))
+    for encoding, body in variants:
+        if len(body) < len(data):
+            bodies[encoding] = body
+    return bodies
+
+def _fingerprinted(name: str, digest: str) -> str:
+    # styles.css -> styles.<digest>.css; extensionless names just get the suffix.
+    stem, dot, ext = name.rpartition(".")
+    return f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+_assets: Optional[Dict[str, Asset]] = None
+_lock = threading.Lock()
+
+def _build(directory: Path) -> Dict[str, Asset]:
+    assets: Dict[str, Asset] = {}
+    for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+        name = path.relative_to(directory).as_posix()
+        data = path.read_bytes()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if media_type.startswith("text/"):
+            media_type += "; charset=utf-8"
+        # Images and fonts are compressed formats already.
+        compressible = media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+        bodies = _compress(data) if compressible else {"identity": data}
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+        assets[name] = Asset(name, digest, media_type, bodies)
+    return assets
+
+def load_assets() -> Dict[str, Asset]:
+    """The asset table, built on first use (warm-up builds it at startup)."""
+    global _assets
+    if _assets is None:
+        with _lock:
+            if _assets is None:
+                _assets = _build(STATIC_DIR)
+    return _assets
+
+def asset_url(name: str) -> str:
+    asset = load_assets().get(name)
+    if asset is None:
+        return f"/static/{name}"
+    return "/static/" + _fingerprinted(name, asset.digest)
+
+def _resolve(path: str) -> Tuple[Optional[Asset], bool]:
+    """(asset, fingerprint matched) for a request path under /static."""
+    assets = load_assets()
+    if path in assets:
+        return assets[path], False
+    # The inverse of _fingerprinted. A stale digest still gets the current file.
+    head, dot, ext = path.rpartition(".")
+    stem, _, digest = head.rpartition(".")
+    candidates = [(f"{stem}.{ext}", digest)] if dot and stem else []
+    if dot:
+        candidates.append((head, ext))
+    for name, digest in candidates:
+        asset = assets.get(name)
+        if asset is not None:
+            return asset, asset.digest == digest
+    return None, False
+
+def accepted_encodings(headers: List[Tuple[bytes, bytes]]) -> List[str]:
+    """Encodings from Accept-Encoding in server preference order (br, gzip); q=0 excluded."""
+    value = ""
+    for k, v in headers:
+        if k == b"accept-encoding":
+            value += v.decode("latin-1") + ","
+    offered = set()
+    for part in value.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if token and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            offered.add(token.strip())
+    return [e for e in ("br", "gzip") if e in offered or "*" in offered]
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for k, v in headers:
+        if k == name:
+            return v.decode("latin-1")
+    return None
+
+class StaticAssets:
+    """
+    ASGI app for /static: fingerprinted URLs, precompressed bodies, ETag revalidation.
+    Replaces StaticFiles; everything it serves comes from the in-memory asset table.
+    """
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        method = scope.get("method", "GET")
+        # Under a Mount, root_path ends with "/static" and path still includes it.
+        path, root = scope["path"], scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root):]
+        asset, immutable = _resolve(path.lstrip("/"))
+        if method not in ("GET", "HEAD") or asset is None:
+            status = 405 if asset is not None else 404
+            await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Method Not Allowed" if status == 405 else b"Not Found"})
+            return
+
+        request_headers = scope.get("headers") or []
+        encoding = next((e for e in accepted_encodings(request_headers) if e in asset.bodies), "identity")
+        body = asset.bodies[encoding]
+        etag = f'"{asset.digest}-{encoding}"'
+        headers = [
+            (b"content-type", asset.media_type.encode("latin-1")),
+            (b"cache-control", (IMMUTABLE if immutable else REVALIDATE).encode("latin-1")),
+            (b"etag", etag.encode("latin-1")),
+        ]
+        if len(asset.bodies) > 1:
+            headers.append((b"vary", b"Accept-Encoding"))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+
+        if etag in (_header(request_headers, b"if-none-match") or ""):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body if method == "GET" else b""})
+
+# -- dynamic responses -----------------------------------------------------------
+
+# HTML pages and the JSON API; downloads (xlsx, gzip exports) are compressed already.
+COMPRESSED_RESPONSE_TYPES = ("text/html", "application/json")
+
+def compress_min_bytes() -> int:
+    return int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+def _compress_response(encoding: str, body: bytes) -> bytes:
+    # Per response, so favour speed: brotli 5 still beats gzip 9 on these pages.
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+class CompressMiddleware:
+    """
+    Compresses HTML and JSON responses of at least COMPRESS_MIN_BYTES with br or
+    gzip. Only single-message bodies are touched: streamed responses (SSE, exports)
+    pass through as they are, as does anything already encoded.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = [e for e in accepted_encodings(scope.get("headers") or []) if e != "br" or brotli is not None]
+        if not encodings:
+            await self.app(scope, receive, send)
+            return
+
+        start: Dict[str, Any] = {}
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = message.get("headers") or []
+                content_type = _header(headers, b"content-type") or ""
+                if content_type.startswith(COMPRESSED_RESPONSE_TYPES) and _header(headers, b"content-encoding") is None:
+                    # Hold the start until we know whether the body is worth compressing.
+                    start = message
+                    return
+                await send(message)
+                return
+            if not start:
+                await send(message)
+                return
+
+            held, start = start, {}
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < compress_min_bytes():
+                await send(held)
+                await send(message)
+                return
+            encoding = encodings[0]
+            body = _compress_response(encoding, body)
+            headers = [(k, v) for k, v in held.get("headers") or [] if k != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**held, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.llm_router import answered_by
+from app.metrics import request_served, usage_scope
+from app.pipeline import run_pass_a, run_pass_b
+
+# Batches live in process memory: a workbook is a one-off planner upload, and the
+# results workbook is downloaded as soon as it is ready. Only the most recent
+# batches are kept around.
+MAX_BATCHES = int(os.getenv("BATCH_MAX_KEPT", "50"))
+
+_batches: Dict[str, Dict[str, Any]] = {}
+
+def _concurrency() -> int:
+    return max(1, int(os.getenv("BATCH_CONCURRENCY", "4")))
+
+def _prune() -> None:
+    finished = [b for b in _batches.values() if b["status"] == "done"]
+    finished.sort(key=lambda b: b["finished_at"] or 0)
+    while len(_batches) > MAX_BATCHES and finished:
+        _batches.pop(finished.pop(0)["id"], None)
+
+async def _run_one(campaign: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(campaign)
+    # Its own scope: the batch task was started from the upload request's context.
+    with usage_scope():
+        try:
+            dm, decision_map_json = await run_pass_a(campaign)
+            result["decision_type"] = dm.get("decision_type", "")
+            result["primary_tension"] = dm.get("primary_tension", "")
+            result["decision_window"] = dm.get("decision_window", "")
+            result["brief"] = await run_pass_b(decision_map_json)
+            result["provider"] = answered_by(request_served())
+        except Exception as e:
+            result["error"] = str(e)
+    return result
+
+async def _run(batch: Dict[str, Any], campaigns: List[Dict[str, Any]]) -> None:
+    sem = asyncio.Semaphore(_concurrency())
+    batch["status"] = "running"
+
+    async def worker(i: int, campaign: Dict[str, Any]) -> None:
+        async with sem:
+            result = await _run_one(campaign)
+        batch["results"][i] = result
+        batch["completed"] += 1
+        if result.get("error"):
+            batch["failed"] += 1
+
+    await asyncio.gather(*(worker(i, c) for i, c in enumerate(campaigns)))
+    batch["status"] = "done"
+    batch["finished_at"] = time.time()
+
+def start_batch(campaigns: List[Dict[str, Any]]) -> str:
+    batch_id = uuid.uuid4().hex
+    batch = {
+        "id": batch_id,
+        "status": "queued",
+        "total": len(campaigns),
+        "completed": 0,
+        "failed": 0,
+        "created_at": time.time(),
+        "finished_at": None,
+        "results": [None] * len(campaigns),
+    }
+    _batches[batch_id] = batch
+    _prune()
+    # Keep a reference to the task so it is not garbage-collected mid-run.
+    batch["_task"] = asyncio.get_running_loop().create_task(_run(batch, campaigns))
+    return batch_id
+
+def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    return _batches.get(batch_id)
+
+def batch_status(batch: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": batch["id"],
+        "status": batch["status"],
+        "total": batch["total"],
+        "completed": batch["completed"],
+        "failed": batch["failed"],
+        "progress": (batch["completed"] / batch["total"]) if batch["total"] else 1.0,
+    }
+
+def batch_results(batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [r for r in batch["results"] if r is not None]
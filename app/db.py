@@ -1,8 +1,16 @@
+import base64
+import hashlib
 import os
+import re
 import sqlite3
 import json
+import threading
+import zlib
+from collections import Counter
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from app.metrics import timed_db
 
 DEFAULT_DB_PATH = os.getenv("BCE_DB_PATH", "/tmp/bce_case_library.sqlite3")
 
@@ -26,30 +34,611 @@ CREATE INDEX IF NOT EXISTS idx_cases_created_at ON cases(created_at);
 CREATE INDEX IF NOT EXISTS idx_cases_core ON cases(category, market, decision_type, decision_window);
 """
 
-def _connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+# Full-text index over the searchable text of a case. It is an external-content
+# table: the text itself stays in the library (read back through the view for
+# snippets), FTS5 only stores the inverted index. Rows are added by insert_case
+# and import_jsonl via _index_fts, and the view is what 'rebuild' backfills from.
+# _migrate_payloads later points the view at cases_full (FTS_SOURCE_SQL).
+FTS_COLUMNS = [
+    "objective",
+    "channels",
+    "brief_text",
+    "decision_being_influenced",
+    "tradeoff",
+    "decision_type",
+    "primary_tension",
+    "decision_window",
+]
+
+# bm25() column weights, same order as FTS_COLUMNS.
+FTS_WEIGHTS = [5.0, 2.0, 1.0, 4.0, 2.0, 2.0, 2.0, 2.0]
+
+FTS_SCHEMA_SQL = """
+CREATE VIEW IF NOT EXISTS cases_fts_source AS
+SELECT
+  id,
+  objective,
+  channels,
+  brief_text,
+  CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_being_influenced') END AS decision_being_influenced,
+  CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.behavioral_tension.tradeoff') END AS tradeoff,
+  COALESCE(NULLIF(decision_type, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_type') END) AS decision_type,
+  COALESCE(NULLIF(primary_tension, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.primary_tension') END) AS primary_tension,
+  COALESCE(NULLIF(decision_window, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_window') END) AS decision_window
+FROM cases;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS cases_fts USING fts5(
+  objective, channels, brief_text, decision_being_influenced, tradeoff,
+  decision_type, primary_tension, decision_window,
+  content='cases_fts_source', content_rowid='id',
+  tokenize='porter unicode61'
+);
+"""
+
+def _has_fts5(conn: sqlite3.Connection) -> bool:
+    opts = {r[0] for r in conn.execute("PRAGMA compile_options").fetchall()}
+    return "ENABLE_FTS5" in opts
+
+def _migrate_fts(conn: sqlite3.Connection) -> None:
+    if not _has_fts5(conn):
+        return
+    conn.executescript(FTS_SCHEMA_SQL)
+    conn.execute("INSERT INTO cases_fts(cases_fts) VALUES('rebuild')")
+
+def _migrate_keyset_index(conn: sqlite3.Connection) -> None:
+    # Listing order is (created_at, id); normalise timestamps so text order is time order.
+    conn.execute(
+        """
+        UPDATE cases SET created_at = COALESCE(datetime(created_at), datetime('now'))
+        WHERE created_at IS NOT datetime(created_at)
+        """
+    )
+    # Every SQLite index ends with the rowid, so idx_cases_created_at already orders
+    # by (created_at, id). These give filtered listings the same ordered range scan.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_category_created ON cases(category, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_market_created ON cases(market, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_dtype_created ON cases(decision_type, created_at)")
+    conn.execute("ANALYZE")
+
+CHANNELS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS case_channels (
+  case_id INTEGER NOT NULL REFERENCES cases(id),
+  channel TEXT NOT NULL,
+  PRIMARY KEY (channel, case_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_case_channels_case ON case_channels(case_id, channel);
+"""
+
+def _migrate_case_channels(conn: sqlite3.Connection) -> None:
+    conn.executescript(CHANNELS_SCHEMA_SQL)
+    cur = conn.execute("SELECT id, channels FROM cases ORDER BY id")
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT OR IGNORE INTO case_channels (case_id, channel) VALUES (?, ?)",
+            [(r[0], ch) for r in rows for ch in normalize_channels(r[1])],
+        )
+
+def content_hash(input_json: str, decision_map_json: str) -> str:
+    # Identity of a case for dedup: the exact input and decision map it was generated from.
+    h = hashlib.sha256(input_json.encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(decision_map_json.encode("utf-8"))
+    return h.hexdigest()
+
+def _migrate_content_hash(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE cases ADD COLUMN content_hash TEXT")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, input_json, decision_map_json FROM cases WHERE id > ? ORDER BY id LIMIT 5000",
+            (last_id,),
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE cases SET content_hash = ? WHERE id = ?",
+            [(content_hash(r[1], r[2]), r[0]) for r in rows],
+        )
+        last_id = rows[-1][0]
+    # Not unique: the library may already hold repeats, and a regenerated brief is
+    # a legitimate new case. Only imports skip rows whose hash is already present.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_content_hash ON cases(content_hash)")
+
+# Queued generations (app.jobs). Times are epoch seconds, like the batch records.
+# A running job holds a lease its worker keeps renewing; a lease that runs out
+# means the process died, and the job goes back to the queue.
+JOBS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS jobs (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL DEFAULT 'queued',
+  input_json TEXT NOT NULL,
+  decision_map_json TEXT,
+  brief_text TEXT,
+  usage_json TEXT,
+  error TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  created_at REAL NOT NULL,
+  available_at REAL NOT NULL,
+  lease_until REAL,
+  finished_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_lease ON jobs(status, lease_until);
+"""
+
+def _migrate_jobs(conn: sqlite3.Connection) -> None:
+    conn.executescript(JOBS_SCHEMA_SQL)
+
+# The large per-case text (input, decision map, brief) lives in case_payloads,
+# out of the listing rows: list, count and facet scans read small `cases` pages,
+# and only a case detail, the export and the text indexes pay for the payload.
+# A payload row is raw (codec 0) or zlib-compressed with the preset dictionary
+# whose id is its codec. Dictionary 1 comes from the migration; compact_payloads()
+# trains newer ones on the library and rewrites old rows. bce_unpack(codec, value),
+# registered on every connection, decodes in SQL, and cases_full is `cases` with
+# the text joined back: readers that need the text select from it.
+#
+#   BCE_PAYLOAD_COMPRESSION   compress new payloads (default 0)
+#
+# Compression is opt-in: it makes the file 3-5x smaller, but every import pays
+# for deflate and every export and case detail for inflate. Rows of either kind
+# stay readable whatever the setting.
+#
+# The migration drops the old payload columns from `cases` once every case's
+# text is verified in case_payloads, in the same transaction, and the file is
+# VACUUMed right after (_run_migrations). A library migrated
+# by an earlier build still has them (new rows leave them empty): run
+# drop_legacy_payload_columns(), or scripts/compact_library.py --drop-legacy-columns.
+# The database download (export_db_bytes) is written back in the old layout,
+# readable by any SQLite.
+PAYLOAD_COLUMNS = ("input_json", "decision_map_json", "brief_text")
+
+PAYLOADS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS case_payloads (
+  case_id INTEGER PRIMARY KEY REFERENCES cases(id),
+  codec INTEGER NOT NULL DEFAULT 0,
+  input_json BLOB NOT NULL,
+  decision_map_json BLOB NOT NULL,
+  brief_text BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS payload_dicts (
+  id INTEGER PRIMARY KEY,
+  zdict BLOB NOT NULL,
+  created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+# Same columns, in the same order, as `cases` had before the payloads moved out.
+CASES_FULL_SQL = """
+CREATE VIEW IF NOT EXISTS cases_full AS
+SELECT
+  c.id, c.created_at, c.category, c.market, c.channels, c.objective,
+  c.decision_type, c.primary_tension, c.decision_window,
+  bce_unpack(p.codec, p.input_json) AS input_json,
+  bce_unpack(p.codec, p.decision_map_json) AS decision_map_json,
+  bce_unpack(p.codec, p.brief_text) AS brief_text,
+  c.content_hash
+FROM cases c JOIN case_payloads p ON p.case_id = c.id
+"""
+
+FTS_SOURCE_SQL = """
+CREATE VIEW IF NOT EXISTS cases_fts_source AS
+SELECT
+  id,
+  objective,
+  channels,
+  brief_text,
+  CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_being_influenced') END AS decision_being_influenced,
+  CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.behavioral_tension.tradeoff') END AS tradeoff,
+  COALESCE(NULLIF(decision_type, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_type') END) AS decision_type,
+  COALESCE(NULLIF(primary_tension, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.primary_tension') END) AS primary_tension,
+  COALESCE(NULLIF(decision_window, ''), CASE WHEN json_valid(decision_map_json) THEN json_extract(decision_map_json, '$.decision_window') END) AS decision_window
+FROM cases_full
+"""
+
+# {columns}/{values}: the old payload columns of a library an earlier build
+# migrated without dropping them. They are NOT NULL, so new rows write them empty.
+CASE_INSERT_SQL = """
+INSERT INTO cases (
+  category, market, channels, objective,
+  decision_type, primary_tension, decision_window, content_hash{columns}
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?{values})
+"""
+
+def _cases_insert_sql(sql: str, db_path: str) -> str:
+    if db_path in _legacy_paths:
+        return sql.format(columns=", " + ", ".join(PAYLOAD_COLUMNS), values=", ''" * len(PAYLOAD_COLUMNS))
+    return sql.format(columns="", values="")
+
+PAYLOAD_INSERT_SQL = (
+    "INSERT INTO case_payloads (case_id, codec, input_json, decision_map_json, brief_text) VALUES (?, ?, ?, ?, ?)"
+)
+
+# zlib looks back at most 32 KiB, so a longer dictionary is never used.
+PAYLOAD_DICT_BYTES = 32 * 1024
+# Cases sampled to train a dictionary, and the fewest worth training on.
+PAYLOAD_DICT_SAMPLE = 500
+PAYLOAD_DICT_MIN_CASES = 50
+# Level 9 gains nothing measurable over 6 once the dictionary is in.
+PAYLOAD_ZLIB_LEVEL = 6
+
+def payload_compression() -> bool:
+    return (os.getenv("BCE_PAYLOAD_COMPRESSION") or "0").strip().lower() in ("1", "true", "on", "yes")
+
+_WORD_RE = re.compile(r"\s*\S+")
+
+def train_zdict(samples: Iterable[str], size: int = PAYLOAD_DICT_BYTES) -> bytes:
+    """
+    A zlib preset dictionary for texts like `samples`: the word runs that recur
+    across most of them (JSON keys and enum values, brief headings, stock
+    phrases), scored by how many samples contain them times their length.
+    """
+    df: Counter = Counter()
+    n = 0
+    for text in samples:
+        n += 1
+        words = _WORD_RE.findall(text)
+        grams = set(words)
+        for k in (2, 4, 8):
+            grams.update("".join(words[i:i + k]) for i in range(len(words) - k + 1))
+        df.update(grams)
+    min_df = max(2, n // 50)
+    candidates = sorted(
+        ((count * len(gram.encode("utf-8")), gram) for gram, count in df.items() if count >= min_df),
+        reverse=True,
+    )
+    picked: List[str] = []
+    used = 0
+    for _, gram in candidates:
+        data = gram.encode("utf-8")
+        if used + len(data) > size:
+            continue
+        if any(gram in p for p in picked):
+            continue
+        picked.append(gram)
+        used += len(data)
+        if used >= size - 8:
+            break
+    # zlib reaches the end of the dictionary with the shortest distances: most useful last.
+    return "".join(reversed(picked)).encode("utf-8")
+
+def _primed(zdict: bytes) -> Any:
+    # Loading a 32 KiB dictionary costs more than compressing a brief, so it is
+    # loaded once and every payload is compressed by a copy of this object.
+    return zlib.compressobj(PAYLOAD_ZLIB_LEVEL, zdict=zdict) if zdict else zlib.compressobj(PAYLOAD_ZLIB_LEVEL)
+
+def _pack(texts: Iterable[str], primed: Any) -> List[Union[str, bytes]]:
+    # primed None stores the text as it is (codec 0).
+    if primed is None:
+        return list(texts)
+    out: List[Union[str, bytes]] = []
+    for text in texts:
+        c = primed.copy()
+        out.append(c.compress(text.encode("utf-8")) + c.flush())
+    return out
+
+# (db_path, dictionary id) -> dictionary; dictionaries are never changed or deleted.
+# init_db loads them all, so _zdict only goes to the database for one that
+# compact_payloads added from another process since.
+_zdicts: Dict[Tuple[str, int], bytes] = {}
+# db_path -> the dictionary new payloads are compressed with (newest at init or compaction).
+_active_codec: Dict[str, int] = {}
+_compressors: Dict[Tuple[str, int], Any] = {}
+# Same for reading: a decompressor with the dictionary loaded, copied per payload.
+_decompressors: Dict[Tuple[str, int], Any] = {}
+
+def _load_zdicts(conn: sqlite3.Connection, db_path: str) -> None:
+    for codec, zdict in conn.execute("SELECT id, zdict FROM payload_dicts").fetchall():
+        _zdicts[(db_path, codec)] = bytes(zdict)
+
+def _zdict(db_path: str, codec: int) -> bytes:
+    zdict = _zdicts.get((db_path, codec))
+    if zdict is None:
+        # Own connection: this can run inside bce_unpack, mid-statement on the caller's one.
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT zdict FROM payload_dicts WHERE id = ?", (codec,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise ValueError(f"unknown payload codec {codec}")
+        zdict = _zdicts[(db_path, codec)] = bytes(row[0])
+    return zdict
+
+def _packer(db_path: str) -> Tuple[int, Any]:
+    # (codec, _pack's compressor) for new payloads of db_path.
+    codec = _active_codec.get(db_path, 0) if payload_compression() else 0
+    if not codec:
+        return 0, None
+    primed = _compressors.get((db_path, codec))
+    if primed is None:
+        primed = _compressors[(db_path, codec)] = _primed(_zdict(db_path, codec))
+    return codec, primed
+
+def _inflate(primed: Any, value: bytes) -> str:
+    d = primed.copy()
+    return (d.decompress(value) + d.flush()).decode("utf-8")
+
+def _unpack(db_path: str, codec: int, value: Any) -> Any:
+    # A payload column as stored -> its text. Raw rows (codec 0) come back as they are.
+    if not codec or value is None:
+        return value
+    primed = _decompressors.get((db_path, codec))
+    if primed is None:
+        zdict = _zdict(db_path, codec)
+        primed = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        _decompressors[(db_path, codec)] = primed
+    return _inflate(primed, value)
+
+class _Unpacker:
+    """bce_unpack(codec, value) for one connection's SQL."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        # cases_fts_source reads the decision map once per extracted field: keep the last one.
+        self.last: Tuple[Any, Any, Optional[str]] = (None, None, None)
+
+    def __call__(self, codec: int, value: Any) -> Any:
+        if not codec or value is None:
+            return value
+        if self.last[0] == codec and self.last[1] == value:
+            return self.last[2]
+        text = _unpack(self.db_path, codec, value)
+        self.last = (codec, value, text)
+        return text
+
+def _migrate_payloads(conn: sqlite3.Connection) -> None:
+    conn.executescript(PAYLOADS_SCHEMA_SQL)
+    # Dictionary 1 is trained on the library being migrated, or plain zlib (empty) for a new one.
+    samples = conn.execute(
+        f"SELECT {', '.join(PAYLOAD_COLUMNS)} FROM cases ORDER BY id DESC LIMIT ?", (PAYLOAD_DICT_SAMPLE,)
+    ).fetchall()
+    zdict = train_zdict(t for r in samples for t in r) if len(samples) >= PAYLOAD_DICT_MIN_CASES else b""
+    conn.execute("INSERT OR REPLACE INTO payload_dicts (id, zdict) VALUES (1, ?)", (zdict,))
+    codec = 1 if payload_compression() else 0
+    primed = _primed(zdict) if codec else None
+    unpacker = (zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()) if codec else None
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {', '.join(PAYLOAD_COLUMNS)} FROM cases WHERE id > ? ORDER BY id LIMIT 2000",
+            (last_id,),
+        ).fetchall()
+        if not rows:
+            break
+        packed = [(r[0], codec, *_pack(r[1:], primed)) for r in rows]
+        # Read back before the source columns go: what was compressed must inflate to what was there.
+        for r, p in zip(rows, packed) if unpacker else ():
+            if [_inflate(unpacker, v) for v in p[2:]] != list(r[1:]):
+                raise ValueError(f"case {r[0]}: payload does not round-trip; not moving it")
+        conn.executemany(PAYLOAD_INSERT_SQL, packed)
+        last_id = rows[-1][0]
+    missing = conn.execute(
+        "SELECT COUNT(*) FROM cases c WHERE NOT EXISTS (SELECT 1 FROM case_payloads p WHERE p.case_id = c.id)"
+    ).fetchone()[0]
+    if missing:
+        raise ValueError(f"{missing} cases have no payload row; not dropping their text")
+    # Every case has its text in case_payloads now: the copies in `cases` go in
+    # the same transaction, so the library never holds the text twice.
+    _rebuild_payload_views(conn, drop_columns=True)
+
+def _rebuild_payload_views(conn: sqlite3.Connection, drop_columns: bool) -> None:
+    # The FTS view reads the payload columns, so it goes first and comes back over cases_full.
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cases_fts_source'").fetchone()
+    conn.execute("DROP VIEW IF EXISTS cases_fts_source")
+    if drop_columns:
+        for column in PAYLOAD_COLUMNS:
+            conn.execute(f"ALTER TABLE cases DROP COLUMN {column}")
+    conn.execute(CASES_FULL_SQL)
+    if has_fts:
+        conn.execute(FTS_SOURCE_SQL)
+
+def _legacy_payload_columns(conn: sqlite3.Connection) -> bool:
+    # Whether `cases` still has the payload columns (a library an earlier build migrated).
+    return any(r[1] == "brief_text" for r in conn.execute("PRAGMA table_info(cases)").fetchall())
+
+# Idempotency-Key -> what its first submission produced (app.dedup): the queued
+# job's id, or the finished result as JSON; both NULL while it is still being
+# generated. Times are epoch seconds.
+IDEMPOTENCY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key TEXT PRIMARY KEY,
+  request_hash TEXT NOT NULL,
+  job_id TEXT,
+  result_json TEXT,
+  created_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
+"""
+
+def _migrate_idempotency_keys(conn: sqlite3.Connection) -> None:
+    conn.executescript(IDEMPOTENCY_SCHEMA_SQL)
+
+# Schema changes beyond SCHEMA_SQL, applied in order and tracked in PRAGMA user_version.
+MIGRATIONS = [
+    _migrate_fts,
+    _migrate_keyset_index,
+    _migrate_case_channels,
+    _migrate_content_hash,
+    _migrate_jobs,
+    _migrate_payloads,
+    _migrate_idempotency_keys,
+]
+
+# Migrations that move data out of a table. DROP COLUMN rewrites the rows in
+# place and leaves their pages mostly empty, so the file only shrinks once it is
+# VACUUMed (outside the migration's transaction).
+VACUUM_AFTER = {_migrate_payloads}
+
+def _run_migrations(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    vacuum = False
+    for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {i}")
+        vacuum = vacuum or migration in VACUUM_AFTER
+    if vacuum:
+        conn.execute("VACUUM")
+
+# Applied to every connection. WAL lets readers run while a writer commits;
+# busy_timeout makes concurrent writers wait instead of failing with "database is locked".
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {int(os.getenv('BCE_DB_BUSY_TIMEOUT_MS', '5000'))}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+]
+
+_local = threading.local()
+_initialized: Set[str] = set()
+_fts_paths: Set[str] = set()
+# Libraries whose `cases` still has the payload columns (see _legacy_payload_columns).
+_legacy_paths: Set[str] = set()
+_init_lock = threading.Lock()
+
+def _connect(db_path: str = DEFAULT_DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
     p = Path(db_path)
     if p.parent and str(p.parent) != ".":
         p.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    conn.create_function("bce_unpack", 2, _Unpacker(db_path), deterministic=True)
     return conn
 
 def init_db(db_path: str = DEFAULT_DB_PATH) -> None:
-    conn = _connect(db_path)
-    try:
-        conn.executescript(SCHEMA_SQL)
-        conn.commit()
-    finally:
+    # Runs the schema DDL once per process and path (warm-up calls it at startup).
+    if db_path in _initialized:
+        return
+    with _init_lock:
+        if db_path in _initialized:
+            return
+        conn = _connect(db_path)
+        try:
+            conn.executescript(SCHEMA_SQL)
+            conn.commit()
+            _run_migrations(conn)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cases_fts'").fetchone():
+                _fts_paths.add(db_path)
+            _load_zdicts(conn, db_path)
+            _active_codec[db_path] = conn.execute("SELECT COALESCE(MAX(id), 0) FROM payload_dicts").fetchone()[0]
+            if _legacy_payload_columns(conn):
+                _legacy_paths.add(db_path)
+        finally:
+            conn.close()
+        _initialized.add(db_path)
+
+def _conn(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """
+    The calling thread's long-lived connection to db_path.
+    sqlite3 connections are not shareable across threads, so each worker thread
+    keeps its own and reuses it for every query instead of reconnecting.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        init_db(db_path)
+        conn = conns[db_path] = _connect(db_path)
+    return conn
+
+def close_thread_connections() -> None:
+    for conn in (getattr(_local, "conns", None) or {}).values():
         conn.close()
+    _local.conns = {}
+
+def normalize_channels(channels: Optional[str]) -> List[str]:
+    # "DOOH, Display ,dooh" -> ["dooh", "display"]: the one place channel strings are parsed.
+    if not channels:
+        return []
+    return list(dict.fromkeys(x.strip().lower() for x in channels.split(",") if x.strip()))
 
+def _index_channels(conn: sqlite3.Connection, case_id: int, channels: str) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO case_channels (case_id, channel) VALUES (?, ?)",
+        [(case_id, ch) for ch in normalize_channels(channels)],
+    )
+
+def _dm_field(dm: Dict[str, Any], *path: str) -> str:
+    v: Any = dm
+    for key in path:
+        v = v.get(key) if isinstance(v, dict) else None
+    return v if isinstance(v, str) else ""
+
+def _fts_row(
+    case_id: int,
+    objective: str,
+    channels: str,
+    brief_text: str,
+    decision_map_json: str,
+    decision_type: str,
+    primary_tension: str,
+    decision_window: str,
+) -> Tuple[Any, ...]:
+    # Must produce the same values as cases_fts_source, or snippets drift from the index.
+    try:
+        dm = json.loads(decision_map_json)
+    except ValueError:
+        dm = {}
+    if not isinstance(dm, dict):
+        dm = {}
+    return (
+        case_id,
+        objective,
+        channels,
+        brief_text,
+        _dm_field(dm, "decision_being_influenced") or None,
+        _dm_field(dm, "behavioral_tension", "tradeoff") or None,
+        decision_type or _dm_field(dm, "decision_type") or None,
+        primary_tension or _dm_field(dm, "primary_tension") or None,
+        decision_window or _dm_field(dm, "decision_window") or None,
+    )
+
+FTS_INSERT_SQL = f"INSERT INTO cases_fts(rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+def _index_fts(
+    conn: sqlite3.Connection,
+    db_path: str,
+    case_id: int,
+    objective: str,
+    channels: str,
+    brief_text: str,
+    decision_map_json: str,
+    decision_type: str,
+    primary_tension: str,
+    decision_window: str,
+) -> None:
+    if db_path not in _fts_paths:
+        return
+    conn.execute(FTS_INSERT_SQL, _fts_row(
+        case_id, objective, channels, brief_text, decision_map_json,
+        decision_type, primary_tension, decision_window,
+    ))
+
+def _fts_query(q: str) -> str:
+    # User text -> FTS5 query: every word must match (as a prefix); no operators leak through.
+    tokens = re.findall(r"\w+", q or "")
+    return " ".join(f'"{t}"*' for t in tokens)
+
+@timed_db("insert_case")
 def insert_case(
     input_used: Dict[str, Any],
     decision_map_json: str,
     brief_text: str,
     db_path: str = DEFAULT_DB_PATH
 ) -> int:
-    init_db(db_path)
-
     campaign = (input_used or {}).get("campaign", {}) or {}
 
     category = (campaign.get("Category") or "").strip()
@@ -61,145 +650,934 @@ def insert_case(
     primary_tension = (campaign.get("Primary_Tension") or "").strip()
     decision_window = (campaign.get("Decision_Window") or "").strip()
 
-    conn = _connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO cases (
-              category, market, channels, objective,
-              decision_type, primary_tension, decision_window,
-              input_json, decision_map_json, brief_text
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+    input_json = json.dumps(input_used, ensure_ascii=False)
+
+    conn = _conn(db_path)
+    codec, primed = _packer(db_path)
+    with conn:
+        cur = conn.execute(
+            _cases_insert_sql(CASE_INSERT_SQL, db_path),
             (
                 category, market, channels, objective,
                 decision_type, primary_tension, decision_window,
-                json.dumps(input_used, ensure_ascii=False),
-                decision_map_json,
-                brief_text
+                content_hash(input_json, decision_map_json),
             )
         )
-        conn.commit()
-        return int(cur.lastrowid)
-    finally:
-        conn.close()
+        conn.execute(
+            PAYLOAD_INSERT_SQL,
+            (cur.lastrowid, codec, *_pack((input_json, decision_map_json, brief_text), primed)),
+        )
+        _index_fts(
+            conn, db_path, cur.lastrowid,
+            objective, channels, brief_text, decision_map_json,
+            decision_type, primary_tension, decision_window,
+        )
+        _index_channels(conn, cur.lastrowid, channels)
+    return int(cur.lastrowid)
 
-def list_cases(
-    limit: int = 100,
-    offset: int = 0,
+def _filters(
+    db_path: str,
     q: Optional[str] = None,
     category: Optional[str] = None,
     market: Optional[str] = None,
     decision_type: Optional[str] = None,
-    db_path: str = DEFAULT_DB_PATH,
-) -> Tuple[List[Dict[str, Any]], int]:
-    init_db(db_path)
-    conn = _connect(db_path)
-    try:
-        where = []
-        params: List[Any] = []
+    primary_tension: Optional[str] = None,
+    decision_window: Optional[str] = None,
+    channel: Optional[str] = None,
+) -> Tuple[List[str], List[Any]]:
+    # WHERE fragments over `cases c`. Free text uses the FTS index when present.
+    where: List[str] = []
+    params: List[Any] = []
+
+    if channel:
+        where.append("c.id IN (SELECT case_id FROM case_channels WHERE channel = ?)")
+        params.append(channel.strip().lower())
 
-        if q:
-            where.append("(objective LIKE ? OR channels LIKE ? OR brief_text LIKE ?)")
+    exact = {
+        "category": category,
+        "market": market,
+        "decision_type": decision_type,
+        "primary_tension": primary_tension,
+        "decision_window": decision_window,
+    }
+    for column, value in exact.items():
+        if value:
+            where.append(f"c.{column} = ?")
+            params.append(value)
+
+    if q:
+        match = _fts_query(q) if db_path in _fts_paths else ""
+        if match:
+            where.append("c.id IN (SELECT rowid FROM cases_fts WHERE cases_fts MATCH ?)")
+            params.append(match)
+        elif db_path in _fts_paths:
+            # Nothing searchable in q (only punctuation): it matches no case.
+            where.append("0")
+        else:
+            # SQLite built without FTS5: fall back to the unindexed scan.
+            where.append(
+                "(c.objective LIKE ? OR c.channels LIKE ? OR EXISTS (SELECT 1 FROM case_payloads p"
+                " WHERE p.case_id = c.id AND bce_unpack(p.codec, p.brief_text) LIKE ?))"
+            )
             like = f"%{q}%"
             params.extend([like, like, like])
 
-        if category:
-            where.append("category = ?")
-            params.append(category)
+    return where, params
 
-        if market:
-            where.append("market = ?")
-            params.append(market)
+LIST_COLUMNS = "id, created_at, category, market, channels, objective, decision_type, primary_tension, decision_window"
+LIST_SELECT = ", ".join("c." + col.strip() for col in LIST_COLUMNS.split(","))
 
-        if decision_type:
-            where.append("decision_type = ?")
-            params.append(decision_type)
+@timed_db("list_cases")
+def list_cases(
+    limit: int = 100,
+    offset: int = 0,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    market: Optional[str] = None,
+    decision_type: Optional[str] = None,
+    primary_tension: Optional[str] = None,
+    decision_window: Optional[str] = None,
+    channel: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    One page of cases plus the total match count. With `q`, results come from
+    the FTS index ranked by BM25 and each row carries a `snippet`; without it
+    they are newest first.
+    """
+    conn = _conn(db_path)
+    where, params = _filters(
+        db_path, category=category, market=market, decision_type=decision_type,
+        primary_tension=primary_tension, decision_window=decision_window, channel=channel,
+    )
 
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    match = _fts_query(q) if q and db_path in _fts_paths else ""
+    if q and not match:
+        where, params = _filters(
+            db_path, q=q, category=category, market=market, decision_type=decision_type,
+            primary_tension=primary_tension, decision_window=decision_window, channel=channel,
+        )
 
-        total = conn.execute(f"SELECT COUNT(*) AS c FROM cases {where_sql}", params).fetchone()["c"]
+    total = count_cases(
+        q=q, category=category, market=market, decision_type=decision_type,
+        primary_tension=primary_tension, decision_window=decision_window, channel=channel, db_path=db_path,
+    )
 
+    if match:
+        # Ranked first, snippets after for the page only: snippet() reads the case
+        # text back (decompressing it), and in one query SQLite would build it for
+        # every match before sorting.
+        where_sql = "WHERE cases_fts MATCH ?" + "".join(f" AND {w}" for w in where)
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        rows = conn.execute(
+            f"""
+            WITH page AS (
+              SELECT cases_fts.rowid AS id, bm25(cases_fts, {weights}) AS rank
+              FROM cases_fts JOIN cases c ON c.id = cases_fts.rowid
+              {where_sql}
+              ORDER BY rank, id DESC
+              LIMIT ? OFFSET ?
+            )
+            SELECT {LIST_SELECT}, snippet(cases_fts, -1, '[', ']', '…', 16) AS snippet
+            FROM page JOIN cases_fts ON cases_fts.rowid = page.id JOIN cases c ON c.id = page.id
+            WHERE cases_fts MATCH ?
+            ORDER BY page.rank, page.id DESC
+            """,
+            [match] + params + [limit, offset, match],
+        ).fetchall()
+    else:
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
         rows = conn.execute(
             f"""
-            SELECT id, created_at, category, market, channels, objective, decision_type, primary_tension, decision_window
-            FROM cases
+            SELECT {LIST_SELECT}
+            FROM cases c
             {where_sql}
-            ORDER BY datetime(created_at) DESC
+            ORDER BY c.created_at DESC, c.id DESC
             LIMIT ? OFFSET ?
             """,
             params + [limit, offset],
         ).fetchall()
 
-        return [dict(r) for r in rows], int(total)
-    finally:
-        conn.close()
+    return [dict(r) for r in rows], int(total)
+
+def _encode_cursor(key: Union[str, float], case_id: int) -> str:
+    raw = json.dumps([key, case_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[Union[str, float], int]:
+    # The key is created_at for the newest-first listing, the BM25 rank for a search.
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, case_id = json.loads(raw)
+        if isinstance(key, bool) or not isinstance(key, (str, int, float)):
+            raise TypeError(key)
+        return key, int(case_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+@timed_db("list_cases_page")
+def list_cases_page(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    market: Optional[str] = None,
+    decision_type: Optional[str] = None,
+    primary_tension: Optional[str] = None,
+    decision_window: Optional[str] = None,
+    channel: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Keyset-paged listing: (rows, next_cursor). Without `q` it is newest first and
+    the cursor is the (created_at, id) of the last row seen, so every page is a
+    range scan on the created_at indexes no matter how deep it is. With `q` the
+    matches are ranked by BM25 as in list_cases, each row carries a `snippet`,
+    and the cursor is the (rank, id) of the last row seen.
+    """
+    match = _fts_query(q) if q and db_path in _fts_paths else ""
+    where, params = _filters(
+        db_path, q=None if match else q, category=category, market=market, decision_type=decision_type,
+        primary_tension=primary_tension, decision_window=decision_window, channel=channel,
+    )
+    after = _decode_cursor(cursor) if cursor else None
+    if after is not None and isinstance(after[0], str) == bool(match):
+        # A cursor from the other ordering (q added or removed since).
+        raise ValueError("Invalid cursor.")
+
+    if match:
+        return _search_page(match, where, params, after, limit, db_path)
+
+    if after is not None:
+        where.append("(c.created_at, c.id) < (?, ?)")
+        params.extend(after)
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    rows = _conn(db_path).execute(
+        f"""
+        SELECT {LIST_SELECT}
+        FROM cases c
+        {where_sql}
+        ORDER BY c.created_at DESC, c.id DESC
+        LIMIT ?
+        """,
+        params + [limit + 1],
+    ).fetchall()
+
+    page = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = _encode_cursor(page[-1]["created_at"], page[-1]["id"])
+    return page, next_cursor
+
+def _search_page(
+    match: str,
+    where: List[str],
+    params: List[Any],
+    after: Optional[Tuple[Union[str, float], int]],
+    limit: int,
+    db_path: str,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # BM25 is computed for every match either way, so the rank cursor only saves
+    # the offset; snippets are built for the page alone, as in list_cases.
+    where_sql = "WHERE cases_fts MATCH ?" + "".join(f" AND {w}" for w in where)
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    # Equally relevant cases come newest first, as in the unsearched listing.
+    after_sql = "WHERE rank > ? OR (rank = ? AND id < ?)" if after is not None else ""
+    rows = _conn(db_path).execute(
+        f"""
+        WITH ranked AS (
+          SELECT cases_fts.rowid AS id, bm25(cases_fts, {weights}) AS rank
+          FROM cases_fts JOIN cases c ON c.id = cases_fts.rowid
+          {where_sql}
+        ), page AS (
+          SELECT id, rank FROM ranked
+          {after_sql}
+          ORDER BY rank, id DESC
+          LIMIT ?
+        )
+        SELECT {LIST_SELECT}, page.rank AS rank, snippet(cases_fts, -1, '[', ']', '…', 16) AS snippet
+        FROM page JOIN cases_fts ON cases_fts.rowid = page.id JOIN cases c ON c.id = page.id
+        WHERE cases_fts MATCH ?
+        ORDER BY page.rank, page.id DESC
+        """,
+        [match] + params + ([after[0], after[0], after[1]] if after is not None else []) + [limit + 1, match],
+    ).fetchall()
+
+    page = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = _encode_cursor(page[-1]["rank"], page[-1]["id"])
+    for row in page:
+        del row["rank"]
+    return page, next_cursor
+
+# Match counts are cached per filter set. The library is append-only, so max(id)
+# is a cheap version stamp: any insert or import changes it and drops the entry.
+_count_cache: Dict[Tuple[Any, ...], Tuple[int, int]] = {}
+_count_lock = threading.Lock()
+COUNT_CACHE_MAX = 256
+
+def _library_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM cases").fetchone()[0])
+
+@timed_db("count_cases")
+def count_cases(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    market: Optional[str] = None,
+    decision_type: Optional[str] = None,
+    primary_tension: Optional[str] = None,
+    decision_window: Optional[str] = None,
+    channel: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> int:
+    conn = _conn(db_path)
+    key = (
+        db_path, q or "", category or "", market or "", decision_type or "",
+        primary_tension or "", decision_window or "", channel or "",
+    )
+    version = _library_version(conn)
+
+    with _count_lock:
+        hit = _count_cache.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+
+    where, params = _filters(
+        db_path, q=q, category=category, market=market, decision_type=decision_type,
+        primary_tension=primary_tension, decision_window=decision_window, channel=channel,
+    )
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    total = int(conn.execute(f"SELECT COUNT(*) FROM cases c {where_sql}", params).fetchone()[0])
+
+    with _count_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX:
+            _count_cache.clear()
+        _count_cache[key] = (version, total)
+    return total
+
+@timed_db("list_cases_by_ids")
+def list_cases_by_ids(case_ids: List[int], db_path: str = DEFAULT_DB_PATH) -> List[Dict[str, Any]]:
+    # Listing rows for the given ids, in the order given (missing ids are dropped).
+    if not case_ids:
+        return []
+    placeholders = ", ".join("?" for _ in case_ids)
+    rows = _conn(db_path).execute(
+        f"SELECT {LIST_SELECT} FROM cases c WHERE c.id IN ({placeholders})",
+        list(case_ids),
+    ).fetchall()
+    by_id = {r["id"]: dict(r) for r in rows}
+    return [by_id[i] for i in case_ids if i in by_id]
+
+@timed_db("channel_overlap")
+def channel_overlap(
+    channels: List[str],
+    case_ids: Optional[List[int]] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Dict[int, List[str]]:
+    """
+    case id -> the given (normalised) channels it shares, via the case_channels
+    primary key; restricted to case_ids when given.
+    """
+    if not channels:
+        return {}
+    sql = f"SELECT case_id, channel FROM case_channels WHERE channel IN ({', '.join('?' for _ in channels)})"
+    params: List[Any] = list(channels)
+    if case_ids is not None:
+        if not case_ids:
+            return {}
+        sql += f" AND case_id IN ({', '.join('?' for _ in case_ids)})"
+        params.extend(case_ids)
+    out: Dict[int, List[str]] = {}
+    for case_id, channel in _conn(db_path).execute(sql, params):
+        out.setdefault(case_id, []).append(channel)
+    return out
+
+def iter_case_channels_after(last_id: int, db_path: str = DEFAULT_DB_PATH) -> Iterator[Tuple[int, str]]:
+    cur = _conn(db_path).execute(
+        "SELECT case_id, channel FROM case_channels WHERE case_id > ? ORDER BY case_id",
+        (last_id,),
+    )
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            return
+        for r in rows:
+            yield r[0], r[1]
 
+def iter_cases_after(
+    last_id: int,
+    columns: str = LIST_COLUMNS,
+    db_path: str = DEFAULT_DB_PATH,
+    source: str = "cases",
+) -> Iterator[sqlite3.Row]:
+    # Rows with id > last_id in id order; used by in-memory indexes to catch up.
+    # source="cases_full" for the payload columns.
+    cur = _conn(db_path).execute(
+        f"SELECT {columns} FROM {source} WHERE id > ? ORDER BY id",
+        (last_id,),
+    )
+    while True:
+        rows = cur.fetchmany(1000)
+        if not rows:
+            return
+        yield from rows
+
+def fts_enabled(db_path: str = DEFAULT_DB_PATH) -> bool:
+    _conn(db_path)
+    return db_path in _fts_paths
+
+@timed_db("fts_match_ids")
+def fts_match_ids(q: str, db_path: str = DEFAULT_DB_PATH) -> Optional[List[int]]:
+    """
+    Ids of the cases whose text matches q, ascending, from the FTS index alone.
+    None for a blank q, which filters nothing; a q with no searchable words
+    matches nothing (as in _filters).
+    """
+    if not q or not q.strip():
+        return None
+    match = _fts_query(q)
+    if not match:
+        return []
+    rows = _conn(db_path).execute(
+        "SELECT rowid FROM cases_fts WHERE cases_fts MATCH ? ORDER BY rowid", (match,)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+@timed_db("max_case_id")
+def max_case_id(db_path: str = DEFAULT_DB_PATH) -> int:
+    return _library_version(_conn(db_path))
+
+@timed_db("get_case")
 def get_case(case_id: int, db_path: str = DEFAULT_DB_PATH) -> Optional[Dict[str, Any]]:
-    init_db(db_path)
-    conn = _connect(db_path)
+    # The one listing-to-detail step that decompresses the payload.
+    row = _conn(db_path).execute("SELECT * FROM cases_full WHERE id = ?", (case_id,)).fetchone()
+    return dict(row) if row else None
+
+@timed_db("export_db_bytes")
+def export_db_bytes(db_path: str = DEFAULT_DB_PATH) -> bytes:
+    # In WAL mode recent commits may still sit in the -wal file, so copying the
+    # main file is not a consistent snapshot; the backup API is.
+    mem = sqlite3.connect(":memory:")
     try:
-        row = conn.execute("SELECT * FROM cases WHERE id = ?", (case_id,)).fetchone()
-        return dict(row) if row else None
+        _conn(db_path).backup(mem)
+        _inline_payloads(mem, db_path)
+        return mem.serialize()
     finally:
-        conn.close()
+        mem.close()
 
-def export_db_bytes(db_path: str = DEFAULT_DB_PATH) -> bytes:
-    init_db(db_path)
-    p = Path(db_path)
-    return p.read_bytes()
+def _inline_payloads(conn: sqlite3.Connection, db_path: str) -> None:
+    # Puts a copy of db_path back in the layout from before case_payloads, with the
+    # text in `cases` and no bce_unpack anywhere, so any SQLite can read it. Its
+    # user_version goes back too: the app moves the payloads out again when it
+    # opens the copy as a library.
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cases_fts'").fetchone()
+    if not _legacy_payload_columns(conn):
+        for column in PAYLOAD_COLUMNS:
+            conn.execute(f"ALTER TABLE cases ADD COLUMN {column} TEXT")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT case_id, codec, {', '.join(PAYLOAD_COLUMNS)} FROM case_payloads WHERE case_id > ? ORDER BY case_id LIMIT 2000",
+            (last_id,),
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            f"UPDATE cases SET {', '.join(f'{col} = ?' for col in PAYLOAD_COLUMNS)} WHERE id = ?",
+            [(*(_unpack(db_path, r[1], v) for v in r[2:]), r[0]) for r in rows],
+        )
+        last_id = rows[-1][0]
+    conn.execute("DROP VIEW IF EXISTS cases_fts_source")
+    conn.execute("DROP VIEW cases_full")
+    conn.execute("DROP TABLE case_payloads")
+    conn.execute("DROP TABLE payload_dicts")
+    conn.execute(f"PRAGMA user_version = {MIGRATIONS.index(_migrate_payloads)}")
+    conn.commit()
+    if has_fts:
+        conn.executescript(FTS_SCHEMA_SQL)
+    # The dropped payload pages would otherwise still be in the file.
+    conn.execute("VACUUM")
 
-def export_jsonl(db_path: str = DEFAULT_DB_PATH) -> str:
+# Export buffers about this much JSONL before handing a chunk to the response.
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# cases_full's columns, with the payloads as stored: the export decodes them itself
+# (raw rows not at all) rather than through bce_unpack.
+EXPORT_SELECT_SQL = """
+SELECT c.id, c.created_at, c.category, c.market, c.channels, c.objective,
+       c.decision_type, c.primary_tension, c.decision_window,
+       cp.codec, cp.input_json, cp.decision_map_json, cp.brief_text, c.content_hash
+FROM cases c JOIN case_payloads cp ON cp.case_id = c.id
+"""
+
+def iter_export_jsonl(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    market: Optional[str] = None,
+    decision_type: Optional[str] = None,
+    primary_tension: Optional[str] = None,
+    decision_window: Optional[str] = None,
+    channel: Optional[str] = None,
+    gzip: bool = False,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Iterator[bytes]:
+    """
+    The matching cases as JSONL, yielded in encoded chunks of ~EXPORT_CHUNK_BYTES
+    (gzip-framed when asked). Rows are read off a cursor in id order, which is
+    the table order, so SQLite never sorts and memory does not grow with the
+    library.
+
+    Runs on its own connection: StreamingResponse advances sync generators from
+    whichever threadpool thread is free, so the thread-local one cannot be used.
+    The read transaction also pins one snapshot for the whole export.
+    """
     init_db(db_path)
-    conn = _connect(db_path)
+    where, params = _filters(
+        db_path, q=q, category=category, market=market, decision_type=decision_type,
+        primary_tension=primary_tension, decision_window=decision_window, channel=channel,
+    )
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    conn = _connect(db_path, check_same_thread=False)
     try:
-        rows = conn.execute("SELECT * FROM cases ORDER BY datetime(created_at) DESC").fetchall()
-        lines = []
-        for r in rows:
-            d = dict(r)
-            lines.append(json.dumps(d, ensure_ascii=False))
-        return "\n".join(lines)
+        conn.execute("BEGIN")
+        cur = conn.execute(f"{EXPORT_SELECT_SQL} {where_sql} ORDER BY c.id", params)
+        buf: List[str] = []
+        size = 0
+        while True:
+            rows = cur.fetchmany(500)
+            for r in rows:
+                d = dict(r)
+                codec = d.pop("codec")
+                if codec:
+                    for col in PAYLOAD_COLUMNS:
+                        d[col] = _unpack(db_path, codec, d[col])
+                line = json.dumps(d, ensure_ascii=False) + "\n"
+                buf.append(line)
+                size += len(line)
+            if buf and (size >= EXPORT_CHUNK_BYTES or not rows):
+                chunk = "".join(buf).encode("utf-8")
+                buf, size = [], 0
+                if gz is not None:
+                    chunk = gz.compress(chunk)
+                if chunk:
+                    yield chunk
+            if not rows:
+                break
+        if gz is not None:
+            yield gz.flush()
     finally:
+        # Also runs when the download is abandoned (app.web closes the generator):
+        # an open read transaction would keep WAL checkpoints from getting past it.
+        conn.rollback()
         conn.close()
 
-def import_jsonl(text: str, db_path: str = DEFAULT_DB_PATH) -> int:
-    init_db(db_path)
-    conn = _connect(db_path)
+def export_jsonl(db_path: str = DEFAULT_DB_PATH) -> str:
+    return b"".join(iter_export_jsonl(db_path=db_path)).decode("utf-8")
+
+# Rows per import transaction: large enough to amortise the commit, small enough
+# that a concurrent /generate insert never waits long for the write lock.
+IMPORT_CHUNK_ROWS = int(os.getenv("BCE_IMPORT_CHUNK_ROWS", "2000"))
+IMPORT_MAX_ERRORS = 20
+
+IMPORT_INSERT_SQL = """
+INSERT INTO cases (
+  created_at, category, market, channels, objective,
+  decision_type, primary_tension, decision_window, content_hash{columns}
+)
+SELECT COALESCE(datetime(?), datetime('now')), ?, ?, ?, ?, ?, ?, ?, ?{values}
+WHERE NOT EXISTS (SELECT 1 FROM cases WHERE content_hash = ?)
+"""
+
+ImportRow = Tuple[Tuple[Any, ...], Tuple[str, str, str]]
+
+def _import_row(d: Dict[str, Any]) -> ImportRow:
+    # (IMPORT_INSERT_SQL parameters, payload texts in PAYLOAD_COLUMNS order)
+    def text(key: str, default: str = "") -> str:
+        v = d.get(key)
+        return v if isinstance(v, str) and v else default
+
+    input_json = text("input_json", "{}")
+    decision_map_json = text("decision_map_json", "{}")
+    digest = content_hash(input_json, decision_map_json)
+    params = (
+        d.get("created_at") or None,
+        text("category"),
+        text("market"),
+        text("channels"),
+        text("objective"),
+        text("decision_type"),
+        text("primary_tension"),
+        text("decision_window"),
+        digest,
+        digest,
+    )
+    return params, (input_json, decision_map_json, text("brief_text"))
+
+def _import_chunk(conn: sqlite3.Connection, db_path: str, rows: List[ImportRow]) -> int:
+    # One transaction per chunk. The write lock is taken up front so the ids above
+    # `before` are exactly this chunk's rows, which then get their payload, FTS and
+    # channel rows. A hash repeated within the chunk was inserted on its first line.
+    payloads: Dict[str, Tuple[str, str, str]] = {}
+    for params, payload in rows:
+        payloads.setdefault(params[-1], payload)
+    codec, primed = _packer(db_path)
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cur = conn.cursor()
-        inserted = 0
-        for line in (text or "").splitlines():
-            line = line.strip()
-            if not line:
+        before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cases").fetchone()[0]
+        conn.executemany(_cases_insert_sql(IMPORT_INSERT_SQL, db_path), [params for params, _ in rows])
+        new = conn.execute(
+            """
+            SELECT id, objective, channels, content_hash,
+                   decision_type, primary_tension, decision_window
+            FROM cases WHERE id > ? ORDER BY id
+            """,
+            (before,),
+        ).fetchall()
+        conn.executemany(
+            PAYLOAD_INSERT_SQL,
+            [(r[0], codec, *_pack(payloads[r[3]], primed)) for r in new],
+        )
+        if db_path in _fts_paths:
+            conn.executemany(FTS_INSERT_SQL, [
+                _fts_row(r[0], r[1], r[2], payloads[r[3]][2], payloads[r[3]][1], r[4], r[5], r[6])
+                for r in new
+            ])
+        conn.executemany(
+            "INSERT OR IGNORE INTO case_channels (case_id, channel) VALUES (?, ?)",
+            [(r[0], ch) for r in new for ch in normalize_channels(r[2])],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(new)
+
+@timed_db("import_jsonl_stream")
+def import_jsonl_stream(
+    lines: Iterable[Union[str, bytes]],
+    db_path: str = DEFAULT_DB_PATH,
+    chunk_rows: int = IMPORT_CHUNK_ROWS,
+) -> Dict[str, Any]:
+    """
+    Import JSONL (as produced by the export) from any iterable of lines, e.g. an
+    open file, without holding more than one chunk in memory.
+
+    Original ids are ignored. A row whose input_json + decision_map_json hash is
+    already in the library (or earlier in the file) is skipped; unparseable
+    lines are counted as failed and the first few reported by line number.
+    """
+    init_db(db_path)
+    conn = _conn(db_path)
+    stats: Dict[str, Any] = {"inserted": 0, "skipped": 0, "failed": 0, "errors": []}
+
+    def fail(line_no: int, msg: str) -> None:
+        stats["failed"] += 1
+        if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+            stats["errors"].append(f"Line {line_no}: {msg}")
+
+    chunk: List[ImportRow] = []
+
+    def flush() -> None:
+        inserted = _import_chunk(conn, db_path, chunk)
+        stats["inserted"] += inserted
+        stats["skipped"] += len(chunk) - inserted
+        chunk.clear()
+
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError:
+                fail(line_no, "not UTF-8")
                 continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
             d = json.loads(line)
+        except ValueError as e:
+            fail(line_no, f"invalid JSON ({e.msg})")
+            continue
+        if not isinstance(d, dict):
+            fail(line_no, "not a JSON object")
+            continue
+        chunk.append(_import_row(d))
+        if len(chunk) >= chunk_rows:
+            flush()
+    if chunk:
+        flush()
+    return stats
 
-            # Insert into the current schema (ignore original id)
-            cur.execute(
-                """
-                INSERT INTO cases (
-                  created_at, category, market, channels, objective,
-                  decision_type, primary_tension, decision_window,
-                  input_json, decision_map_json, brief_text
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    d.get("created_at") or "datetime('now')",
-                    d.get("category") or "",
-                    d.get("market") or "",
-                    d.get("channels") or "",
-                    d.get("objective") or "",
-                    d.get("decision_type") or "",
-                    d.get("primary_tension") or "",
-                    d.get("decision_window") or "",
-                    d.get("input_json") or "{}",
-                    d.get("decision_map_json") or "{}",
-                    d.get("brief_text") or "",
-                )
+def import_jsonl(text: str, db_path: str = DEFAULT_DB_PATH) -> int:
+    return import_jsonl_stream((text or "").splitlines(), db_path=db_path)["inserted"]
+
+# -- payloads -----------------------------------------------------------------
+
+def _db_bytes(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+@timed_db("compact_payloads")
+def compact_payloads(
+    db_path: str = DEFAULT_DB_PATH,
+    sample_cases: int = PAYLOAD_DICT_SAMPLE,
+    vacuum: bool = True,
+) -> Dict[str, Any]:
+    """
+    Train a dictionary on the newest cases, rewrite every payload stored with
+    another codec (or raw, with BCE_PAYLOAD_COMPRESSION off) and VACUUM, which
+    is what actually shrinks the file. Batches commit one at a time, so the app
+    can keep serving and writing while this runs.
+    """
+    conn = _conn(db_path)
+    stats: Dict[str, Any] = {"bytes_before": _db_bytes(conn), "codec": 0, "rewritten": 0}
+    if payload_compression():
+        samples = conn.execute(
+            f"SELECT {', '.join(PAYLOAD_COLUMNS)} FROM cases_full ORDER BY id DESC LIMIT ?", (sample_cases,)
+        ).fetchall()
+        if len(samples) >= PAYLOAD_DICT_MIN_CASES:
+            zdict = train_zdict(t for r in samples for t in r)
+            with conn:
+                codec = conn.execute("INSERT INTO payload_dicts (zdict) VALUES (?)", (zdict,)).lastrowid
+            _zdicts[(db_path, codec)] = zdict
+            _active_codec[db_path] = codec
+        stats["codec"] = _active_codec.get(db_path, 0)
+    codec, primed = _packer(db_path)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT case_id, {', '.join(f'bce_unpack(codec, {col})' for col in PAYLOAD_COLUMNS)}
+            FROM case_payloads WHERE case_id > ? AND codec != ? ORDER BY case_id LIMIT 1000
+            """,
+            (last_id, codec),
+        ).fetchall()
+        if not rows:
+            break
+        with conn:
+            conn.executemany(
+                "UPDATE case_payloads SET codec = ?, input_json = ?, decision_map_json = ?, brief_text = ? WHERE case_id = ?",
+                [(codec, *_pack(r[1:], primed), r[0]) for r in rows],
             )
-            inserted += 1
-        conn.commit()
-        return inserted
-    finally:
-        conn.close()
+        stats["rewritten"] += len(rows)
+        last_id = rows[-1][0]
+    if vacuum:
+        conn.execute("VACUUM")
+    stats["bytes_after"] = _db_bytes(conn)
+    return stats
+
+@timed_db("drop_legacy_payload_columns")
+def drop_legacy_payload_columns(db_path: str = DEFAULT_DB_PATH) -> bool:
+    """
+    Drop the payload columns that an earlier build's migration left in `cases`
+    (this one drops them itself); False if there are none. This cannot be undone, and
+    an app that has the library open keeps writing those columns until it is
+    restarted, so stop it first.
+    """
+    init_db(db_path)
+    conn = _conn(db_path)
+    if not _legacy_payload_columns(conn):
+        return False
+    missing = conn.execute(
+        "SELECT COUNT(*) FROM cases c WHERE NOT EXISTS (SELECT 1 FROM case_payloads p WHERE p.case_id = c.id)"
+    ).fetchone()[0]
+    if missing:
+        raise ValueError(f"{missing} cases have no payload row; not dropping their text")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _rebuild_payload_views(conn, drop_columns=True)
+    _legacy_paths.discard(db_path)
+    return True
+
+# -- jobs ---------------------------------------------------------------------
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+@timed_db("enqueue_job")
+def enqueue_job(job_id: str, input_json: str, now: float, db_path: str = DEFAULT_DB_PATH) -> None:
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO jobs (id, input_json, created_at, available_at) VALUES (?, ?, ?, ?)",
+            (job_id, input_json, now, now),
+        )
+
+@timed_db("claim_job")
+def claim_job(now: float, lease_s: float, db_path: str = DEFAULT_DB_PATH) -> Optional[Dict[str, Any]]:
+    """The oldest runnable job, marked running under a fresh lease; None if the queue is empty."""
+    conn = _conn(db_path)
+    with conn:
+        # One statement, so two workers can never claim the same row.
+        row = conn.execute(
+            """
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?
+            WHERE id = (
+              SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ?
+              ORDER BY available_at LIMIT 1
+            )
+            RETURNING *
+            """,
+            (now + lease_s, now),
+        ).fetchone()
+    return dict(row) if row else None
+
+@timed_db("renew_job_lease")
+def renew_job_lease(job_id: str, lease_until: float, db_path: str = DEFAULT_DB_PATH) -> None:
+    conn = _conn(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'", (lease_until, job_id))
+
+@timed_db("save_job_decision_map")
+def save_job_decision_map(job_id: str, decision_map_json: str, db_path: str = DEFAULT_DB_PATH) -> None:
+    # Kept across retries: a Pass B failure must not pay for Pass A again.
+    conn = _conn(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET decision_map_json = ? WHERE id = ?", (decision_map_json, job_id))
+
+@timed_db("finish_job")
+def finish_job(job_id: str, brief_text: str, usage_json: str, now: float, db_path: str = DEFAULT_DB_PATH) -> None:
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'done', brief_text = ?, usage_json = ?, error = NULL,
+              lease_until = NULL, finished_at = ?
+            WHERE id = ?
+            """,
+            (brief_text, usage_json, now, job_id),
+        )
+
+@timed_db("fail_job")
+def fail_job(
+    job_id: str, error: str, now: float, retry_at: Optional[float] = None, db_path: str = DEFAULT_DB_PATH
+) -> None:
+    """Back to the queue until retry_at, or failed for good when retry_at is None."""
+    conn = _conn(db_path)
+    with conn:
+        if retry_at is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, finished_at = ? WHERE id = ?",
+                (error, now, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, available_at = ? WHERE id = ?",
+                (error, retry_at, job_id),
+            )
+
+@timed_db("release_job")
+def release_job(job_id: str, now: float, db_path: str = DEFAULT_DB_PATH) -> None:
+    # Shutdown mid-run: not the job's fault, so the attempt is handed back.
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_until = NULL, available_at = ?
+            WHERE id = ? AND status = 'running'
+            """,
+            (now, job_id),
+        )
+
+@timed_db("requeue_expired_jobs")
+def requeue_expired_jobs(now: float, max_attempts: int, db_path: str = DEFAULT_DB_PATH) -> int:
+    """Running jobs whose worker stopped renewing the lease: requeued, or failed once out of attempts."""
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'failed', error = 'Worker stopped while running the job.',
+              lease_until = NULL, finished_at = ?
+            WHERE status = 'running' AND lease_until < ? AND attempts >= ?
+            """,
+            (now, now, max_attempts),
+        )
+        return conn.execute(
+            "UPDATE jobs SET status = 'queued', lease_until = NULL, available_at = ? WHERE status = 'running' AND lease_until < ?",
+            (now, now),
+        ).rowcount
+
+@timed_db("prune_jobs")
+def prune_jobs(finished_before: float, db_path: str = DEFAULT_DB_PATH) -> int:
+    conn = _conn(db_path)
+    with conn:
+        return conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (finished_before,)
+        ).rowcount
+
+@timed_db("get_job")
+def get_job(job_id: str, db_path: str = DEFAULT_DB_PATH) -> Optional[Dict[str, Any]]:
+    row = _conn(db_path).execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+@timed_db("job_counts")
+def job_counts(db_path: str = DEFAULT_DB_PATH) -> Dict[str, int]:
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    for row in _conn(db_path).execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+        counts[row[0]] = row[1]
+    return counts
+
+# -- idempotency keys ---------------------------------------------------------
+
+@timed_db("reserve_idempotency_key")
+def reserve_idempotency_key(
+    key: str,
+    request_hash: str,
+    now: float,
+    expire_before: float,
+    abandon_before: float,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Optional[Dict[str, Any]]:
+    """
+    Claim key for request_hash: None if this caller now holds it, else the row of
+    whoever does (job_id and result_json still None while that one is running).
+    Expired keys, and reservations left unfilled since abandon_before, are free again.
+    """
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            """
+            DELETE FROM idempotency_keys WHERE created_at <= ?
+               OR (created_at <= ? AND job_id IS NULL AND result_json IS NULL)
+            """,
+            (expire_before, abandon_before),
+        )
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO idempotency_keys (key, request_hash, created_at) VALUES (?, ?, ?)",
+            (key, request_hash, now),
+        )
+        if cur.rowcount:
+            return None
+        return dict(conn.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone())
+
+@timed_db("save_idempotency_key")
+def save_idempotency_key(
+    key: str,
+    request_hash: str,
+    job_id: Optional[str],
+    result_json: Optional[str],
+    db_path: str = DEFAULT_DB_PATH,
+) -> None:
+    # Fills in a reservation from reserve_idempotency_key.
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            "UPDATE idempotency_keys SET job_id = ?, result_json = ? WHERE key = ? AND request_hash = ?",
+            (job_id, result_json, key, request_hash),
+        )
+
+@timed_db("release_idempotency_key")
+def release_idempotency_key(key: str, request_hash: str, db_path: str = DEFAULT_DB_PATH) -> None:
+    # Frees a reservation whose generation failed, so a retry can take the key.
+    conn = _conn(db_path)
+    with conn:
+        conn.execute(
+            """
+            DELETE FROM idempotency_keys
+            WHERE key = ? AND request_hash = ? AND job_id IS NULL AND result_json IS NULL
+            """,
+            (key, request_hash),
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app import db
+from app.metrics import COALESCED, add_usage, request_served, usage_scope
+
+# Duplicate generations.
+#
+# In flight: identical LLM calls that arrive while one is already running (a
+# double-click, a team trying the same demo campaign at once) read that call's
+# output instead of making their own. Pass A is keyed on the canonical campaign
+# JSON, Pass B on its prompt, so /generate, the SSE stream, jobs, batches and the
+# API all share one upstream call. Only this process is covered; repeats that
+# arrive after the call finished are the LLM cache's job (app.llm_cache). Every
+# reader's request reports the call's token usage and provider, as if it had
+# made the call itself.
+#
+# Across requests: a client that sends `Idempotency-Key: <key>` gets the stored
+# result of the first submission with that key back (marked `Idempotent-Replayed:
+# true`) instead of a new generation. The first submission reserves the key
+# before it generates: reusing the key for a different campaign is an error
+# (422), repeating it while the first is still running gets 409.
+#
+#   IDEMPOTENCY_TTL_S   how long a key is remembered (default 24 hours)
+
+T = TypeVar("T")
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+REPLAYED = {REPLAYED_HEADER: "true"}
+MAX_KEY_LEN = 255
+
+def canonical_hash(*parts: Any) -> str:
+    # Key order and whitespace in the JSON do not change the hash.
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def request_hash(campaign: Dict[str, Any]) -> str:
+    # What an Idempotency-Key is bound to, the same for /generate and the API (one
+    # table): the campaign alone. Tone and `fields` only shape the response.
+    return canonical_hash(campaign)
+
+# -- in flight ---------------------------------------------------------------------
+
+class _Flight:
+    """One upstream call and what it has produced so far, for any number of readers."""
+
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        # What the call cost and who answered it, for every reader's request.
+        self.usage: Dict[str, int] = {}
+        self.served: Dict[str, str] = {}
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def produce(self, source: AsyncIterator[Any]) -> None:
+        # Its own usage scope: the task's context is a copy of whichever request
+        # started the call, and the usage belongs to every reader alike.
+        with usage_scope() as usage:
+            self.usage = usage
+            try:
+                async for item in source:
+                    self.items.append(item)
+                    self._notify()
+            except asyncio.CancelledError:
+                # Only shutdown cancels the task; readers get an error, not a hang.
+                self.error = RuntimeError("The shared LLM call was cancelled.")
+                raise
+            except Exception as e:
+                self.error = e
+            finally:
+                self.served = request_served()
+                self.done = True
+                self._notify()
+
+    async def read(self) -> AsyncIterator[Any]:
+        # Readers that join late first get everything produced so far.
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                add_usage(self.usage, self.served)
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+_flights: Dict[str, _Flight] = {}
+# The producing tasks; they finish even when every reader has gone.
+_tasks: Dict[str, "asyncio.Task[None]"] = {}
+
+def stream(stage: str, key: str, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+    """open_stream()'s items, unless a call with this key is running: then that call's."""
+    flight = _flights.get(key)
+    if flight is None:
+        flight = _flights[key] = _Flight()
+
+        async def run() -> None:
+            try:
+                await flight.produce(open_stream())
+            finally:
+                del _flights[key], _tasks[key]
+
+        _tasks[key] = asyncio.create_task(run())
+    else:
+        COALESCED.inc(stage)
+    return flight.read()
+
+async def _once(fn: Callable[[], Awaitable[T]]) -> AsyncIterator[T]:
+    yield await fn()
+
+async def call(stage: str, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """await fn(), unless a call with this key is running: then that call's result."""
+    items = [item async for item in stream(stage, key, lambda: _once(fn))]
+    return items[0]
+
+def in_flight() -> int:
+    return len(_flights)
+
+# -- idempotency keys -----------------------------------------------------------
+
+class IdempotencyConflict(ValueError):
+    status = 422
+
+class IdempotencyInProgress(IdempotencyConflict):
+    status = 409
+
+# A reservation still unfilled after this long belongs to a process that died
+# mid-generation: the key is free again.
+ABANDONED_AFTER_S = 600.0
+
+def ttl_s() -> float:
+    try:
+        return float(os.getenv("IDEMPOTENCY_TTL_S") or 24 * 3600)
+    except ValueError:
+        return 24 * 3600
+
+def idempotency_key(headers: Any) -> Optional[str]:
+    """The request's Idempotency-Key, None without one; ValueError if unusable."""
+    key = (headers.get(IDEMPOTENCY_HEADER) or "").strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LEN:
+        raise ValueError(f"Idempotency-Key is longer than {MAX_KEY_LEN} characters.")
+    return key
+
+async def reserve(key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    None if this request is the key's first submission: it now holds the key and
+    must remember() its result or release() it. Otherwise what the first one
+    stored: {"job_id": ...} for a queued one, {"result": ...} for a finished one.
+    IdempotencyConflict for a different campaign, IdempotencyInProgress while the
+    first one is still generating.
+    """
+    now = time.time()
+    row = await asyncio.to_thread(
+        db.reserve_idempotency_key, key, request_hash, now, now - ttl_s(), now - ABANDONED_AFTER_S
+    )
+    if row is None:
+        return None
+    if row["request_hash"] != request_hash:
+        raise IdempotencyConflict("Idempotency-Key was already used for a different campaign.")
+    if row["job_id"]:
+        return {"job_id": row["job_id"]}
+    if row["result_json"] is None:
+        raise IdempotencyInProgress("A request with this Idempotency-Key is still being processed.")
+    return {"result": json.loads(row["result_json"])}
+
+async def remember(
+    key: str,
+    request_hash: str,
+    result: Optional[Dict[str, Any]] = None,
+    job_id: Optional[str] = None,
+) -> None:
+    result_json = json.dumps(result, ensure_ascii=False) if result is not None else None
+    await asyncio.to_thread(db.save_idempotency_key, key, request_hash, job_id, result_json)
+
+async def release(key: str, request_hash: str) -> None:
+    await asyncio.to_thread(db.release_idempotency_key, key, request_hash)
@@ -1,5 +1,11 @@
+import hashlib
+import os
+from functools import lru_cache
 from io import BytesIO
-import pandas as pd
+from typing import BinaryIO, Iterator, Tuple, Union
+
+# openpyxl (and the numpy it drags in) is imported inside the functions that need
+# it: it is a quarter of main:app's import time and only /template and uploads use it.
 
 TEMPLATE_COLUMNS = [
     "Category",
@@ -15,38 +21,132 @@ TEMPLATE_COLUMNS = [
     "Notes"
 ]
 
-def generate_template_xlsx() -> bytes:
-    sample = pd.DataFrame([{
-        "Category": "Retail",
-        "Objective": "Drive in-store footfall during promo window",
-        "Channels": "DOOH, Display",
-        "Market": "US - NYC",
-        "Flight_Dates": "2026-02-01 to 2026-02-28",
-        "Audience_Logic": "People frequently present near retail corridors and competitor clusters",
-        "Creative_Notes": "Promo-led message + convenience framing, debranded",
-        "Measurement_Type": "Footfall",
-        "Key_Result": "Directional: uplift observed",
-        "POI_Context": "Big-box retail parks + transit-adjacent retail",
-        "Notes": "Promo window coincides with payday week"
-    }], columns=TEMPLATE_COLUMNS)
+REQUIRED_COLUMNS = ["Category", "Objective", "Channels", "Market", "Audience_Logic"]
+
+RESULT_COLUMNS = TEMPLATE_COLUMNS + [
+    "decision_type",
+    "primary_tension",
+    "decision_window",
+    "brief",
+    "provider",
+    "error",
+]
+
+SHEET_NAME = "Campaign_Input"
 
+# Uploads above this are rejected before openpyxl touches them. Over HTTP,
+# app.limits already refuses a larger body while it arrives; this covers callers
+# that hand a workbook over directly.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+XlsxSource = Union[bytes, BinaryIO]
+
+SAMPLE_ROW = {
+    "Category": "Retail",
+    "Objective": "Drive in-store footfall during promo window",
+    "Channels": "DOOH, Display",
+    "Market": "US - NYC",
+    "Flight_Dates": "2026-02-01 to 2026-02-28",
+    "Audience_Logic": "People frequently present near retail corridors and competitor clusters",
+    "Creative_Notes": "Promo-led message + convenience framing, debranded",
+    "Measurement_Type": "Footfall",
+    "Key_Result": "Directional: uplift observed",
+    "POI_Context": "Big-box retail parks + transit-adjacent retail",
+    "Notes": "Promo window coincides with payday week"
+}
+
+def _write_xlsx(sheet_name: str, columns: list, rows) -> bytes:
+    from openpyxl import Workbook
+
+    # write_only streams rows straight into the zip instead of building a cell grid.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append(columns)
+    for r in rows:
+        ws.append([r.get(c, "") for c in columns])
     bio = BytesIO()
-    with pd.ExcelWriter(bio, engine="openpyxl") as writer:
-        sample.to_excel(writer, sheet_name="Campaign_Input", index=False)
+    wb.save(bio)
     return bio.getvalue()
 
-def parse_template_xlsx(file_bytes: bytes) -> dict:
-    bio = BytesIO(file_bytes)
-    df = pd.read_excel(bio, sheet_name="Campaign_Input")
-    if df.empty:
-        raise ValueError("Excel sheet 'Campaign_Input' is empty.")
+@lru_cache(maxsize=1)
+def _template() -> Tuple[bytes, str]:
+    content = _write_xlsx(SHEET_NAME, TEMPLATE_COLUMNS, [SAMPLE_ROW])
+    return content, '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+def generate_template_xlsx() -> bytes:
+    return _template()[0]
+
+def template_etag() -> str:
+    return _template()[1]
+
+def _open(source: XlsxSource) -> BinaryIO:
+    f = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Excel upload is too large ({size // 1024} KB; limit is {MAX_UPLOAD_BYTES // 1024} KB).")
+    return f
+
+def _cell(v) -> str:
+    return "" if v is None else str(v).strip()
+
+def iter_template_rows(source: XlsxSource) -> Iterator[Tuple[int, dict]]:
+    """
+    Stream (excel_row_number, cleaned_row) from 'Campaign_Input', skipping blank rows.
+    Read-only mode parses the sheet XML lazily, so memory does not grow with row count.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_open(source), read_only=True, data_only=True)
+    try:
+        if SHEET_NAME not in wb.sheetnames:
+            raise ValueError(f"Excel sheet '{SHEET_NAME}' not found.")
+        rows = wb[SHEET_NAME].iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if not header:
+            return
+        columns = [_cell(h) for h in header]
+
+        for i, values in enumerate(rows, start=2):
+            cleaned = {c: _cell(v) for c, v in zip(columns, values) if c}
+            if not any(cleaned.values()):
+                continue
+            for c in columns:
+                if c:
+                    cleaned.setdefault(c, "")
+            yield i, cleaned
+    finally:
+        wb.close()
+
+def _missing_fields(cleaned: dict) -> list:
+    return [c for c in REQUIRED_COLUMNS if not cleaned.get(c)]
 
-    row = df.iloc[0].to_dict()
+def parse_template_xlsx(source: XlsxSource) -> dict:
+    for _, cleaned in iter_template_rows(source):
+        missing = _missing_fields(cleaned)
+        if missing:
+            raise ValueError(f"Missing required fields in Excel: {', '.join(missing)}")
+        return cleaned
+    raise ValueError(f"Excel sheet '{SHEET_NAME}' is empty.")
 
-    cleaned = {k: ("" if pd.isna(v) else str(v).strip()) for k, v in row.items()}
+def parse_template_rows(source: XlsxSource) -> tuple[list, list]:
+    """
+    Every non-blank row of 'Campaign_Input' -> (campaigns, errors).
+    Row numbers in errors match what the planner sees in Excel (header is row 1).
+    """
+    campaigns, errors = [], []
+    for i, cleaned in iter_template_rows(source):
+        missing = _missing_fields(cleaned)
+        if missing:
+            errors.append(f"Row {i}: missing {', '.join(missing)}")
+            continue
+        campaigns.append(cleaned)
 
-    missing = [c for c in ["Category", "Objective", "Channels", "Market", "Audience_Logic"] if not cleaned.get(c)]
-    if missing:
-        raise ValueError(f"Missing required fields in Excel: {', '.join(missing)}")
+    if not campaigns and not errors:
+        errors.append(f"Excel sheet '{SHEET_NAME}' is empty.")
+    return campaigns, errors
 
-    return cleaned
+def generate_results_xlsx(results: list) -> bytes:
+    return _write_xlsx("Campaign_Results", RESULT_COLUMNS, results)
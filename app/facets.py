@@ -0,0 +1,173 @@
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.db import DEFAULT_DB_PATH, count_cases, fts_enabled, fts_match_ids, iter_cases_after, max_case_id
+
+# Facet counts and match totals for the case library, answered from memory.
+#
+# Each case is one position in a set of parallel int arrays, one per facet,
+# holding a code for its value (0 = empty). Channels are multi-valued, so they
+# are kept as (position, code) pairs. A filter is then a boolean mask over
+# positions, a total is mask.sum() and a facet is a bincount, without reading
+# `cases`. Like retrieval.CaseIndex, the index catches up on rows with
+# id > last_id before each query, so inserts and imports are picked up
+# incrementally. max(id), the library version, keys the result cache.
+
+FACETS = ("category", "market", "decision_type", "primary_tension", "decision_window")
+CHANNEL = "channel"
+FILTERS = FACETS + (CHANNEL,)
+
+RESULT_CACHE_MAX = 256
+
+Filters = Dict[str, Optional[str]]
+
+class FacetIndex:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH) -> None:
+        self.db_path = db_path
+        self.last_id = 0
+        self.ids = array("q")
+        self.codes: Dict[str, array] = {f: array("i") for f in FACETS}
+        self.channel_pos = array("i")
+        self.channel_code = array("i")
+        # code -> display value, and the reverse. Channels are keyed lowercased
+        # (as in case_channels) and shown as first spelled.
+        self.values: Dict[str, List[str]] = {f: [""] for f in FILTERS}
+        self.lookup: Dict[str, Dict[str, int]] = {f: {"": 0} for f in FILTERS}
+        self._cache: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _code(self, facet: str, value: str, key: Optional[str] = None) -> int:
+        key = value if key is None else key
+        code = self.lookup[facet].get(key)
+        if code is None:
+            code = self.lookup[facet][key] = len(self.values[facet])
+            self.values[facet].append(value)
+        return code
+
+    def add(self, row: Dict[str, Any]) -> None:
+        pos = len(self.ids)
+        for f in FACETS:
+            self.codes[f].append(self._code(f, (row[f] or "").strip()))
+        seen = set()
+        for label in (row["channels"] or "").split(","):
+            label = label.strip()
+            key = label.lower()
+            if key and key not in seen:
+                seen.add(key)
+                self.channel_pos.append(pos)
+                self.channel_code.append(self._code(CHANNEL, label, key))
+        self.ids.append(int(row["id"]))
+        self.last_id = max(self.last_id, int(row["id"]))
+
+    def refresh(self) -> int:
+        """Catch up with the library; returns its version (max case id)."""
+        version = max_case_id(self.db_path)
+        if version > self.last_id:
+            with self._lock:
+                for row in iter_cases_after(
+                    self.last_id,
+                    columns="id, channels, " + ", ".join(FACETS),
+                    db_path=self.db_path,
+                ):
+                    self.add(row)
+        return version
+
+    # -- queries --------------------------------------------------------------
+    # The numpy views below borrow the arrays' buffers, and an array cannot grow
+    # while a view exists, so queries run under the same lock as refresh and
+    # all views are gone by the time _summarize returns.
+
+    def _mask(self, filters: Filters, skip: str = "") -> Optional[np.ndarray]:
+        # None means "every case".
+        mask: Optional[np.ndarray] = None
+        for f, value in filters.items():
+            if not value or f == skip:
+                continue
+            if f == CHANNEL:
+                m = np.zeros(len(self.ids), dtype=bool)
+                code = self.lookup[CHANNEL].get(value.lower())
+                if code:
+                    pos = np.frombuffer(self.channel_pos, dtype=np.int32)
+                    m[pos[np.frombuffer(self.channel_code, dtype=np.int32) == code]] = True
+            else:
+                m = np.frombuffer(self.codes[f], dtype=np.int32) == self.lookup[f].get(value, -1)
+            mask = m if mask is None else mask & m
+        return mask
+
+    def _text_mask(self, q: str) -> Optional[np.ndarray]:
+        ids = fts_match_ids(q, db_path=self.db_path)
+        if ids is None:
+            return None
+        matched = np.asarray(ids, dtype=np.int64)
+        # Matches newer than the last refresh are not in the index yet.
+        matched = matched[matched <= self.last_id]
+        all_ids = np.frombuffer(self.ids, dtype=np.int64)
+        m = np.zeros(len(all_ids), dtype=bool)
+        m[np.searchsorted(all_ids, matched)] = True
+        return m
+
+    def _counts(self, facet: str, mask: Optional[np.ndarray]) -> List[Tuple[str, int]]:
+        if facet == CHANNEL:
+            codes = np.frombuffer(self.channel_code, dtype=np.int32)
+            if mask is not None:
+                codes = codes[mask[np.frombuffer(self.channel_pos, dtype=np.int32)]]
+        else:
+            codes = np.frombuffer(self.codes[facet], dtype=np.int32)
+            if mask is not None:
+                codes = codes[mask]
+        counts = np.bincount(codes, minlength=len(self.values[facet]))
+        values = self.values[facet]
+        out = [(values[c], int(counts[c])) for c in np.flatnonzero(counts) if c]
+        out.sort(key=lambda x: (-x[1], x[0].lower()))
+        return out
+
+    def _summarize(self, q: str, active: Filters) -> Dict[str, Any]:
+        text = self._text_mask(q) if q and fts_enabled(self.db_path) else None
+
+        def restrict(mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+            if text is None:
+                return mask
+            return text if mask is None else mask & text
+
+        facets = {f: self._counts(f, restrict(self._mask(active, skip=f))) for f in FILTERS}
+        mask = restrict(self._mask(active))
+        return {"total": len(self.ids) if mask is None else int(mask.sum()), "facets": facets}
+
+    def summary(self, q: Optional[str] = None, **filters: Optional[str]) -> Dict[str, Any]:
+        """
+        {"total": matching cases, "facets": {facet: [(value, count), ...]}}.
+        Each facet is counted under every other active filter, so its options
+        show how many cases picking that value would leave.
+        """
+        version = self.refresh()
+        q = (q or "").strip()
+        active = {f: (filters.get(f) or "").strip() or None for f in FILTERS}
+        key = (version, q) + tuple(active[f] or "" for f in FILTERS)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                if len(self._cache) >= RESULT_CACHE_MAX:
+                    self._cache.clear()
+                result = self._cache[key] = self._summarize(q, active)
+        return result
+
+_indexes: Dict[str, FacetIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_facets(db_path: str = DEFAULT_DB_PATH) -> FacetIndex:
+    idx = _indexes.get(db_path)
+    if idx is None:
+        with _indexes_lock:
+            idx = _indexes.setdefault(db_path, FacetIndex(db_path))
+    return idx
+
+def library_summary(q: Optional[str] = None, db_path: str = DEFAULT_DB_PATH, **filters: Optional[str]) -> Dict[str, Any]:
+    result = get_facets(db_path).summary(q, **filters)
+    if q and q.strip() and not fts_enabled(db_path):
+        # Without FTS5, free text is a LIKE scan over cases that only SQL can
+        # count; the facet options then ignore the search words.
+        result = dict(result, total=count_cases(q=q, db_path=db_path, **filters))
+    return result
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from app import db
+from app.metrics import JOB_WAIT_SECONDS, JOBS, request_served, request_usage, usage_scope
+from app.pipeline import run_pass_a, run_pass_b
+
+# Generations queued in SQLite (the jobs table) and run by a pool of workers in
+# this process. Unlike batches, jobs survive a restart: the request that queued
+# one only waits for the insert, and the result is picked up later by id.
+#
+#   JOBS_WORKERS        concurrent jobs per process (default 4, 0 disables the pool)
+#   JOBS_MAX_ATTEMPTS   tries before a job is marked failed (default 3)
+#   JOBS_RETRY_BASE_S   backoff before the first retry, doubling after (default 5)
+#   JOBS_LEASE_S        how long a silent worker keeps a job (default 60)
+#   JOBS_KEEP_S         finished jobs are deleted after this long (default 7 days)
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+def workers() -> int:
+    return max(0, int(_env_num("JOBS_WORKERS", 4)))
+
+def max_attempts() -> int:
+    return max(1, int(_env_num("JOBS_MAX_ATTEMPTS", 3)))
+
+def lease_s() -> float:
+    return max(5.0, _env_num("JOBS_LEASE_S", 60.0))
+
+def retry_delay_s(attempts: int) -> float:
+    return min(300.0, _env_num("JOBS_RETRY_BASE_S", 5.0) * 2 ** (attempts - 1))
+
+# An idle worker rechecks the table this often even without a wake-up, which
+# covers retries coming due and jobs queued by another process.
+IDLE_POLL_S = 2.0
+
+# Created by start() on the serving loop. _wake is set when a job is queued and
+# idle workers wait on it; _changed is notified whenever any job changes state.
+_wake: Optional[asyncio.Event] = None
+_changed: Optional[asyncio.Condition] = None
+
+_tasks: Set[asyncio.Task] = set()
+
+def _wake_workers() -> None:
+    if _wake is not None:
+        _wake.set()
+
+async def _notify() -> None:
+    if _changed is not None:
+        async with _changed:
+            _changed.notify_all()
+
+async def enqueue(campaign: Dict[str, Any], input_used: Dict[str, Any]) -> str:
+    job_id = uuid.uuid4().hex
+    payload = json.dumps({"campaign": campaign, "input_used": input_used}, ensure_ascii=False)
+    await asyncio.to_thread(db.enqueue_job, job_id, payload, time.time())
+    JOBS.inc("enqueued")
+    _wake_workers()
+    return job_id
+
+async def get(job_id: str) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(db.get_job, job_id)
+
+async def wait_for_change(timeout: float) -> None:
+    """Returns when some job changed state, or after timeout (jobs run by other processes)."""
+    if _changed is None:
+        await asyncio.sleep(timeout)
+        return
+    try:
+        async with _changed:
+            await asyncio.wait_for(_changed.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+    }
+
+def job_result(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Pass A/B output of a finished job: what /generate would have rendered from."""
+    if job["status"] != "done":
+        return None
+    usage = json.loads(job["usage_json"] or "{}")
+    return {
+        "dm": json.loads(job["decision_map_json"]),
+        "decision_map_json": job["decision_map_json"],
+        "brief": job["brief_text"],
+        "usage": usage,
+        # Stored alongside the token counts (see _run).
+        "served": usage.pop("served", None) or {},
+        "input_used": json.loads(job["input_json"])["input_used"],
+    }
+
+# -- workers ------------------------------------------------------------------
+
+async def _keep_lease(job_id: str) -> None:
+    lease = lease_s()
+    while True:
+        await asyncio.sleep(lease / 3)
+        await asyncio.to_thread(db.renew_job_lease, job_id, time.time() + lease)
+
+async def _run(job: Dict[str, Any]) -> None:
+    campaign = json.loads(job["input_json"])["campaign"]
+    with usage_scope():
+        decision_map_json = job["decision_map_json"]
+        if decision_map_json is None:
+            _, decision_map_json = await run_pass_a(campaign)
+            await asyncio.to_thread(db.save_job_decision_map, job["id"], decision_map_json)
+        brief = await run_pass_b(decision_map_json)
+        # Which provider answered travels with the usage, so a stand-in answer
+        # (metrics.record_served) is still labelled as one when the job is read.
+        usage = {**request_usage(), "served": request_served()}
+    await asyncio.to_thread(db.finish_job, job["id"], brief, json.dumps(usage), time.time())
+
+async def _process(job: Dict[str, Any]) -> None:
+    JOB_WAIT_SECONDS.observe(max(0.0, time.time() - job["available_at"]))
+    heartbeat = asyncio.create_task(_keep_lease(job["id"]))
+    try:
+        await _run(job)
+        JOBS.inc("done")
+    except asyncio.CancelledError:
+        await asyncio.to_thread(db.release_job, job["id"], time.time())
+        raise
+    except Exception as e:
+        now = time.time()
+        if job["attempts"] < max_attempts():
+            await asyncio.to_thread(db.fail_job, job["id"], str(e), now, now + retry_delay_s(job["attempts"]))
+            JOBS.inc("retried")
+        else:
+            await asyncio.to_thread(db.fail_job, job["id"], str(e), now)
+            JOBS.inc("failed")
+    finally:
+        heartbeat.cancel()
+        await _notify()
+
+async def _worker(wake: asyncio.Event) -> None:
+    while True:
+        # Cleared before looking, so a job queued during the claim still wakes us.
+        wake.clear()
+        try:
+            job = await asyncio.to_thread(db.claim_job, time.time(), lease_s())
+        except Exception:
+            # e.g. "database is locked" past busy_timeout: try again on the next tick.
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(wake.wait(), IDLE_POLL_S)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _notify()
+        try:
+            await _process(job)
+        except Exception:
+            # Could not record the outcome; the lease runs out and the reaper requeues it.
+            pass
+
+async def _reaper() -> None:
+    # Jobs left running by a process that died come back once their lease runs out.
+    while True:
+        now = time.time()
+        requeued = await asyncio.to_thread(db.requeue_expired_jobs, now, max_attempts())
+        await asyncio.to_thread(db.prune_jobs, now - _env_num("JOBS_KEEP_S", 7 * 86400))
+        if requeued:
+            _wake_workers()
+            await _notify()
+        await asyncio.sleep(lease_s() / 2)
+
+def _spawn(coro: Any) -> None:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+def start() -> None:
+    global _wake, _changed
+    if _tasks or not workers():
+        return
+    _wake, _changed = asyncio.Event(), asyncio.Condition()
+    _spawn(_reaper())
+    for _ in range(workers()):
+        _spawn(_worker(_wake))
+
+async def stop() -> None:
+    # Cancelled workers hand their job back to the queue (see _process).
+    tasks: List[asyncio.Task] = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def stats() -> Dict[str, Any]:
+    return {"workers": workers(), "started": bool(_tasks), "jobs": db.job_counts()}
@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.db import DEFAULT_DB_PATH, iter_cases_after, max_case_id
+
+# BM25 over the wording of a case: objective, audience logic and the brief.
+# Postings are per-term numpy arrays (doc index, term frequency); scoring a query
+# is a handful of vectorised adds into one float32 array the size of the library.
+# The index is persisted next to the DB and catches up on new ids like CaseIndex.
+
+K1 = 1.2
+B = 0.75
+
+# Persist after this many newly indexed cases, or this long after the first unsaved one.
+SAVE_EVERY_DOCS = int(os.getenv("LEXICAL_SAVE_EVERY_DOCS", "1000"))
+SAVE_EVERY_S = float(os.getenv("LEXICAL_SAVE_EVERY_S", "300"))
+MAX_TOKEN_LEN = 32
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or our so that the their them
+then there these they this to was were will with we you your not no vs via per than more most less
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if 1 < len(t) <= MAX_TOKEN_LEN and t not in STOPWORDS]
+
+def case_text(objective: str, input_json: str, brief_text: str) -> str:
+    audience = ""
+    try:
+        campaign = (json.loads(input_json or "{}") or {}).get("campaign") or {}
+        audience = campaign.get("Audience_Logic") or ""
+    except (ValueError, AttributeError):
+        pass
+    return " ".join([objective or "", audience, brief_text or ""])
+
+def query_text(campaign: Dict[str, Any]) -> str:
+    return " ".join(
+        (campaign.get(k) or "") for k in ("Objective", "Audience_Logic", "Creative_Notes", "Notes")
+    )
+
+def _index_path(db_path: str) -> str:
+    return str(Path(db_path).with_name(Path(db_path).name + ".lexical.npz"))
+
+class LexicalIndex:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH) -> None:
+        self.db_path = db_path
+        self.path = _index_path(db_path)
+        self.last_id = 0
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        # term id -> (doc index array, tf array); new docs go to _pending until a query needs them.
+        self.postings: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._new_ids: List[int] = []
+        self._new_lens: List[int] = []
+        self._unsaved = 0
+        self._saved_at = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids) + len(self._new_ids)
+
+    def add(self, case_id: int, text: str) -> None:
+        tokens = tokenize(text)
+        doc_index = self.n_docs
+        for term, tf in Counter(tokens).items():
+            tid = self.vocab.get(term)
+            if tid is None:
+                tid = self.vocab[term] = len(self.vocab)
+            docs, tfs = self._pending.setdefault(tid, ([], []))
+            docs.append(doc_index)
+            tfs.append(tf)
+        self._new_ids.append(case_id)
+        self._new_lens.append(len(tokens))
+        self.last_id = max(self.last_id, case_id)
+        self._unsaved += 1
+
+    def _flush_docs(self) -> None:
+        if self._new_ids:
+            self.doc_ids = np.concatenate([self.doc_ids, np.asarray(self._new_ids, dtype=np.int64)])
+            self.doc_len = np.concatenate([self.doc_len, np.asarray(self._new_lens, dtype=np.float32)])
+            self._new_ids, self._new_lens = [], []
+
+    def _term(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        docs, tfs = self.postings.get(tid, (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)))
+        pending = self._pending.pop(tid, None)
+        if pending:
+            docs = np.concatenate([docs, np.asarray(pending[0], dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.minimum(pending[1], 65535).astype(np.uint16)])
+            self.postings[tid] = (docs, tfs)
+        return docs, tfs
+
+    def refresh(self) -> None:
+        if max_case_id(self.db_path) <= self.last_id:
+            return
+        with self._lock:
+            for row in iter_cases_after(
+                self.last_id,
+                columns="id, objective, input_json, brief_text",
+                db_path=self.db_path,
+                source="cases_full",
+            ):
+                self.add(int(row["id"]), case_text(row["objective"], row["input_json"], row["brief_text"]))
+            if self._unsaved >= SAVE_EVERY_DOCS or (self._unsaved and time.time() - self._saved_at > SAVE_EVERY_S):
+                self._save_locked()
+
+    def scores(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 score of every case against `text`: (case ids, scores), aligned.
+        """
+        self.refresh()
+        with self._lock:
+            self._flush_docs()
+            n = len(self.doc_ids)
+            scores = np.zeros(n, dtype=np.float32)
+            if n == 0:
+                return self.doc_ids, scores
+            avgdl = float(self.doc_len.mean()) or 1.0
+            norm = K1 * (1.0 - B + B * self.doc_len / avgdl)
+            for term in set(tokenize(text)):
+                tid = self.vocab.get(term)
+                if tid is None:
+                    continue
+                docs, tfs = self._term(tid)
+                df = len(docs)
+                if not df:
+                    continue
+                idf = np.log1p((n - df + 0.5) / (df + 0.5))
+                tfs = tfs.astype(np.float32)
+                # One posting per doc per term, so fancy-index += is safe (no duplicates).
+                scores[docs] += idf * tfs * (K1 + 1.0) / (tfs + norm[docs])
+            return self.doc_ids, scores
+
+    def top_k(self, text: str, k: int) -> List[Tuple[int, float]]:
+        ids, scores = self.scores(text)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    # -- persistence -------------------------------------------------------
+
+    def _save_locked(self) -> None:
+        self._flush_docs()
+        for tid in list(self._pending):
+            self._term(tid)
+
+        terms = sorted(self.postings)
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        for tid in terms:
+            indptr[tid + 1] = len(self.postings[tid][0])
+        indptr = np.cumsum(indptr)
+        docs = np.concatenate([self.postings[t][0] for t in terms]) if terms else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate([self.postings[t][1] for t in terms]) if terms else np.zeros(0, dtype=np.uint16)
+        vocab = sorted(self.vocab, key=self.vocab.get)
+
+        tmp = self.path + ".tmp.npz"
+        np.savez(
+            tmp,
+            last_id=np.asarray([self.last_id], dtype=np.int64),
+            vocab=np.asarray(vocab, dtype=str),
+            indptr=indptr,
+            docs=docs,
+            tfs=tfs,
+            doc_ids=self.doc_ids,
+            doc_len=self.doc_len,
+        )
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+        self._saved_at = time.time()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save_locked()
+
+    def load(self) -> bool:
+        p = Path(self.path)
+        if not p.exists():
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as f:
+                last_id = int(f["last_id"][0])
+                # A smaller library than the index means the DB was replaced: rebuild.
+                if last_id > max_case_id(self.db_path):
+                    return False
+                vocab = [str(t) for t in f["vocab"]]
+                indptr, docs, tfs = f["indptr"], f["docs"], f["tfs"]
+                doc_ids, doc_len = f["doc_ids"], f["doc_len"]
+        except (OSError, ValueError, KeyError):
+            return False
+
+        with self._lock:
+            self.vocab = {t: i for i, t in enumerate(vocab)}
+            self.postings = {
+                tid: (docs[indptr[tid]:indptr[tid + 1]], tfs[indptr[tid]:indptr[tid + 1]])
+                for tid in range(len(vocab))
+                if indptr[tid + 1] > indptr[tid]
+            }
+            self.doc_ids, self.doc_len = doc_ids, doc_len
+            self.last_id = last_id
+            self._pending, self._new_ids, self._new_lens = {}, [], []
+            self._unsaved = 0
+        return True
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_lexical_index(db_path: str = DEFAULT_DB_PATH) -> LexicalIndex:
+    idx = _indexes.get(db_path)
+    if idx is None:
+        with _indexes_lock:
+            idx = _indexes.get(db_path)
+            if idx is None:
+                idx = LexicalIndex(db_path)
+                idx.load()
+                _indexes[db_path] = idx
+    return idx
+
+def save_all() -> None:
+    for idx in list(_indexes.values()):
+        if idx._unsaved:
+            idx.save()
+
+def lexical_matches(text: str, k: int, case_ids: List[int], db_path: str = DEFAULT_DB_PATH) -> Dict[int, float]:
+    """
+    BM25 for the k best lexical matches plus any of `case_ids`, normalised by the
+    best score in the library (0..1). Cases with no shared terms are left out.
+    """
+    ids, scores = get_lexical_index(db_path).scores(text)
+    if not len(scores):
+        return {}
+    best = float(scores.max())
+    if best <= 0:
+        return {}
+
+    k = min(k, len(scores))
+    picks = list(np.argpartition(-scores, k - 1)[:k]) if k else []
+    # doc_ids is ascending (cases are indexed in id order), so positions are a binary search.
+    wanted = np.asarray(case_ids, dtype=np.int64)
+    pos = np.searchsorted(ids, wanted)
+    ok = pos < len(ids)
+    ok[ok] = ids[pos[ok]] == wanted[ok]
+    picks.extend(pos[ok].tolist())
+
+    return {int(ids[i]): float(scores[i]) / best for i in picks if scores[i] > 0}
@@ -0,0 +1,88 @@
+import json
+import os
+from typing import Any, Dict
+
+from app.excel import MAX_UPLOAD_BYTES
+
+# Request body caps, enforced while the body arrives. Starlette spools a whole
+# multipart upload to a temp file before the route runs, so a check in the route
+# (or in app.excel) bounds nothing: here a declared Content-Length over the cap
+# is refused before anything is read, and a body that turns out longer than it
+# claimed (or chunked, without one) is cut off as soon as it crosses the cap.
+#
+#   MAX_UPLOAD_BYTES   any other request body: forms, workbooks, API JSON (default 10 MB)
+#   MAX_IMPORT_BYTES   a JSONL library import (default 1 GB)
+
+MAX_IMPORT_BYTES = int(os.getenv("MAX_IMPORT_BYTES", str(1024 * 1024 * 1024)))
+
+IMPORT_PATHS = ("/library/import/jsonl",)
+
+def body_limit(path: str) -> int:
+    return MAX_IMPORT_BYTES if path in IMPORT_PATHS else MAX_UPLOAD_BYTES
+
+async def _send_too_large(send: Any, limit: int) -> None:
+    body = json.dumps({"error": f"Request body is too large (limit is {limit // 1024} KB)."}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class BodyLimitMiddleware:
+    """413 for request bodies over body_limit(path), without reading past the limit."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = body_limit(scope.get("path", ""))
+        declared = dict(scope.get("headers") or []).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await _send_too_large(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def receive_limited() -> Dict[str, Any]:
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Whatever the route makes of a cut-off body, send_limited answers 413.
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        started = False
+
+        async def send_limited(message: Dict[str, Any]) -> None:
+            nonlocal started
+            if exceeded:
+                if started or message["type"] != "http.response.start":
+                    return
+                await _send_too_large(send, limit)
+                started = True
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_limited)
+        except Exception:
+            # The cut-off body usually surfaces as a ClientDisconnect from the form parser.
+            if not exceeded:
+                raise
+            if not started:
+                await _send_too_large(send, limit)
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.db import DEFAULT_DB_PATH
+
+# Two tiers: a small in-process LRU in front of a SQLite file that lives next to
+# the case library and survives restarts. Values are the raw provider output
+# (JSON for Pass A, text for Pass B); callers re-validate on the way out.
+# Async callers use aget/aset: the LRU is read on the event loop, the SQLite
+# tier always runs in a worker thread.
+
+CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL,
+  created_at REAL NOT NULL,
+  last_access REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);
+"""
+
+def _default_path() -> str:
+    return os.getenv("LLM_CACHE_PATH") or str(Path(DEFAULT_DB_PATH).with_name("bce_llm_cache.sqlite3"))
+
+def enabled() -> bool:
+    return (os.getenv("LLM_CACHE") or "1").strip().lower() not in ("0", "false", "off", "no")
+
+def cache_key(
+    *,
+    provider: str,
+    model: str,
+    system_instruction: str,
+    user_prompt: str,
+    schema: Optional[Dict[str, Any]] = None,
+) -> str:
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "system": system_instruction,
+            "user": user_prompt,
+            "schema": schema,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+    ) -> None:
+        self.path = path or _default_path()
+        self.memory_items = memory_items if memory_items is not None else int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+        self.max_rows = max_rows if max_rows is not None else int(os.getenv("LLM_CACHE_MAX_ROWS", "20000"))
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+
+        self._mem: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        # _lock guards the LRU and counters and is never held across disk I/O;
+        # _db_lock serialises the SQLite connection. Taken in that order only: _db_lock, then _lock.
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            p = Path(self.path)
+            if p.parent and str(p.parent) != ".":
+                p.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.executescript(CACHE_SCHEMA_SQL)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._mem[key] = (created_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is None:
+                return None
+            created_at, value = hit
+            if now - created_at <= self.ttl_s:
+                self._mem.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return value
+            del self._mem[key]
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        with self._db_lock:
+            conn = self._db()
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl_s:
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+        with self._lock:
+            if row is None or now - row[1] > self.ttl_s:
+                self.counters["misses"] += 1
+                return None
+            self._remember(key, row[1], row[0])
+            self.counters["disk_hits"] += 1
+        return row[0]
+
+    def _store(self, key: str, value: str, now: float) -> None:
+        with self._db_lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            conn.commit()
+            self._writes_since_prune += 1
+            # Pruning scans the access index, so amortise it over a batch of writes.
+            evicted = 0
+            if self._writes_since_prune >= 64:
+                self._writes_since_prune = 0
+                evicted = self._prune(now)
+            with self._lock:
+                self.counters["sets"] += 1
+                self.counters["evictions"] += evicted
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else self._get_disk(key, now)
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        self._store(key, value, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        return value if value is not None else await asyncio.to_thread(self._get_disk, key, now)
+
+    async def aset(self, key: str, value: str) -> None:
+        # In memory straight away, so a request right behind this one hits without waiting on the write.
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        await asyncio.to_thread(self._store, key, value, now)
+
+    def _prune(self, now: float) -> int:
+        conn = self._db()
+        cur = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,))
+        evicted = cur.rowcount
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_rows:
+            cur = conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                  SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (count - self.max_rows,),
+            )
+            evicted += cur.rowcount
+        conn.commit()
+        return max(0, evicted)
+
+    def clear(self) -> None:
+        with self._db_lock:
+            self._db().execute("DELETE FROM llm_cache")
+            self._db().commit()
+            with self._lock:
+                self._mem.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "memory_size": len(self._mem),
+                "hit_ratio": (hits / lookups) if lookups else 0.0,
+            }
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
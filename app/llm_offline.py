@@ -1,20 +1,23 @@
 import json
-from typing import Type, TypeVar
+from typing import Any, AsyncIterator, Dict, Type, TypeVar
 from pydantic import BaseModel
 
 T = TypeVar("T", bound=BaseModel)
 
+# Shaped exactly like app.models.DecisionMap, so the offline provider exercises the
+# same validation, derivation and rendering paths as a real one.
 OFFLINE_DECISION_MAP = {
   "decision_being_influenced": "Whether to make a spontaneous store visit during routine travel in the promo window.",
-  "decision_scope": "in-moment",
-  "human_context": {
-    "situation": "People moving through transit-adjacent retail corridors with limited time and competing errands.",
-    "cognitive_load": "Medium—attention is fragmented and decisions are made fast.",
-    "emotional_state": "Pragmatic value-seeking; low patience for friction."
-  },
+  "human_context": "People moving through transit-adjacent retail corridors with limited time and competing errands.",
+  "emotional_state": "Pragmatic value-seeking; low patience for friction.",
+  "cognitive_load": "Medium—attention is fragmented and decisions are made fast.",
+  "decision_type": "Impulse capture",
+  "primary_tension": "Time vs Value",
+  "decision_window": "In-motion",
   "behavioral_tension": {
     "tradeoff": "Save time vs Get value now",
-    "why_this_tension_exists": "The promo creates perceived gain, but the store visit adds uncertainty, detour cost, and time risk."
+    "why_this_tension_exists": "The promo creates perceived gain, but the store visit adds uncertainty, detour cost, and time risk.",
+    "what_resolves_it": "The store sits on the existing route and the offer is simple enough to act on without planning."
   },
   "moment_of_instability": {
     "when": "Weekday evenings + weekend mid-day peaks during the promo window",
@@ -25,17 +28,17 @@ OFFLINE_DECISION_MAP = {
     {
       "signal": "Repeat presence near retail corridors during peak windows",
       "classification": "Observed",
-      "input_dependency": "Audience_Logic + POI_Context"
+      "implication": "Weight inventory towards the corridors this audience already uses."
     },
     {
       "signal": "Higher visit propensity when messaging is time-bound and simple",
       "classification": "Inferred",
-      "input_dependency": "Creative_Notes"
+      "implication": "Lead with the deadline and the saving; drop secondary messages."
     },
     {
       "signal": "Uplift is likely strongest at locations with commute adjacency and clear storefront visibility",
       "classification": "Hypothesis",
-      "input_dependency": "POI_Context + Notes"
+      "implication": "Test commute-adjacent sites against the rest before scaling."
     }
   ],
   "strategic_levers": [
@@ -60,37 +63,56 @@ OFFLINE_DECISION_MAP = {
       "No control design details",
       "Limited creative detail"
     ]
+  },
+  "rejected_alternatives": {
+    "not_decision_types": ["Planned consideration"],
+    "why_not_decision_types": "A promo store visit is rarely researched ahead; it is decided on the way past.",
+    "not_tensions": ["Identity vs Price"],
+    "why_not_tensions": "The offer is about convenience and value, not about what the purchase says about the buyer.",
+    "not_windows": ["Reflective"],
+    "why_not_windows": "There is no later moment to win back: the opportunity exists only while people are on the route."
   }
 }
 
 def generate_structured_offline(*, response_model: Type[T]) -> T:
     return response_model.model_validate(OFFLINE_DECISION_MAP)
 
+def _field(dm: Dict[str, Any], *path: str) -> str:
+    # Missing keys read as "": the fallback must write a brief for any valid map.
+    value: Any = dm
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value if isinstance(value, str) else ""
+
 def generate_text_offline(*, decision_map_json: str) -> str:
     dm = json.loads(decision_map_json)
-    conf = dm.get("confidence_assessment", {}).get("level", "Medium")
+    conf = _field(dm, "confidence_assessment", "level") or "Medium"
+    # DecisionMap.observable_signals may hold any number of entries, including none.
+    signals = "\n".join(
+        f"- ({s.get('classification') or 'Inferred'}) {s['signal']}"
+        for s in dm.get("observable_signals") or []
+        if isinstance(s, dict) and s.get("signal")
+    ) or "- None recorded in the decision map."
 
     return f"""Executive Decision Headline
 A store visit is most influenceable when the retail location collapses into a commuter’s route AND the offer provides a credible “go-now” justification.
 
 Human Context
-- Situation: {dm["human_context"]["situation"]}
-- Cognitive load: {dm["human_context"]["cognitive_load"]}
-- Emotional state: {dm["human_context"]["emotional_state"]}
+- Situation: {_field(dm, "human_context")}
+- Cognitive load: {_field(dm, "cognitive_load")}
+- Emotional state: {_field(dm, "emotional_state")}
 
 Core Behavioral Tension
-- {dm["behavioral_tension"]["tradeoff"]}
-- Why: {dm["behavioral_tension"]["why_this_tension_exists"]}
+- {_field(dm, "behavioral_tension", "tradeoff")}
+- Why: {_field(dm, "behavioral_tension", "why_this_tension_exists")}
 
 Moment of Instability
-- When: {dm["moment_of_instability"]["when"]}
-- Where: {dm["moment_of_instability"]["where"]}
-- Why here: {dm["moment_of_instability"]["why_here_not_elsewhere"]}
+- When: {_field(dm, "moment_of_instability", "when")}
+- Where: {_field(dm, "moment_of_instability", "where")}
+- Why here: {_field(dm, "moment_of_instability", "why_here_not_elsewhere")}
 
 Observable Signals
-- (Observed) {dm["observable_signals"][0]["signal"]}
-- (Inferred) {dm["observable_signals"][1]["signal"]}
-- (Hypothesis) {dm["observable_signals"][2]["signal"]}
+{signals}
 
 Planning Implications
 Prioritise inventory that sits on-route (transit exits, choke points, last-mile corridors). Daypart the message to commute + weekend peaks. Keep creative brutally simple: time-bound value + “quick visit” cues. Use DOOH as environmental validation; use Display for follow-through once attention returns to mobile.
@@ -98,3 +120,14 @@ Prioritise inventory that sits on-route (transit exits, choke points, last-mile
 Confidence
 {conf}
 """
+
+async def agenerate_structured_offline(*, response_model: Type[T]) -> T:
+    return generate_structured_offline(response_model=response_model)
+
+async def agenerate_text_offline(*, decision_map_json: str) -> str:
+    return generate_text_offline(decision_map_json=decision_map_json)
+
+async def astream_text_offline(*, decision_map_json: str) -> AsyncIterator[str]:
+    # Line-sized chunks so the streaming UI behaves the same as with a real provider.
+    for line in generate_text_offline(decision_map_json=decision_map_json).splitlines(keepends=True):
+        yield line
@@ -1,19 +1,97 @@
+import hashlib
 import os
-from typing import Type, TypeVar
+import threading
+from typing import AsyncIterator, Optional, Type, TypeVar
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 
+from app.metrics import record_tokens
+
 T = TypeVar("T", bound=BaseModel)
 
+# One long-lived client per process: the SDK keeps an httpx connection pool
+# inside it, so reusing it saves a TCP/TLS handshake on every pass.
+_shared_sync: Optional[OpenAI] = None
+_shared_async: Optional[AsyncOpenAI] = None
+_lock = threading.Lock()
 
-def _client() -> OpenAI:
+
+def _api_key() -> str:
     # OpenAI SDK reads OPENAI_API_KEY from env automatically,
     # but we also validate it's present to fail clearly.
     key = (os.getenv("OPENAI_API_KEY") or "").strip()
     if not key:
         raise RuntimeError("OPENAI_API_KEY is not set.")
-    return OpenAI(api_key=key)
+    return key
+
+
+def _limits() -> httpx.Limits:
+    max_conn = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    return httpx.Limits(max_connections=max_conn, max_keepalive_connections=max_conn)
+
+
+def _client() -> OpenAI:
+    global _shared_sync
+    if _shared_sync is None:
+        with _lock:
+            if _shared_sync is None:
+                _shared_sync = OpenAI(
+                    api_key=_api_key(),
+                    http_client=httpx.Client(limits=_limits()),
+                )
+    return _shared_sync
+
+
+def _aclient() -> AsyncOpenAI:
+    global _shared_async
+    if _shared_async is None:
+        with _lock:
+            if _shared_async is None:
+                _shared_async = AsyncOpenAI(
+                    api_key=_api_key(),
+                    http_client=httpx.AsyncClient(limits=_limits()),
+                )
+    return _shared_async
+
+
+async def aclose() -> None:
+    """
+    Close the pooled clients (called on app shutdown).
+    """
+    global _shared_sync, _shared_async
+    if _shared_async is not None:
+        await _shared_async.close()
+        _shared_async = None
+    if _shared_sync is not None:
+        _shared_sync.close()
+        _shared_sync = None
+
+
+def _input(system_instruction: str, user_prompt: str) -> list:
+    return [
+        {"role": "system", "content": system_instruction},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _cache_key(system_instruction: str) -> str:
+    # Requests sharing a static prefix are routed to the same cache shard.
+    return "bce-" + hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:16]
+
+
+def _record_usage(model: str, resp) -> None:
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        details = getattr(usage, "input_tokens_details", None)
+        record_tokens(
+            "openai",
+            model,
+            getattr(usage, "input_tokens", None),
+            getattr(usage, "output_tokens", None),
+            getattr(details, "cached_tokens", None),
+        )
 
 
 def generate_structured(
@@ -30,12 +108,11 @@ def generate_structured(
 
     resp = client.responses.parse(
         model=model,
-        input=[
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_prompt},
-        ],
+        input=_input(system_instruction, user_prompt),
+        prompt_cache_key=_cache_key(system_instruction),
         text_format=response_model,
     )
+    _record_usage(model, resp)
 
     return resp.output_parsed
 
@@ -53,10 +130,81 @@ def generate_text(
 
     resp = client.responses.create(
         model=model,
-        input=[
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_prompt},
-        ],
+        input=_input(system_instruction, user_prompt),
+        prompt_cache_key=_cache_key(system_instruction),
+    )
+    _record_usage(model, resp)
+
+    return (resp.output_text or "").strip()
+
+
+async def agenerate_structured(
+    *,
+    model: str,
+    system_instruction: str,
+    user_prompt: str,
+    response_model: Type[T],
+) -> T:
+    """
+    Pass A, non-blocking: awaits the pooled AsyncOpenAI client.
+    """
+    client = _aclient()
+
+    resp = await client.responses.parse(
+        model=model,
+        input=_input(system_instruction, user_prompt),
+        prompt_cache_key=_cache_key(system_instruction),
+        text_format=response_model,
     )
+    _record_usage(model, resp)
+
+    return resp.output_parsed
+
+
+async def agenerate_text(
+    *,
+    model: str,
+    system_instruction: str,
+    user_prompt: str,
+) -> str:
+    """
+    Pass B, non-blocking: awaits the pooled AsyncOpenAI client.
+    """
+    client = _aclient()
+
+    resp = await client.responses.create(
+        model=model,
+        input=_input(system_instruction, user_prompt),
+        prompt_cache_key=_cache_key(system_instruction),
+    )
+    _record_usage(model, resp)
 
     return (resp.output_text or "").strip()
+
+
+async def astream_text(
+    *,
+    model: str,
+    system_instruction: str,
+    user_prompt: str,
+) -> AsyncIterator[str]:
+    """
+    Pass B, streamed: yields output text deltas as they arrive.
+    """
+    client = _aclient()
+
+    stream = await client.responses.create(
+        model=model,
+        input=_input(system_instruction, user_prompt),
+        prompt_cache_key=_cache_key(system_instruction),
+        stream=True,
+    )
+
+    async for event in stream:
+        kind = getattr(event, "type", "")
+        if kind == "response.output_text.delta":
+            delta = getattr(event, "delta", "")
+            if delta:
+                yield delta
+        elif kind == "response.completed":
+            _record_usage(model, getattr(event, "response", None))
@@ -0,0 +1,326 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+# Routing policy for the LLM router: every call gets a latency budget for its pass,
+# a backup (secondary model and/or provider) is fired once the primary runs past
+# its recent p95, and providers that keep failing are skipped by a circuit breaker.
+# When nothing upstream answers in time the error surfaces, unless the offline
+# fallback is switched on: then the offline provider's canned answer is served,
+# and the target it came from is reported (metrics.record_served) so it is never
+# mistaken for a real generation.
+#
+#   LLM_BUDGET_S / LLM_BUDGET_PASS_A_S / LLM_BUDGET_PASS_B_S   total seconds per call
+#   LLM_HEDGE_PROVIDER / LLM_HEDGE_MODEL   backup target (either defaults to the primary's)
+#   LLM_HEDGE_AFTER_S      hedge delay until enough latencies are recorded for a p95
+#   LLM_BREAKER_FAILURES / LLM_BREAKER_COOLDOWN_S
+#   LLM_OFFLINE_FALLBACK   "1" to answer with the offline provider instead of an error
+
+T = TypeVar("T")
+
+# (provider, model)
+Target = Tuple[str, str]
+
+OFFLINE: Target = ("offline", "offline")
+
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+def budget_s(stage: str) -> float:
+    default = _env_float("LLM_BUDGET_S", 60.0)
+    return _env_float(f"LLM_BUDGET_{stage.upper()}_S", default) if stage else default
+
+def targets(primary: Target) -> List[Target]:
+    hedge = (
+        (os.getenv("LLM_HEDGE_PROVIDER") or "").strip().lower() or primary[0],
+        (os.getenv("LLM_HEDGE_MODEL") or "").strip() or primary[1],
+    )
+    return [primary] if hedge == primary or hedge[0] == "offline" else [primary, hedge]
+
+def offline_fallback() -> bool:
+    return (os.getenv("LLM_OFFLINE_FALLBACK") or "0").strip().lower() in ("1", "true", "on", "yes")
+
+class LatencyTracker:
+    """Recent successful call latencies per (stage, provider, model)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self.window = window
+        self._samples: Dict[Tuple[str, str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, target: Target, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((stage, *target), deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, stage: str, target: Target) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get((stage, *target)) or ())
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            "/".join(k): {"n": len(self._samples[k]), "p95_s": self.p95(k[0], (k[1], k[2]))}
+            for k in keys
+        }
+
+class CircuitBreaker:
+    """
+    Closed until `failures` calls in a row fail, then open (calls are refused)
+    for `cooldown_s`, then half-open: one trial call decides whether it closes
+    again or goes back to open. A trial that ends without an answer either way
+    (cancelled: it lost a hedge, or its stream was abandoned) hands the trial
+    slot back through cancelled(), so the next call tries again.
+    """
+
+    def __init__(self, failures: int, cooldown_s: float) -> None:
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown_s:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> Optional[str]:
+        """None if the call is refused, else the state it was let through in ("closed" or "half_open")."""
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return state
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return state
+            return None
+
+    def success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def cancelled(self, admitted: str) -> None:
+        # `admitted` is what allow() returned for the call. A cancelled call says
+        # nothing about the target; only a trial has something to give back.
+        if admitted == "half_open":
+            with self._lock:
+                self._trial = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state(), "trial": self._trial, "consecutive_failures": self._consecutive}
+
+_tracker = LatencyTracker()
+_breakers: Dict[Target, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_counters = {"calls": 0, "hedged": 0, "timeouts": 0, "failures": 0, "breaker_skips": 0, "offline_fallbacks": 0}
+
+def breaker(target: Target) -> CircuitBreaker:
+    b = _breakers.get(target)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.setdefault(target, CircuitBreaker(
+                failures=max(1, int(_env_float("LLM_BREAKER_FAILURES", 5))),
+                cooldown_s=_env_float("LLM_BREAKER_COOLDOWN_S", 30.0),
+            ))
+    return b
+
+def hedge_after_s(stage: str, primary: Target, budget: float) -> float:
+    # Past the primary's p95 the odds favour a fresh call; before there is a p95,
+    # wait half the budget. Never later than the point where a backup could still finish.
+    p95 = _tracker.p95(stage, primary)
+    delay = p95 if p95 is not None else _env_float("LLM_HEDGE_AFTER_S", budget / 2)
+    return min(delay, budget * 0.8)
+
+def _next_allowed(queue: List[Target]) -> Optional[Tuple[Target, str]]:
+    # (target, state its breaker admitted it in)
+    while queue:
+        t = queue.pop(0)
+        admitted = breaker(t).allow()
+        if admitted is not None:
+            return t, admitted
+        _counters["breaker_skips"] += 1
+    return None
+
+async def call(stage: str, primary: Target, fn: Callable[[Target], Awaitable[T]]) -> Tuple[T, Target]:
+    """
+    Run fn(target) under the policy; returns (result, target that produced it).
+    The losing call of a hedge is cancelled, and does not count against its breaker
+    (nor, as a half-open trial, for it).
+    """
+    if primary[0] == "offline":
+        return await fn(primary), primary
+
+    loop = asyncio.get_running_loop()
+    budget = budget_s(stage)
+    deadline = loop.time() + budget
+    hedge_at = loop.time() + hedge_after_s(stage, primary, budget)
+    queue = targets(primary)
+    pending: Dict["asyncio.Task[T]", Tuple[Target, float, str]] = {}
+    last_error: Optional[BaseException] = None
+    _counters["calls"] += 1
+
+    def launch() -> bool:
+        allowed = _next_allowed(queue)
+        if allowed is None:
+            return False
+        t, admitted = allowed
+        pending[asyncio.ensure_future(fn(t))] = (t, loop.time(), admitted)
+        return True
+
+    try:
+        launch()
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                break
+            wake = min(deadline, hedge_at) if queue and now < hedge_at else deadline
+            done, _ = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                t, started, _ = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    breaker(t).failure()
+                    _counters["failures"] += 1
+                    last_error = e
+                    continue
+                breaker(t).success()
+                _tracker.record(stage, t, loop.time() - started)
+                return result, t
+            # A failure frees the slot straight away; a slow primary gets company at hedge_at.
+            if queue and (not pending or loop.time() >= hedge_at):
+                if pending:
+                    _counters["hedged"] += 1
+                launch()
+
+        for t, _, _ in pending.values():
+            breaker(t).failure()
+        if pending:
+            _counters["timeouts"] += 1
+            last_error = TimeoutError(f"LLM call for {stage or 'request'} exceeded its {budget:g}s budget.")
+        pending.clear()
+    finally:
+        # Hedge losers, or everything when this call is itself cancelled.
+        for task, (t, _, admitted) in pending.items():
+            task.cancel()
+            breaker(t).cancelled(admitted)
+
+    if offline_fallback():
+        _counters["offline_fallbacks"] += 1
+        return await fn(OFFLINE), OFFLINE
+    raise last_error or RuntimeError(f"No LLM provider available for {stage or 'request'} (circuit open).")
+
+async def stream(stage: str, primary: Target, open_stream: Callable[[Target], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of call(). Targets are tried in turn until one yields
+    its first chunk within the budget; after that the stream is committed to it
+    (text already shown cannot be swapped), and the rest of the budget bounds
+    each following chunk.
+    """
+    if primary[0] == "offline":
+        async for chunk in open_stream(primary):
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    budget = budget_s(stage)
+    deadline = loop.time() + budget
+    queue = targets(primary)
+    last_error: Optional[BaseException] = None
+    _counters["calls"] += 1
+
+    while True:
+        allowed = _next_allowed(queue)
+        if allowed is None:
+            break
+        t, admitted = allowed
+        it = open_stream(t).__aiter__()
+        started = loop.time()
+        # Cleared once the breaker has heard success() or failure(); a stream that
+        # is cancelled or abandoned by its consumer before that reports cancelled().
+        unsettled = True
+        try:
+            try:
+                first = await asyncio.wait_for(it.__anext__(), timeout=max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                unsettled = False
+                breaker(t).success()
+                return
+            except Exception as e:
+                unsettled = False
+                breaker(t).failure()
+                await it.aclose()
+                if loop.time() >= deadline:
+                    _counters["timeouts"] += 1
+                    last_error = TimeoutError(f"No LLM provider answered {stage or 'request'} within {budget:g}s.")
+                    break
+                _counters["failures"] += 1
+                last_error = e
+                continue
+
+            try:
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(it.__anext__(), timeout=max(0.0, deadline - loop.time()))
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except asyncio.TimeoutError:
+                unsettled = False
+                breaker(t).failure()
+                _counters["timeouts"] += 1
+                raise TimeoutError(f"LLM stream for {stage or 'request'} exceeded its {budget:g}s budget.")
+            except Exception:
+                unsettled = False
+                breaker(t).failure()
+                _counters["failures"] += 1
+                raise
+            finally:
+                await it.aclose()
+            unsettled = False
+            breaker(t).success()
+            _tracker.record(stage, t, loop.time() - started)
+            return
+        finally:
+            if unsettled:
+                breaker(t).cancelled(admitted)
+
+    if not offline_fallback():
+        raise last_error or RuntimeError(f"No LLM provider available for {stage or 'request'} (circuit open).")
+    _counters["offline_fallbacks"] += 1
+    async for chunk in open_stream(OFFLINE):
+        yield chunk
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_counters,
+        "breakers": {"/".join(t): b.snapshot() for t, b in list(_breakers.items())},
+        "latency": _tracker.stats(),
+    }
@@ -1,18 +1,32 @@
+import asyncio
 import os
-from typing import Type, TypeVar
+import sys
+from typing import AsyncIterator, Dict, Type, TypeVar
 from pydantic import BaseModel
 
+from app import llm_cache, llm_policy, metrics
+
 T = TypeVar("T", bound=BaseModel)
 
 def provider() -> str:
     return (os.getenv("LLM_PROVIDER") or "offline").strip().lower()
 
+def answered_by(served: Dict[str, str]) -> str:
+    # The provider(s) that actually wrote an answer (metrics.request_served): a
+    # hedge or the offline fallback can stand in for the configured one. Nothing
+    # recorded (a cache hit) means the configured provider.
+    return ", ".join(dict.fromkeys(served.values())) or provider()
+
 def generate_structured(*, model: str, system_instruction: str, user_prompt: str, response_model: Type[T]) -> T:
     p = provider()
     if p == "offline":
         from app.llm_offline import generate_structured_offline
         return generate_structured_offline(response_model=response_model)
 
+    if p == "simulated":
+        from app.llm_simulated import generate_structured as simulated_structured
+        return simulated_structured(model=model, user_prompt=user_prompt, response_model=response_model)
+
     # Keep for later if you regain access
     if p == "openai":
         from app.llm_openai import generate_structured as openai_structured
@@ -42,6 +56,10 @@ def generate_text(*, model: str, system_instruction: str, user_prompt: str, deci
         from app.llm_offline import generate_text_offline
         return generate_text_offline(decision_map_json=decision_map_json)
 
+    if p == "simulated":
+        from app.llm_simulated import generate_text as simulated_text
+        return simulated_text(model=model, user_prompt=user_prompt, decision_map_json=decision_map_json)
+
     if p == "openai":
         from app.llm_openai import generate_text as openai_text
         return openai_text(model=model, system_instruction=system_instruction, user_prompt=user_prompt)
@@ -51,3 +69,254 @@ def generate_text(*, model: str, system_instruction: str, user_prompt: str, deci
         return gemini_text(model=model, system_instruction=system_instruction, user_prompt=user_prompt)
 
     raise RuntimeError(f"Unknown LLM_PROVIDER: {p}")
+
+# Async interface: what app.web awaits so a slow upstream never blocks the event loop.
+# Providers without a native async client run their sync call in a worker thread.
+
+async def _astructured(p: str, *, model: str, system_instruction: str, user_prompt: str, response_model: Type[T]) -> T:
+    if p == "offline":
+        from app.llm_offline import agenerate_structured_offline
+        return await agenerate_structured_offline(response_model=response_model)
+
+    if p == "simulated":
+        from app.llm_simulated import agenerate_structured as simulated_structured
+        return await simulated_structured(model=model, user_prompt=user_prompt, response_model=response_model)
+
+    if p == "openai":
+        from app.llm_openai import agenerate_structured as openai_structured
+        return await openai_structured(
+            model=model,
+            system_instruction=system_instruction,
+            user_prompt=user_prompt,
+            response_model=response_model,
+        )
+
+    if p == "gemini":
+        return await asyncio.to_thread(
+            generate_structured,
+            model=model,
+            system_instruction=system_instruction,
+            user_prompt=user_prompt,
+            response_model=response_model,
+        )
+
+    raise RuntimeError(f"Unknown LLM_PROVIDER: {p}")
+
+async def _atext(p: str, *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str) -> str:
+    if p == "offline":
+        from app.llm_offline import agenerate_text_offline
+        return await agenerate_text_offline(decision_map_json=decision_map_json)
+
+    if p == "simulated":
+        from app.llm_simulated import agenerate_text as simulated_text
+        return await simulated_text(model=model, user_prompt=user_prompt, decision_map_json=decision_map_json)
+
+    if p == "openai":
+        from app.llm_openai import agenerate_text as openai_text
+        return await openai_text(model=model, system_instruction=system_instruction, user_prompt=user_prompt)
+
+    if p == "gemini":
+        return await asyncio.to_thread(
+            generate_text,
+            model=model,
+            system_instruction=system_instruction,
+            user_prompt=user_prompt,
+            decision_map_json=decision_map_json,
+        )
+
+    raise RuntimeError(f"Unknown LLM_PROVIDER: {p}")
+
+def _use_cache(p: str) -> bool:
+    # The offline provider is already instant; caching it would only add disk writes.
+    # The simulated one exists to be slow, so a cache would defeat the point.
+    return p not in ("offline", "simulated") and llm_cache.enabled()
+
+# The public async calls go through llm_policy (budget, hedge, breaker, offline
+# fallback). `stage` names the pass for per-pass budgets and latency tracking.
+# Only answers from the primary target are cached: a hedge or fallback answer is
+# a stand-in, not what the configured model would have said. Whichever target
+# answered is reported through metrics.record_served; a cache hit reports none
+# (it is the primary's answer). metrics.llm_stage carries `stage` only for the
+# duration of the call, so it does not stay on whatever the caller runs next.
+
+async def agenerate_structured(
+    *, model: str, system_instruction: str, user_prompt: str, response_model: Type[T], stage: str = "",
+) -> T:
+    token = metrics.llm_stage.set(stage)
+    try:
+        return await _agenerate_structured(
+            model=model, system_instruction=system_instruction, user_prompt=user_prompt,
+            response_model=response_model, stage=stage,
+        )
+    finally:
+        metrics.llm_stage.reset(token)
+
+async def _agenerate_structured(
+    *, model: str, system_instruction: str, user_prompt: str, response_model: Type[T], stage: str,
+) -> T:
+    p = provider()
+
+    async def attempt(target: llm_policy.Target) -> T:
+        return await _astructured(
+            target[0], model=target[1], system_instruction=system_instruction,
+            user_prompt=user_prompt, response_model=response_model,
+        )
+
+    if not _use_cache(p):
+        result, served = await llm_policy.call(stage, (p, model), attempt)
+        metrics.record_served(*served)
+        return result
+
+    cache = llm_cache.get_cache()
+    key = llm_cache.cache_key(
+        provider=p,
+        model=model,
+        system_instruction=system_instruction,
+        user_prompt=user_prompt,
+        schema=response_model.model_json_schema(),
+    )
+    hit = await cache.aget(key)
+    if hit is not None:
+        with metrics.stage("validate"):
+            return response_model.model_validate_json(hit)
+
+    result, served = await llm_policy.call(stage, (p, model), attempt)
+    metrics.record_served(*served)
+    if served == (p, model):
+        await cache.aset(key, result.model_dump_json())
+    return result
+
+async def agenerate_text(
+    *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str, stage: str = "",
+) -> str:
+    token = metrics.llm_stage.set(stage)
+    try:
+        return await _agenerate_text(
+            model=model, system_instruction=system_instruction, user_prompt=user_prompt,
+            decision_map_json=decision_map_json, stage=stage,
+        )
+    finally:
+        metrics.llm_stage.reset(token)
+
+async def _agenerate_text(
+    *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str, stage: str,
+) -> str:
+    p = provider()
+
+    async def attempt(target: llm_policy.Target) -> str:
+        return await _atext(
+            target[0], model=target[1], system_instruction=system_instruction,
+            user_prompt=user_prompt, decision_map_json=decision_map_json,
+        )
+
+    if not _use_cache(p):
+        text, served = await llm_policy.call(stage, (p, model), attempt)
+        metrics.record_served(*served)
+        return text
+
+    cache = llm_cache.get_cache()
+    key = llm_cache.cache_key(provider=p, model=model, system_instruction=system_instruction, user_prompt=user_prompt)
+    hit = await cache.aget(key)
+    if hit is not None:
+        return hit
+
+    text, served = await llm_policy.call(stage, (p, model), attempt)
+    metrics.record_served(*served)
+    if text and served == (p, model):
+        await cache.aset(key, text)
+    return text
+
+async def _astream(p: str, *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str) -> AsyncIterator[str]:
+    if p == "offline":
+        from app.llm_offline import astream_text_offline
+        async for chunk in astream_text_offline(decision_map_json=decision_map_json):
+            yield chunk
+        return
+
+    if p == "simulated":
+        from app.llm_simulated import astream_text as simulated_stream
+        async for chunk in simulated_stream(model=model, user_prompt=user_prompt, decision_map_json=decision_map_json):
+            yield chunk
+        return
+
+    if p == "openai":
+        from app.llm_openai import astream_text as openai_stream
+        async for chunk in openai_stream(model=model, system_instruction=system_instruction, user_prompt=user_prompt):
+            yield chunk
+        return
+
+    # No streaming client for this provider: deliver the whole text as one chunk.
+    yield await _atext(p, model=model, system_instruction=system_instruction, user_prompt=user_prompt, decision_map_json=decision_map_json)
+
+def astream_text(
+    *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str, stage: str = "",
+) -> AsyncIterator[str]:
+    return _staged(stage, _astream_text(
+        model=model, system_instruction=system_instruction, user_prompt=user_prompt,
+        decision_map_json=decision_map_json, stage=stage,
+    ))
+
+async def _staged(stage: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    # A generator runs in its consumer's context: the stage is set only while
+    # `chunks` runs, not between chunks, where the consumer's own code runs.
+    it = chunks.__aiter__()
+    try:
+        while True:
+            token = metrics.llm_stage.set(stage)
+            try:
+                chunk = await it.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                metrics.llm_stage.reset(token)
+            yield chunk
+    finally:
+        await it.aclose()  # type: ignore[attr-defined]
+
+async def _astream_text(
+    *, model: str, system_instruction: str, user_prompt: str, decision_map_json: str, stage: str,
+) -> AsyncIterator[str]:
+    p = provider()
+    served: list = []
+
+    def open_stream(target: llm_policy.Target) -> AsyncIterator[str]:
+        served[:] = [target]
+        return _astream(
+            target[0], model=target[1], system_instruction=system_instruction,
+            user_prompt=user_prompt, decision_map_json=decision_map_json,
+        )
+
+    if not _use_cache(p):
+        async for chunk in llm_policy.stream(stage, (p, model), open_stream):
+            yield chunk
+        metrics.record_served(*served[0])
+        return
+
+    cache = llm_cache.get_cache()
+    key = llm_cache.cache_key(provider=p, model=model, system_instruction=system_instruction, user_prompt=user_prompt)
+    hit = await cache.aget(key)
+    if hit is not None:
+        yield hit
+        return
+
+    # Shares the agenerate_text cache entry, but only once the stream completed.
+    parts = []
+    async for chunk in llm_policy.stream(stage, (p, model), open_stream):
+        parts.append(chunk)
+        yield chunk
+    metrics.record_served(*served[0])
+    text = "".join(parts).strip()
+    if text and served == [(p, model)]:
+        await cache.aset(key, text)
+
+def cache_stats() -> dict:
+    return llm_cache.get_cache().stats()
+
+def routing_stats() -> dict:
+    return llm_policy.stats()
+
+async def aclose() -> None:
+    # Only touch the OpenAI module if it was ever imported; no point loading the SDK at shutdown.
+    mod = sys.modules.get("app.llm_openai")
+    if mod is not None:
+        await mod.aclose()
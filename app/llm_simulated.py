@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type, TypeVar, get_args
+
+from pydantic import BaseModel
+
+from app.llm_offline import OFFLINE_DECISION_MAP, generate_text_offline
+from app.metrics import record_tokens
+from app.models import DecisionType, DecisionWindow, PrimaryTension
+
+# LLM_PROVIDER=simulated: behaves like a slow, occasionally failing upstream so
+# workers, timeouts, hedging and queues can be sized locally without API spend.
+# The output is the offline decision map, varied deterministically per input.
+#
+#   SIM_LATENCY_PASS_A   Pass A call time         e.g. "lognormal:4,0.5" (median s, sigma)
+#   SIM_LATENCY_PASS_B   Pass B time to first token   "uniform:1,3" / "fixed:2" / "normal:3,1"
+#   SIM_TOKENS_PER_S     Pass B output rate after the first token (default 40)
+#   SIM_QUOTA_ERROR_RATE / SIM_TIMEOUT_RATE / SIM_MALFORMED_RATE   fault probabilities, 0..1
+#   SIM_TIMEOUT_S        how long an injected timeout hangs before raising (default 30)
+#   SIM_SEED             makes latencies and faults reproducible across runs
+
+T = TypeVar("T", bound=BaseModel)
+
+DEFAULT_LATENCY = {"pass_a": "lognormal:4,0.5", "pass_b": "lognormal:1.5,0.4"}
+
+_rng = random.Random(os.getenv("SIM_SEED"))
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+def parse_distribution(spec: str) -> Tuple[str, List[float]]:
+    """'lognormal:4,0.5' -> ('lognormal', [4.0, 0.5]). Raises ValueError on anything else."""
+    kind, _, args = (spec or "").strip().lower().partition(":")
+    params = [float(a) for a in args.split(",") if a.strip()]
+    arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+    if arity.get(kind) != len(params):
+        raise ValueError(f"Bad simulated latency '{spec}': use fixed:S, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA.")
+    return kind, params
+
+def sample_latency(stage: str, rng: random.Random = _rng) -> float:
+    kind, p = parse_distribution(os.getenv(f"SIM_LATENCY_{stage.upper()}") or DEFAULT_LATENCY[stage])
+    if kind == "fixed":
+        value = p[0]
+    elif kind == "uniform":
+        value = rng.uniform(p[0], p[1])
+    elif kind == "normal":
+        value = rng.gauss(p[0], p[1])
+    else:
+        value = rng.lognormvariate(0.0, p[1]) * p[0]
+    return max(0.0, value)
+
+FAULT_RATES = {"quota": "SIM_QUOTA_ERROR_RATE", "timeout": "SIM_TIMEOUT_RATE", "malformed": "SIM_MALFORMED_RATE"}
+
+def _fault() -> Optional[str]:
+    # One roll per call, so the rates are exclusive and add up to the total fault rate.
+    roll = _rng.random()
+    for fault, env in FAULT_RATES.items():
+        rate = _env_float(env, 0.0)
+        if roll < rate:
+            return fault
+        roll -= rate
+    return None
+
+def _raise_fault(fault: Optional[str]) -> None:
+    if fault == "quota":
+        # Same wording as the OpenAI 429, so app.web's friendly error path is exercised.
+        raise RuntimeError("Error code: 429 - You exceeded your current quota (insufficient_quota). [simulated]")
+
+async def _ainject(fault: Optional[str]) -> None:
+    _raise_fault(fault)
+    if fault == "timeout":
+        await asyncio.sleep(_env_float("SIM_TIMEOUT_S", 30.0))
+        raise TimeoutError("Request timed out. [simulated]")
+
+def _inject(fault: Optional[str]) -> None:
+    _raise_fault(fault)
+    if fault == "timeout":
+        time.sleep(_env_float("SIM_TIMEOUT_S", 30.0))
+        raise TimeoutError("Request timed out. [simulated]")
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+# -- output --------------------------------------------------------------------
+
+_OBJECTIVE_RE = re.compile(r'"Objective":\s*"((?:[^"\\]|\\.)*)"')
+_CHANNELS_RE = re.compile(r'"Channels":\s*"((?:[^"\\]|\\.)*)"')
+
+def decision_map_for(user_prompt: str) -> Dict[str, Any]:
+    """The offline decision map, varied by a hash of the prompt: same input, same map."""
+    rng = random.Random(hashlib.sha256(user_prompt.encode("utf-8")).digest())
+    dm = json.loads(json.dumps(OFFLINE_DECISION_MAP))
+    dm["decision_type"] = rng.choice(get_args(DecisionType))
+    dm["primary_tension"] = rng.choice(get_args(PrimaryTension))
+    dm["decision_window"] = rng.choice(get_args(DecisionWindow))
+    dm["confidence_assessment"]["level"] = rng.choice(["Low", "Medium", "High"])
+    dm["observable_signals"] = rng.sample(dm["observable_signals"], rng.randint(1, len(dm["observable_signals"])))
+    rng.shuffle(dm["strategic_levers"])
+
+    objective = _OBJECTIVE_RE.search(user_prompt)
+    if objective:
+        dm["decision_being_influenced"] = f"Whether to act on: {objective.group(1)}"
+    channels = _CHANNELS_RE.search(user_prompt)
+    if channels:
+        dm["planning_implications"]["channel_role_logic"] = (
+            f"Sequence {channels.group(1)} around the {dm['decision_window'].lower()} window."
+        )
+    return dm
+
+def _structured(model: str, user_prompt: str, response_model: Type[T], fault: Optional[str]) -> T:
+    payload = json.dumps(decision_map_for(user_prompt))
+    if fault == "malformed":
+        # A truncated response body: fails validation the way a bad upstream reply does.
+        payload = payload[: len(payload) // 2]
+    result = response_model.model_validate_json(payload)
+    record_tokens("simulated", model, _approx_tokens(user_prompt), _approx_tokens(payload))
+    return result
+
+def _text(decision_map_json: str) -> str:
+    # The brief for the map it was given, however many signals that map kept.
+    return generate_text_offline(decision_map_json=decision_map_json)
+
+def _finish_text(model: str, user_prompt: str, text: str, fault: Optional[str]) -> str:
+    if fault == "malformed":
+        # Pass B has no schema to break; a reply cut off mid-way is the text equivalent.
+        text = text[: len(text) // 2]
+    record_tokens("simulated", model, _approx_tokens(user_prompt), _approx_tokens(text))
+    return text.strip()
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\S+\s*|\s+", text)
+
+def _tokens_per_s() -> float:
+    return max(1.0, _env_float("SIM_TOKENS_PER_S", 40.0))
+
+# -- provider interface ----------------------------------------------------------
+
+def generate_structured(*, model: str, user_prompt: str, response_model: Type[T]) -> T:
+    fault = _fault()
+    time.sleep(sample_latency("pass_a"))
+    _inject(fault)
+    return _structured(model, user_prompt, response_model, fault)
+
+def generate_text(*, model: str, user_prompt: str, decision_map_json: str) -> str:
+    fault = _fault()
+    text = _text(decision_map_json)
+    time.sleep(sample_latency("pass_b") + len(_words(text)) / _tokens_per_s())
+    _inject(fault)
+    return _finish_text(model, user_prompt, text, fault)
+
+async def agenerate_structured(*, model: str, user_prompt: str, response_model: Type[T]) -> T:
+    fault = _fault()
+    await asyncio.sleep(sample_latency("pass_a"))
+    await _ainject(fault)
+    return _structured(model, user_prompt, response_model, fault)
+
+async def agenerate_text(*, model: str, user_prompt: str, decision_map_json: str) -> str:
+    fault = _fault()
+    text = _text(decision_map_json)
+    await asyncio.sleep(sample_latency("pass_b") + len(_words(text)) / _tokens_per_s())
+    await _ainject(fault)
+    return _finish_text(model, user_prompt, text, fault)
+
+async def astream_text(*, model: str, user_prompt: str, decision_map_json: str) -> AsyncIterator[str]:
+    fault = _fault()
+    await asyncio.sleep(sample_latency("pass_b"))
+    await _ainject(fault)
+    text = _text(decision_map_json)
+    words = _words(text)
+    delay = 1.0 / _tokens_per_s()
+    for i, word in enumerate(words):
+        if fault == "malformed" and i == len(words) // 2:
+            raise RuntimeError("Stream ended unexpectedly. [simulated]")
+        yield word
+        await asyncio.sleep(delay)
+    record_tokens("simulated", model, _approx_tokens(user_prompt), _approx_tokens(text))
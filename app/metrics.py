@@ -0,0 +1,260 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# In-process metrics in Prometheus text format, plus per-request stage timings for
+# the Server-Timing header. Deliberately dependency-free and cheap: a histogram
+# observation is a bisect and two adds under a lock, so it can sit around every
+# SQLite call. Counts are per process (one uvicorn worker on Render).
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+INF = 'le="+Inf"'
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, k)} {v:g}" for k, v in items]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS) -> None:
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts, +Inf count in the last slot), sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, k, le)} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, k, INF)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, k)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, k)} {cumulative}")
+        return lines
+
+HTTP_SECONDS = Histogram("bce_http_request_seconds", "HTTP request latency.", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("bce_stage_seconds", "Time spent in each step of a generate request.", ("stage",))
+DB_SECONDS = Histogram("bce_db_query_seconds", "SQLite call latency by app.db function.", ("op",), DB_BUCKETS)
+LLM_TOKENS = Counter("bce_llm_tokens_total", "Tokens reported by the LLM provider.", ("stage", "provider", "model", "kind"))
+PROMPT_TOKENS = Histogram("bce_prompt_tokens", "Estimated input tokens per assembled prompt.", ("stage",), TOKEN_BUCKETS)
+JOBS = Counter("bce_jobs_total", "Queued generation jobs by outcome.", ("outcome",))
+JOB_WAIT_SECONDS = Histogram("bce_job_queue_seconds", "Time a job waited in the queue before a worker picked it up.")
+COALESCED = Counter("bce_coalesced_total", "LLM calls answered by an identical call already in flight.", ("stage",))
+IDEMPOTENT_REPLAYS = Counter("bce_idempotent_replays_total", "Submissions answered from a stored Idempotency-Key result.")
+LLM_ANSWERS = Counter(
+    "bce_llm_answers_total",
+    "LLM calls by the provider and model that answered (a hedge or the offline fallback, not always the configured one).",
+    ("stage", "provider", "model"),
+)
+
+REGISTRY = [
+    HTTP_SECONDS, STAGE_SECONDS, DB_SECONDS, LLM_TOKENS, PROMPT_TOKENS, JOBS, JOB_WAIT_SECONDS,
+    COALESCED, IDEMPOTENT_REPLAYS, LLM_ANSWERS,
+]
+
+def expose() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.expose()) + "\n"
+
+# -- per-request timings ----------------------------------------------------
+
+# (stage, seconds) recorded during the current request; None outside one.
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("bce_timings", default=None)
+
+# Which pass an LLM call belongs to, for token accounting inside provider modules.
+llm_stage: ContextVar[str] = ContextVar("bce_llm_stage", default="")
+
+# Provider-reported tokens for the current request: kind -> count, summed over calls.
+_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("bce_usage", default=None)
+
+USAGE_KINDS = ("prompt", "cached", "completion")
+
+# Which provider answered each LLM pass of the current request: stage -> provider.
+_served: ContextVar[Optional[Dict[str, str]]] = ContextVar("bce_served", default=None)
+
+def _note(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, name)
+        _note(name, dt)
+
+def timed_db(op: str) -> Callable[[F], F]:
+    def wrap(fn: F) -> F:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = time.perf_counter() - t0
+                DB_SECONDS.observe(dt, op)
+                _note("db", dt)
+        return inner  # type: ignore[return-value]
+    return wrap
+
+def record_tokens(
+    provider: str,
+    model: str,
+    input_tokens: Optional[int],
+    output_tokens: Optional[int],
+    cached_tokens: Optional[int] = None,
+) -> None:
+    # cached_tokens is the part of input_tokens served from the provider's prefix cache.
+    s = llm_stage.get() or "other"
+    usage = _usage.get()
+    for kind, usage_kind, n in (
+        ("input", "prompt", input_tokens),
+        ("cached", "cached", cached_tokens),
+        ("output", "completion", output_tokens),
+    ):
+        if n:
+            LLM_TOKENS.inc(s, provider, model, kind, amount=n)
+            if usage is not None:
+                usage[usage_kind] = usage.get(usage_kind, 0) + n
+
+def record_served(provider: str, model: str) -> None:
+    s = llm_stage.get() or "other"
+    LLM_ANSWERS.inc(s, provider, model)
+    served = _served.get()
+    if served is not None:
+        served[s] = provider
+
+def add_usage(usage: Dict[str, int], served: Dict[str, str]) -> None:
+    # Usage and providers of a call made on this request's behalf in another
+    # context (a shared in-flight call, app.dedup); the counters already have it.
+    mine = _usage.get()
+    if mine is not None:
+        for kind, n in usage.items():
+            mine[kind] = mine.get(kind, 0) + n
+    mine_served = _served.get()
+    if mine_served is not None:
+        mine_served.update(served)
+
+def record_prompt(stage_name: str, tokens: int) -> None:
+    PROMPT_TOKENS.observe(tokens, stage_name)
+
+@contextmanager
+def usage_scope() -> Iterator[Dict[str, int]]:
+    """Collect token usage (and served providers) for work outside an HTTP request (queued jobs)."""
+    usage: Dict[str, int] = {}
+    token = _usage.set(usage)
+    served_token = _served.set({})
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+        _served.reset(served_token)
+
+def request_usage() -> Dict[str, int]:
+    """Tokens reported so far in this request (zeros outside one, or with cached answers)."""
+    usage = _usage.get() or {}
+    return {k: usage.get(k, 0) for k in USAGE_KINDS}
+
+def request_served() -> Dict[str, str]:
+    """stage -> provider that answered it in this request; empty for cached or replayed answers."""
+    return dict(_served.get() or {})
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    # Repeated stages (db calls) are summed into one entry.
+    merged: Dict[str, float] = {}
+    for name, dt in timings:
+        merged[name] = merged.get(name, 0.0) + dt
+    merged["total"] = total
+    return ", ".join(f"{name};dur={dt * 1000:.1f}" for name, dt in merged.items())
+
+class MetricsMiddleware:
+    """
+    Pure ASGI (so streamed responses pass through untouched): times every HTTP
+    request and adds a Server-Timing header with the stages recorded before the
+    response started. Streamed bodies (SSE) only carry what ran before the first byte.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        usage_token = _usage.set({})
+        served_token = _served.set({})
+        t0 = time.perf_counter()
+        status = ["500"]
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+                header = server_timing(timings, time.perf_counter() - t0).encode("latin-1")
+                message["headers"] = list(message.get("headers") or []) + [(b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            _usage.reset(usage_token)
+            _served.reset(served_token)
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - t0,
+                scope.get("method", ""),
+                getattr(route, "path", None) or "unmatched",
+                status[0],
+            )
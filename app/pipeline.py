@@ -0,0 +1,81 @@
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from app.metrics import record_prompt, stage
+from app.models import DecisionMap
+from app.llm_router import agenerate_structured, agenerate_text, astream_text, provider
+
+# The two LLM passes, shared by the HTML form, the SSE stream and anything else
+# that needs a brief for a campaign dict. Identical calls already in flight are
+# joined rather than repeated (app.dedup). app.dedup and app.prompting are
+# imported on first use, not at startup (scripts/check_import_time.py).
+
+def pass_a_model() -> str:
+    return os.getenv("PASS_A_MODEL", "gpt-4o-mini").strip()
+
+def pass_b_model() -> str:
+    return os.getenv("PASS_B_MODEL", "gpt-4o").strip()
+
+async def run_pass_a(campaign: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Structured decision map for a campaign: (dm dict, pretty JSON)."""
+    from app import dedup
+    from app.prompting import drop_empty, pass_a_prompt
+    prompt = pass_a_prompt(campaign)
+    record_prompt("pass_a", prompt.tokens)
+    model = pass_a_model()
+    key = dedup.canonical_hash("pass_a", provider(), model, prompt.system, drop_empty(campaign))
+
+    with stage("pass_a"):
+        decision_map_obj = await dedup.call("pass_a", key, lambda: agenerate_structured(
+            model=model,
+            system_instruction=prompt.system,
+            user_prompt=prompt.user,
+            response_model=DecisionMap,
+            stage="pass_a",
+        ))
+    with stage("decision_map"):
+        dm = decision_map_obj.model_dump()
+        return dm, json.dumps(dm, ensure_ascii=False, indent=2)
+
+def _pass_b_key(system: str, user: str, model: str) -> str:
+    # Shared by run_pass_b and stream_pass_b: either kind of call can join the other.
+    from app import dedup
+    return dedup.canonical_hash("pass_b", provider(), model, system, user)
+
+async def _text_once(**kwargs: Any) -> AsyncIterator[str]:
+    yield await agenerate_text(**kwargs)
+
+async def run_pass_b(decision_map_json: str) -> str:
+    """Narrative brief from the decision map."""
+    from app import dedup
+    from app.prompting import pass_b_prompt
+    prompt = pass_b_prompt(decision_map_json)
+    record_prompt("pass_b", prompt.tokens)
+    model = pass_b_model()
+    with stage("pass_b"):
+        chunks = dedup.stream("pass_b", _pass_b_key(prompt.system, prompt.user, model), lambda: _text_once(
+            model=model,
+            system_instruction=prompt.system,
+            user_prompt=prompt.user,
+            decision_map_json=decision_map_json,
+            stage="pass_b",
+        ))
+        return "".join([chunk async for chunk in chunks])
+
+async def stream_pass_b(decision_map_json: str) -> AsyncIterator[str]:
+    """Same as run_pass_b, but yields the brief as it is produced."""
+    from app import dedup
+    from app.prompting import pass_b_prompt
+    prompt = pass_b_prompt(decision_map_json)
+    record_prompt("pass_b", prompt.tokens)
+    model = pass_b_model()
+    with stage("pass_b"):
+        async for chunk in dedup.stream("pass_b", _pass_b_key(prompt.system, prompt.user, model), lambda: astream_text(
+            model=model,
+            system_instruction=prompt.system,
+            user_prompt=prompt.user,
+            decision_map_json=decision_map_json,
+            stage="pass_b",
+        )):
+            yield chunk
@@ -0,0 +1,76 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional
+
+from app.prompts import (
+    PASS_A_INSTRUCTIONS, PASS_A_SYSTEM, PASS_A_USER_TEMPLATE,
+    PASS_B_INSTRUCTIONS, PASS_B_SYSTEM, PASS_B_USER_TEMPLATE,
+)
+
+# Prompt assembly for the two passes. Static text (role, allowed values, format)
+# forms one fixed system prefix per pass; the variable JSON comes last, compact
+# and without empty fields. Pretty-printed JSON costs ~30% more tokens and a
+# prefix that changes per request can never be served from the provider's cache.
+
+class Prompt(NamedTuple):
+    system: str
+    user: str
+    # Estimated input tokens for system + user (see count_tokens).
+    tokens: int
+
+def compact_json(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def drop_empty(obj: Any) -> Any:
+    # Blank optional form fields carry no information, only tokens.
+    if isinstance(obj, dict):
+        return {k: drop_empty(v) for k, v in obj.items() if v not in ("", None, [], {})}
+    if isinstance(obj, list):
+        return [drop_empty(v) for v in obj]
+    return obj
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+@lru_cache(maxsize=1)
+def _encoder() -> Optional[Any]:
+    # tiktoken is optional: exact counts when installed, a close estimate otherwise.
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str) -> int:
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    # BPE vocabularies keep common words whole and split long ones roughly every
+    # four characters; punctuation is a token of its own and single spaces fold
+    # into the following word.
+    n = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isspace():
+            n += piece.count("\n") if "\n" in piece else 0
+        elif piece[0].isalnum() or piece[0] == "_":
+            n += max(1, (len(piece) + 3) // 4) if len(piece) > 6 else 1
+        else:
+            n += 1
+    return n
+
+@lru_cache(maxsize=None)
+def _system(role: str, instructions: str) -> str:
+    return role.rstrip() + "\n\n" + instructions
+
+def _prompt(system: str, user: str) -> Prompt:
+    return Prompt(system, user, count_tokens(system) + count_tokens(user))
+
+def pass_a_prompt(campaign: Dict[str, Any]) -> Prompt:
+    user = PASS_A_USER_TEMPLATE.format(campaign_json=compact_json(drop_empty(campaign)))
+    return _prompt(_system(PASS_A_SYSTEM, PASS_A_INSTRUCTIONS), user)
+
+def pass_b_prompt(decision_map_json: str) -> Prompt:
+    # Takes the pretty JSON the UI shows (and the offline provider reads) and re-packs it.
+    decision_map = json.loads(decision_map_json)
+    user = PASS_B_USER_TEMPLATE.format(decision_map_json=compact_json(drop_empty(decision_map)))
+    return _prompt(_system(PASS_B_SYSTEM, PASS_B_INSTRUCTIONS), user)
@@ -13,7 +13,10 @@ Rules:
 - You MUST explicitly reject at least 2 alternative decision types, 2 alternative tensions, and 2 alternative windows, with reasons.
 """
 
-PASS_A_USER_TEMPLATE = """Given the campaign JSON below, produce a DecisionMap JSON matching the schema.
+# Everything up to the campaign is identical on every call, so it goes in front
+# (system, then these instructions) where provider-side prefix caching can reuse it;
+# the user turn carries only the per-campaign JSON.
+PASS_A_INSTRUCTIONS = """Given the campaign JSON in the user message, produce a DecisionMap JSON matching the schema.
 
 Allowed values:
 
@@ -49,8 +52,9 @@ Hard constraints:
 - moment_of_instability must reflect the selected decision_window.
 - planning_implications.channel_role_logic must reflect channels present (DOOH / Display / CTV etc.) and be plausible.
 - rejected_alternatives must list 2+ rejected options in each category with a blunt reason.
+"""
 
-Campaign JSON:
+PASS_A_USER_TEMPLATE = """Campaign JSON:
 {campaign_json}
 """
 
@@ -60,7 +64,7 @@ Write a sharp, scan-friendly one-page brief based ONLY on the DecisionMap.
 No new facts. No fluff. Use the DecisionMap as truth.
 """
 
-PASS_B_USER_TEMPLATE = """Convert the DecisionMap JSON into a tight narrative brief.
+PASS_B_INSTRUCTIONS = """Convert the DecisionMap JSON in the user message into a tight narrative brief.
 
 Brief format:
 - Executive decision headline (1 sentence)
@@ -70,7 +74,8 @@ Brief format:
 - Planning implication (Prioritise / Avoid / Channel role)
 - Confidence (Level + Drivers + Limitations)
 - Rejected alternatives (short, brutal)
+"""
 
-DecisionMap JSON:
+PASS_B_USER_TEMPLATE = """DecisionMap JSON:
 {decision_map_json}
 """
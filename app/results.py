@@ -0,0 +1,146 @@
+from typing import Optional
+
+from app import jobs
+from app.llm_router import answered_by
+from app.pipeline import pass_a_model, pass_b_model
+
+# What a generation hands back, shared by the HTML routes (app.web) and the JSON
+# API (app.api): campaign input from form fields, the result card built from a
+# decision map, a finished job's output, what an Idempotency-Key stores, and
+# errors worded for planners.
+
+def _required(value: str, name: str) -> str:
+    v = (value or "").strip()
+    if not v:
+        raise ValueError(f"Missing required field: {name}")
+    return v
+
+def friendly_error(e: Exception) -> str:
+    msg = str(e)
+    if "insufficient_quota" in msg or "You exceeded your current quota" in msg:
+        return (
+            "LLM quota is not available for the current API key.\n\n"
+            "No-pay workaround:\n"
+            "- Set LLM_PROVIDER=offline in Render.\n"
+        )
+    if "OPENAI_API_KEY is not set" in msg or "GEMINI_API_KEY is not set" in msg:
+        return (
+            "API key missing.\n\n"
+            "No-pay workaround:\n"
+            "- Set LLM_PROVIDER=offline in Render.\n"
+        )
+    return msg
+
+def _group_signals(dm: dict) -> dict:
+    # dm["observable_signals"] items look like: {"signal": "...", "classification": "Observed|Inferred|Hypothesis", ...}
+    observed, inferred, hypothesis = [], [], []
+    for s in dm.get("observable_signals", []) or []:
+        txt = (s.get("signal") or "").strip()
+        cls = (s.get("classification") or "").strip().lower()
+        if not txt:
+            continue
+        if cls == "observed":
+            observed.append(txt)
+        elif cls == "inferred":
+            inferred.append(txt)
+        elif cls == "hypothesis":
+            hypothesis.append(txt)
+        else:
+            inferred.append(txt)
+    return {"observed": observed, "inferred": inferred, "hypothesis": hypothesis}
+
+def _derive_headline(dm: dict) -> tuple[str, str]:
+    # Tight, executive-style headline + subhead
+    decision = (dm.get("decision_being_influenced") or "").strip()
+    tension = (dm.get("behavioral_tension", {}) or {}).get("tradeoff", "")
+    why = (dm.get("behavioral_tension", {}) or {}).get("why_this_tension_exists", "")
+
+    headline = decision if decision else "A decision becomes influenceable when context collapses friction and creates a go-now reason."
+    subhead_parts = []
+    if tension:
+        subhead_parts.append(f"Tension: {tension}.")
+    if why:
+        subhead_parts.append(why)
+    subhead = " ".join(subhead_parts).strip()
+    return headline, subhead
+
+def _derive_why_this_works(dm: dict) -> list[str]:
+    # Use strategic levers if available; otherwise fall back to planning implications.
+    levers = dm.get("strategic_levers") or []
+    bullets = [x.strip() for x in levers if isinstance(x, str) and x.strip()]
+
+    if len(bullets) >= 3:
+        return bullets[:3]
+
+    pi = dm.get("planning_implications") or {}
+    # fallback bullets crafted from planning implication text (shortened)
+    fallback = []
+    if pi.get("what_to_prioritize"):
+        fallback.append("Detour cost collapses when inventory is route-adjacent and dayparted correctly.")
+    if pi.get("channel_role_logic"):
+        fallback.append("DOOH validates in-moment; Display enables follow-through when attention returns to mobile.")
+    bt = dm.get("behavioral_tension") or {}
+    if bt.get("tradeoff"):
+        fallback.append(f"The message works when it resolves the tension: {bt.get('tradeoff')}.")
+    combined = bullets + fallback
+    # dedupe preserving order
+    seen, out = set(), []
+    for b in combined:
+        if b not in seen:
+            out.append(b); seen.add(b)
+    return out[:3] if out else ["Route adjacency + urgency framing reduces friction and increases visit probability."]
+
+def manual_campaign(fields: dict) -> dict:
+    def opt(name: str) -> str:
+        return (fields.get(name) or "").strip()
+
+    return {
+        "Category": _required(fields.get("category"), "Category"),
+        "Objective": _required(fields.get("objective"), "Objective"),
+        "Channels": _required(fields.get("channels"), "Channels"),
+        "Market": _required(fields.get("market"), "Market"),
+        "Flight_Dates": opt("flight_dates"),
+        "Audience_Logic": _required(fields.get("audience_logic"), "Audience_Logic"),
+        "Creative_Notes": opt("creative_notes"),
+        "Measurement_Type": opt("measurement_type"),
+        "Key_Result": opt("key_result"),
+        "POI_Context": opt("poi_context"),
+        "Notes": opt("notes"),
+    }
+
+def pass_a_output(dm: dict, decision_map_json: str, served: Optional[dict] = None) -> dict:
+    # Everything the result card shows that only needs Pass A. `served` is
+    # metrics.request_served() for the passes that produced it.
+    headline, subhead = _derive_headline(dm)
+    return {
+        # legacy (kept)
+        "decision_map_json": decision_map_json,
+
+        # new structured payload for the UI
+        "dm": dm,
+        "headline": headline,
+        "subhead": subhead,
+        "signals": _group_signals(dm),
+        "why_this_works": _derive_why_this_works(dm),
+
+        # metadata
+        "provider": answered_by(served or {}),
+        "models": {"pass_a": pass_a_model(), "pass_b": pass_b_model()},
+    }
+
+def job_output(job: dict) -> dict:
+    body = jobs.job_status(job)
+    result = jobs.job_result(job)
+    if result is not None:
+        output = pass_a_output(result["dm"], result["decision_map_json"], result["served"])
+        output["brief"] = result["brief"]
+        output["usage"] = result["usage"]
+        output["input_used"] = result["input_used"]
+        body["output"] = output
+    elif job["error"]:
+        body["error"] = friendly_error(RuntimeError(job["error"]))
+    return body
+
+def stored_result(decision_map_json: str, brief: Optional[str], input_used: dict, served: dict) -> dict:
+    # What an Idempotency-Key keeps of a finished generation.
+    return {"decision_map_json": decision_map_json, "brief": brief, "input_used": input_used, "served": served}
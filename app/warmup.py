@@ -0,0 +1,87 @@
+import asyncio
+import importlib
+import time
+from typing import Any, Dict
+
+from app.db import init_db
+from app.llm_router import provider
+
+# Startup work that used to happen lazily on the first user request. It runs as a
+# background task after the server is accepting connections, so /health answers
+# immediately while /ready flips once everything below has been paid for.
+
+_state: Dict[str, Any] = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "steps_ms": {},
+    "errors": {},
+}
+
+def _precompile_templates() -> None:
+    # Jinja compiles on first get_template and keeps the result in env.cache.
+    from app.web import templates
+    env = templates.env
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+
+def _open_llm_client() -> None:
+    if provider() == "openai":
+        from app.llm_openai import _aclient
+        _aclient()
+
+def _build_template_workbook() -> None:
+    from app.excel import generate_template_xlsx
+    generate_template_xlsx()
+
+def _build_assets() -> None:
+    from app.assets import load_assets
+    load_assets()
+
+REQUEST_MODULES = ["app.dedup", "app.prompting", "app.retrieval"]
+
+def _import_request_modules() -> None:
+    # Kept off the import path of main:app; loaded here so no request pays for them.
+    for name in REQUEST_MODULES:
+        importlib.import_module(name)
+
+def _build_facets() -> None:
+    from app.facets import get_facets
+    get_facets().refresh()
+
+STEPS = [
+    ("init_db", init_db),
+    ("static_assets", _build_assets),
+    ("templates", _precompile_templates),
+    ("request_modules", _import_request_modules),
+    ("llm_client", _open_llm_client),
+    ("excel_template", _build_template_workbook),
+    ("facets", _build_facets),
+]
+
+async def warm_up() -> None:
+    _state["started_at"] = time.time()
+    for name, fn in STEPS:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            # A failed step is reported, not fatal: the request path retries lazily.
+            _state["errors"][name] = str(e)
+        _state["steps_ms"][name] = round((time.perf_counter() - t0) * 1000, 1)
+    _state["finished_at"] = time.time()
+    _state["ready"] = True
+
+def readiness() -> Dict[str, Any]:
+    return {
+        "status": "ready" if _state["ready"] else "warming",
+        "steps_ms": dict(_state["steps_ms"]),
+        "errors": dict(_state["errors"]),
+        "warmup_s": (
+            round(_state["finished_at"] - _state["started_at"], 3)
+            if _state["finished_at"] else None
+        ),
+    }
+
+def is_ready() -> bool:
+    return bool(_state["ready"])
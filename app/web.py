@@ -1,105 +1,39 @@
-import os
 import json
+import asyncio
 from pathlib import Path
+from urllib.parse import urlencode
+from typing import Any, Iterator, Optional
 from fastapi import APIRouter, Request, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from app.models import DecisionMap
-from app.excel import generate_template_xlsx, parse_template_xlsx
-from app.llm_router import generate_structured, generate_text, provider  # keep your offline/openai/gemini router
-
-from app.prompts import (
-    PASS_A_SYSTEM, PASS_A_USER_TEMPLATE,
-    PASS_B_SYSTEM, PASS_B_USER_TEMPLATE
-)
+from app.db import export_db_bytes, import_jsonl_stream, iter_export_jsonl, list_cases_page
+from app import jobs
+from app.assets import asset_url
+from app.batch import batch_results, batch_status, get_batch, start_batch
+from app.excel import generate_results_xlsx, generate_template_xlsx, parse_template_rows, parse_template_xlsx, template_etag
+from app.metrics import IDEMPOTENT_REPLAYS, request_served, request_usage, stage
+from app.llm_router import answered_by
+from app.pipeline import run_pass_a, run_pass_b, stream_pass_b
+from app.results import friendly_error, job_output, manual_campaign, pass_a_output, stored_result
 
 router = APIRouter()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+templates.env.globals["asset_url"] = asset_url
 
-def _required(value: str, name: str) -> str:
-    v = (value or "").strip()
-    if not v:
-        raise ValueError(f"Missing required field: {name}")
-    return v
-
-def _friendly_error(e: Exception) -> str:
-    msg = str(e)
-    if "insufficient_quota" in msg or "You exceeded your current quota" in msg:
-        return (
-            "LLM quota is not available for the current API key.\n\n"
-            "No-pay workaround:\n"
-            "- Set LLM_PROVIDER=offline in Render.\n"
-        )
-    if "OPENAI_API_KEY is not set" in msg or "GEMINI_API_KEY is not set" in msg:
-        return (
-            "API key missing.\n\n"
-            "No-pay workaround:\n"
-            "- Set LLM_PROVIDER=offline in Render.\n"
-        )
-    return msg
-
-def _group_signals(dm: dict) -> dict:
-    # dm["observable_signals"] items look like: {"signal": "...", "classification": "Observed|Inferred|Hypothesis", ...}
-    observed, inferred, hypothesis = [], [], []
-    for s in dm.get("observable_signals", []) or []:
-        txt = (s.get("signal") or "").strip()
-        cls = (s.get("classification") or "").strip().lower()
-        if not txt:
-            continue
-        if cls == "observed":
-            observed.append(txt)
-        elif cls == "inferred":
-            inferred.append(txt)
-        elif cls == "hypothesis":
-            hypothesis.append(txt)
-        else:
-            inferred.append(txt)
-    return {"observed": observed, "inferred": inferred, "hypothesis": hypothesis}
-
-def _derive_headline(dm: dict) -> tuple[str, str]:
-    # Tight, executive-style headline + subhead
-    decision = (dm.get("decision_being_influenced") or "").strip()
-    tension = (dm.get("behavioral_tension", {}) or {}).get("tradeoff", "")
-    why = (dm.get("behavioral_tension", {}) or {}).get("why_this_tension_exists", "")
-
-    headline = decision if decision else "A decision becomes influenceable when context collapses friction and creates a go-now reason."
-    subhead_parts = []
-    if tension:
-        subhead_parts.append(f"Tension: {tension}.")
-    if why:
-        subhead_parts.append(why)
-    subhead = " ".join(subhead_parts).strip()
-    return headline, subhead
-
-def _derive_why_this_works(dm: dict) -> list[str]:
-    # Use strategic levers if available; otherwise fall back to planning implications.
-    levers = dm.get("strategic_levers") or []
-    bullets = [x.strip() for x in levers if isinstance(x, str) and x.strip()]
-
-    if len(bullets) >= 3:
-        return bullets[:3]
-
-    pi = dm.get("planning_implications") or {}
-    # fallback bullets crafted from planning implication text (shortened)
-    fallback = []
-    if pi.get("what_to_prioritize"):
-        fallback.append("Detour cost collapses when inventory is route-adjacent and dayparted correctly.")
-    if pi.get("channel_role_logic"):
-        fallback.append("DOOH validates in-moment; Display enables follow-through when attention returns to mobile.")
-    bt = dm.get("behavioral_tension") or {}
-    if bt.get("tradeoff"):
-        fallback.append(f"The message works when it resolves the tension: {bt.get('tradeoff')}.")
-    combined = bullets + fallback
-    # dedupe preserving order
-    seen, out = set(), []
-    for b in combined:
-        if b not in seen:
-            out.append(b); seen.add(b)
-    return out[:3] if out else ["Route adjacency + urgency framing reduces friction and increases visit probability."]
+async def _campaign_input(excel: UploadFile | None, fields: dict) -> tuple[dict, dict]:
+    if excel and excel.filename:
+        # UploadFile is already spooled to disk past 1 MB; stream it rather than read() it.
+        campaign = await asyncio.to_thread(parse_template_xlsx, excel.file)
+        return campaign, {"source": "excel", "campaign": campaign}
+    campaign = manual_campaign(fields)
+    return campaign, {"source": "manual", "campaign": campaign}
+
+def _sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
 
 @router.get("/health")
 def health():
@@ -119,13 +53,251 @@ def home(request: Request):
         "input_used": None
     })
 
+LIBRARY_PAGE_SIZE = 50
+# Dropdowns list the most common values first; free-text fields can have thousands.
+LIBRARY_FACET_OPTIONS = 100
+
+@router.get("/library", response_class=HTMLResponse)
+def library(
+    request: Request,
+    q: str = "",
+    category: str = "",
+    market: str = "",
+    decision_type: str = "",
+    primary_tension: str = "",
+    decision_window: str = "",
+    channel: str = "",
+    cursor: str = "",
+):
+    from app.facets import library_summary  # numpy stays off the startup path
+
+    filters = {
+        "q": q.strip(),
+        "category": category.strip(),
+        "market": market.strip(),
+        "decision_type": decision_type.strip(),
+        "primary_tension": primary_tension.strip(),
+        "decision_window": decision_window.strip(),
+        "channel": channel.strip(),
+    }
+    try:
+        cases, next_cursor = list_cases_page(limit=LIBRARY_PAGE_SIZE, cursor=cursor or None, **filters)
+    except ValueError:
+        # Stale or hand-edited cursor: start again from the newest case.
+        cases, next_cursor = list_cases_page(limit=LIBRARY_PAGE_SIZE, **filters)
+        cursor = ""
+    active = {k: v for k, v in filters.items() if v}
+    # Total and dropdown options both come from the in-memory facet index.
+    summary = library_summary(**filters)
+    return templates.TemplateResponse("library.html", {
+        "request": request,
+        "cases": cases,
+        "total": summary["total"],
+        "facets": {f: counts[:LIBRARY_FACET_OPTIONS] for f, counts in summary["facets"].items()},
+        "filters": filters,
+        "next_url": ("/library?" + urlencode({**active, "cursor": next_cursor})) if next_cursor else None,
+        "first_url": ("/library?" + urlencode(active)) if cursor else None,
+        **filters,
+    })
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse over a sync generator that is closed as soon as the response
+    ends. Starlette drops the iterator when the client disconnects mid-body, so
+    the generator's `finally` would otherwise wait for garbage collection.
+    """
+
+    def __init__(self, content: Iterator[bytes], **kwargs: Any) -> None:
+        self._source = content
+        super().__init__(content, **kwargs)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # No thread is still inside the generator here: Starlette's threadpool
+            # steps are not abandoned on cancellation.
+            self._source.close()
+
+@router.get("/library/export/jsonl")
+def library_export_jsonl(
+    q: str = "",
+    category: str = "",
+    market: str = "",
+    decision_type: str = "",
+    primary_tension: str = "",
+    decision_window: str = "",
+    channel: str = "",
+    gzip: bool = False,
+):
+    # Same filters as /library; the body is streamed as the cursor advances.
+    chunks = iter_export_jsonl(
+        q=q.strip() or None,
+        category=category.strip() or None,
+        market=market.strip() or None,
+        decision_type=decision_type.strip() or None,
+        primary_tension=primary_tension.strip() or None,
+        decision_window=decision_window.strip() or None,
+        channel=channel.strip() or None,
+        gzip=gzip,
+    )
+    filename = "bce_cases.jsonl.gz" if gzip else "bce_cases.jsonl"
+    return ClosingStreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+@router.get("/library/export/db")
+async def library_export_db():
+    content = await asyncio.to_thread(export_db_bytes)
+    return Response(
+        content,
+        media_type="application/vnd.sqlite3",
+        headers={"Content-Disposition": "attachment; filename=bce_case_library.sqlite3"},
+    )
+
+@router.post("/library/import/jsonl")
+async def library_import_jsonl(jsonl: str = Form(""), file: Optional[UploadFile] = File(None)):
+    # An uploaded file is read line by line off its spooled temp file, never whole.
+    if file is not None and file.filename:
+        lines = file.file
+    elif jsonl.strip():
+        lines = jsonl.splitlines()
+    else:
+        return JSONResponse({"error": "Paste JSONL or choose a .jsonl file."}, status_code=400)
+    try:
+        stats = await asyncio.to_thread(import_jsonl_stream, lines)
+    except Exception as e:
+        return JSONResponse({"error": friendly_error(e)}, status_code=500)
+    return stats
+
 @router.get("/template")
-def download_template():
-    content = generate_template_xlsx()
+def download_template(request: Request):
+    etag = template_etag()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        generate_template_xlsx(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": "attachment; filename=bce_campaign_template.xlsx", **headers}
+    )
+
+@router.post("/batch")
+async def batch_create(excel: UploadFile = File(...)):
+    # Validate every row up front: a half-run quarter is worse than a clear list of fixes.
+    try:
+        campaigns, errors = await asyncio.to_thread(parse_template_rows, excel.file)
+    except Exception as e:
+        return JSONResponse({"error": friendly_error(e)}, status_code=400)
+    if errors:
+        return JSONResponse({"error": "Workbook has invalid rows.", "rows": errors}, status_code=422)
+
+    batch_id = start_batch(campaigns)
+    return {
+        "batch_id": batch_id,
+        "total": len(campaigns),
+        "status_url": f"/batch/{batch_id}",
+        "results_url": f"/batch/{batch_id}/results",
+    }
+
+@router.get("/batch/{batch_id}")
+def batch_progress(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        return JSONResponse({"error": "Unknown batch."}, status_code=404)
+    return batch_status(batch)
+
+@router.get("/batch/{batch_id}/results")
+async def batch_download(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        return JSONResponse({"error": "Unknown batch."}, status_code=404)
+    if batch["status"] != "done":
+        return JSONResponse(batch_status(batch), status_code=409)
+    content = await asyncio.to_thread(generate_results_xlsx, batch_results(batch))
     return Response(
         content,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=bce_campaign_template.xlsx"}
+        headers={"Content-Disposition": f"attachment; filename=bce_batch_{batch_id[:8]}.xlsx"}
+    )
+
+def _job_accepted(job_id: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        {
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events",
+        },
+        status_code=202,
+        headers={"Location": f"/jobs/{job_id}", **(headers or {})},
+    )
+
+async def _enqueue_job(campaign: dict, input_used: dict) -> JSONResponse:
+    return _job_accepted(await jobs.enqueue(campaign, input_used))
+
+@router.post("/jobs")
+async def job_create(request: Request):
+    """
+    Same inputs as POST /generate, queued: answers 202 with a job id straight away.
+    POST /generate with `Prefer: respond-async` does the same.
+    """
+    form = await request.form()
+    excel = form.get("excel")
+    fields = {k: v for k, v in form.items() if isinstance(v, str)}
+    try:
+        campaign, input_used = await _campaign_input(excel if hasattr(excel, "filename") else None, fields)
+    except Exception as e:
+        return JSONResponse({"error": friendly_error(e)}, status_code=400)
+    return await _enqueue_job(campaign, input_used)
+
+@router.get("/jobs")
+def job_queue():
+    return jobs.stats()
+
+@router.get("/jobs/{job_id}")
+async def job_get(job_id: str):
+    # Poll until status is done (output included) or failed (error included).
+    job = await jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job."}, status_code=404)
+    return job_output(job)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """
+    The job as Server-Sent Events: `status` on every state change, then `done`
+    with the output or `error` once it has failed for good.
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job."}, status_code=404)
+
+    async def events():
+        current, last = job, None
+        while True:
+            body = job_output(current)
+            if current["status"] == "done":
+                yield _sse("done", body)
+                return
+            if current["status"] == "failed":
+                yield _sse("error", {"message": body.get("error", "Job failed.")})
+                return
+            state = (current["status"], current["attempts"])
+            if state != last:
+                yield _sse("status", body)
+                last = state
+            if await request.is_disconnected():
+                return
+            await jobs.wait_for_change(timeout=5.0)
+            current = await jobs.get(job_id) or current
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 @router.post("/generate", response_class=HTMLResponse)
@@ -145,86 +317,122 @@ async def generate(
     notes: str = Form(default=""),
     excel: UploadFile | None = File(default=None),
 ):
+    """
+    With an `Idempotency-Key` header, a repeat submission with the same key gets
+    the first one's result (or its queued job) instead of a new generation.
+    """
+    from app import dedup  # off the startup path, like app.facets
+    idempotency_key, request_hash, held = None, "", False
     try:
+        idempotency_key = dedup.idempotency_key(request.headers)
+
         # 1) Input
-        if excel and excel.filename:
-            raw = await excel.read()
-            campaign = parse_template_xlsx(raw)
-            input_used = {"source": "excel", "campaign": campaign}
+        with stage("input"):
+            campaign, input_used = await _campaign_input(excel, {
+                "category": category,
+                "objective": objective,
+                "channels": channels,
+                "market": market,
+                "flight_dates": flight_dates,
+                "audience_logic": audience_logic,
+                "creative_notes": creative_notes,
+                "measurement_type": measurement_type,
+                "key_result": key_result,
+                "poi_context": poi_context,
+                "notes": notes,
+            })
+
+        request_hash = dedup.request_hash(campaign)
+        stored = await dedup.reserve(idempotency_key, request_hash) if idempotency_key else None
+        held = idempotency_key is not None and stored is None
+        if stored is not None:
+            IDEMPOTENT_REPLAYS.inc()
+            if "job_id" in stored:
+                return _job_accepted(stored["job_id"], dedup.REPLAYED)
+        elif "respond-async" in request.headers.get("prefer", ""):
+            job_id = await jobs.enqueue(campaign, input_used)
+            if held:
+                await dedup.remember(idempotency_key, request_hash, job_id=job_id)
+                held = False
+            return _job_accepted(job_id)
+
+        if stored is not None:
+            result = stored["result"]
+            decision_map_json, brief_text, input_used = result["decision_map_json"], result["brief"], result["input_used"]
+            dm = json.loads(decision_map_json)
+            served = result.get("served") or {}
+            if brief_text is None:
+                # Stored by an API request that did not ask for the brief.
+                brief_text = await run_pass_b(decision_map_json)
         else:
-            campaign = {
-                "Category": _required(category, "Category"),
-                "Objective": _required(objective, "Objective"),
-                "Channels": _required(channels, "Channels"),
-                "Market": _required(market, "Market"),
-                "Flight_Dates": (flight_dates or "").strip(),
-                "Audience_Logic": _required(audience_logic, "Audience_Logic"),
-                "Creative_Notes": (creative_notes or "").strip(),
-                "Measurement_Type": (measurement_type or "").strip(),
-                "Key_Result": (key_result or "").strip(),
-                "POI_Context": (poi_context or "").strip(),
-                "Notes": (notes or "").strip(),
-            }
-            input_used = {"source": "manual", "campaign": campaign}
-
-        campaign_json = json.dumps(campaign, ensure_ascii=False, indent=2)
-
-        # 2) Pass A: Structured decision map
-        pass_a_model = os.getenv("PASS_A_MODEL", "gpt-4o-mini").strip()
-        pass_a_user = PASS_A_USER_TEMPLATE.format(campaign_json=campaign_json)
-
-        decision_map_obj = generate_structured(
-            model=pass_a_model,
-            system_instruction=PASS_A_SYSTEM,
-            user_prompt=pass_a_user,
-            response_model=DecisionMap,
-        )
-        dm = decision_map_obj.model_dump()
-        decision_map_json = json.dumps(dm, ensure_ascii=False, indent=2)
-
-        # 3) Pass B: Narrative brief (optional; you can keep or remove)
-        pass_b_model = os.getenv("PASS_B_MODEL", "gpt-4o").strip()
-        pass_b_user = PASS_B_USER_TEMPLATE.format(decision_map_json=decision_map_json)
-
-        brief_text = generate_text(
-            model=pass_b_model,
-            system_instruction=PASS_B_SYSTEM,
-            user_prompt=pass_b_user,
-            decision_map_json=decision_map_json,
-        )
+            # 2) Pass A: Structured decision map
+            dm, decision_map_json = await run_pass_a(campaign)
+
+            # 3) Pass B: Narrative brief (optional; you can keep or remove)
+            brief_text = await run_pass_b(decision_map_json)
+            served = request_served()
+
+            if held:
+                await dedup.remember(idempotency_key, request_hash, stored_result(decision_map_json, brief_text, input_used, served))
+                held = False
 
         # 4) Derivations for the redesigned UI
-        headline, subhead = _derive_headline(dm)
-        signals = _group_signals(dm)
-        why_this_works = _derive_why_this_works(dm)
+        with stage("derive"):
+            output = pass_a_output(dm, decision_map_json, served)
+            output["brief"] = brief_text
+            output["usage"] = request_usage()
 
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "output": {
-                # legacy (kept)
-                "brief": brief_text,
-                "decision_map_json": decision_map_json,
-
-                # new structured payload for the UI
-                "dm": dm,
-                "headline": headline,
-                "subhead": subhead,
-                "signals": signals,
-                "why_this_works": why_this_works,
-
-                # metadata
-                "provider": provider(),
-                "models": {"pass_a": pass_a_model, "pass_b": pass_b_model},
-            },
-            "error": None,
-            "input_used": input_used,
-            "tone": tone
-        })
+        with stage("render"):
+            return templates.TemplateResponse("index.html", {
+                "request": request,
+                "output": output,
+                "error": None,
+                "input_used": input_used,
+                "tone": tone
+            }, headers=dedup.REPLAYED if stored is not None else None)
 
     except Exception as e:
         return templates.TemplateResponse("index.html", {
             "request": request,
             "output": None,
-            "error": _friendly_error(e),
+            "error": friendly_error(e),
             "input_used": None
-        })
+        }, status_code=e.status if isinstance(e, dedup.IdempotencyConflict) else 200)
+    finally:
+        # A failed first submission gives its key back for the retry.
+        if held:
+            await dedup.release(idempotency_key, request_hash)
+
+@router.post("/generate/stream")
+async def generate_stream(request: Request):
+    """
+    Same inputs as POST /generate, answered as Server-Sent Events:
+    `sections` once Pass A is done, `token` for each Pass B chunk, then `done`
+    (or `error` at any point).
+    """
+    form = await request.form()
+    excel = form.get("excel")
+    fields = {k: v for k, v in form.items() if isinstance(v, str)}
+
+    async def events():
+        try:
+            with stage("input"):
+                campaign, input_used = await _campaign_input(excel if hasattr(excel, "filename") else None, fields)
+            dm, decision_map_json = await run_pass_a(campaign)
+
+            with stage("derive"):
+                sections = pass_a_output(dm, decision_map_json, request_served())
+                sections["input_used"] = input_used
+            yield _sse("sections", sections)
+
+            async for chunk in stream_pass_b(decision_map_json):
+                yield _sse("token", chunk)
+            yield _sse("done", {"usage": request_usage(), "provider": answered_by(request_served())})
+        except Exception as e:
+            yield _sse("error", {"message": friendly_error(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,70 @@
+"""
+Compare two bench/run.py result files and flag regressions.
+
+    python bench/compare.py bench/results/OLD.json bench/results/NEW.json [--threshold 0.15]
+
+Latencies and durations (*_ms, *_s, seconds) are better when lower; throughputs
+(*_rps, *_per_s) when higher. Only p50/p95 latencies are compared by default,
+since means and maxima of short runs are too noisy to gate on. Exits 1 if any
+metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+HIGHER_IS_BETTER = ("_rps", "_per_s")
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "cold_s", "seconds", "wall_s")
+
+def flatten(d: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(d, dict):
+        for k, v in d.items():
+            yield from flatten(v, f"{prefix}.{k}" if prefix else k)
+    elif isinstance(d, list):
+        for item in d:
+            # Load levels are keyed by concurrency, not list position.
+            key = f"c{item['concurrency']}" if isinstance(item, dict) and "concurrency" in item else None
+            if key:
+                yield from flatten(item, f"{prefix}.{key}")
+    elif isinstance(d, (int, float)) and not isinstance(d, bool):
+        yield prefix, float(d)
+
+def direction(key: str) -> Optional[int]:
+    leaf = key.rsplit(".", 1)[-1]
+    if key.startswith("meta.") or ".build." in key:
+        return None
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return None
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old: Dict[str, float] = dict(flatten(json.load(f)))
+    with open(args.new) as f:
+        new: Dict[str, float] = dict(flatten(json.load(f)))
+
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        sign = direction(key)
+        if sign is None or old[key] == 0:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        worse = -change * sign > args.threshold
+        better = change * sign > args.threshold
+        if worse or better:
+            mark = "REGRESSION" if worse else "improved"
+            print(f"{mark:10} {key}: {old[key]:g} -> {new[key]:g} ({change:+.0%})")
+        regressions += worse
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""
+Benchmark suite on the offline provider (deterministic, no network).
+
+Two parts:
+
+  * load:  POST /generate against main:app in-process (httpx ASGI transport) at
+           several concurrency levels -> throughput and latency percentiles.
+           --url points it at a running server instead.
+  * micro: list_cases / list_cases_page, find_similar_cases, the JSONL export
+           and import, and parse_template_xlsx against synthetic libraries
+           (10k, 100k and 1M cases by default; built once, cached in bench/.cache).
+
+LLM_PROVIDER=simulated (see app/llm_simulated.py) runs the load part against
+realistic upstream latencies and injected faults instead; every other provider
+is replaced by offline.
+
+Results are written as JSON to bench/results/<utc time>-<git sha>.json (or
+--out); compare two runs with bench/compare.py.
+
+    python bench/run.py                       # everything
+    python bench/run.py --only micro --sizes 10k,100k
+    python bench/run.py --only load --concurrency 1,8,32 --requests 200
+    LLM_PROVIDER=simulated SIM_TIMEOUT_RATE=0.02 python bench/run.py --only load
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Must be set before app modules read them.
+if os.getenv("LLM_PROVIDER") != "simulated":
+    os.environ["LLM_PROVIDER"] = "offline"
+os.environ.setdefault("LLM_CACHE", "0")
+os.environ.setdefault("BCE_DB_PATH", str(Path(tempfile.mkdtemp(prefix="bce_bench_")) / "bce_case_library.sqlite3"))
+
+from bench import synthetic  # noqa: E402
+
+RESULTS_DIR = ROOT / "bench" / "results"
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_CONCURRENCY = [1, 4, 16, 64]
+IMPORT_ROWS = 50_000
+
+# -- helpers -----------------------------------------------------------------
+
+def _pct(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(round(p / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+def summarize(seconds: List[float]) -> Dict[str, Any]:
+    ms = sorted(s * 1000 for s in seconds)
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(_pct(ms, 50), 3),
+        "p95_ms": round(_pct(ms, 95), 3),
+        "p99_ms": round(_pct(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+def timeit(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+def git_sha() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def log(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+# -- load: /generate -------------------------------------------------------------
+
+GENERATE_FORM = {
+    "category": "Retail",
+    "objective": "Drive in-store footfall during promo window",
+    "channels": "DOOH, Display",
+    "market": "US - NYC",
+    "audience_logic": "People frequently present near retail corridors and competitor clusters",
+}
+
+async def _load_level(client: Any, concurrency: int, requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/generate", data=GENERATE_FORM)
+                if r.status_code != 200 or "Behavioral Context Brief" not in r.text:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        **summarize(latencies),
+    }
+
+async def run_load(levels: List[int], requests: int, url: Optional[str]) -> Dict[str, Any]:
+    import httpx
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=120)
+        target = url
+    else:
+        from main import app
+        from app.db import init_db
+        init_db()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+        target = "in-process"
+
+    results = []
+    async with client:
+        await _load_level(client, 1, 5)  # warm-up: templates, pydantic schemas
+        for c in levels:
+            log(f"load: /generate x{requests} at concurrency {c}")
+            results.append(await _load_level(client, c, requests))
+    return {"target": target, "endpoint": "POST /generate", "levels": results}
+
+# -- micro ---------------------------------------------------------------------
+
+def micro_library(label: str, n: int, repeat: int, seed: int) -> Dict[str, Any]:
+    from app.db import close_thread_connections, count_cases, iter_export_jsonl, list_cases, list_cases_page
+    from app.retrieval import find_similar_cases
+
+    log(f"micro[{label}]: preparing library")
+    db_path, build = synthetic.library(n, seed=seed)
+    close_thread_connections()
+    out: Dict[str, Any] = {"cases": n, "build": build}
+
+    rng = random.Random(seed)
+    cat = lambda: rng.choice(synthetic.CATEGORIES)  # noqa: E731
+    word = lambda: rng.choice(synthetic.WORDS)  # noqa: E731
+
+    log(f"micro[{label}]: list_cases")
+    out["list_cases"] = {
+        "first_page": timeit(lambda: list_cases(limit=50, db_path=db_path), repeat),
+        "category": timeit(lambda: list_cases(limit=50, category=cat(), db_path=db_path), repeat),
+        "category_channel": timeit(
+            lambda: list_cases(limit=50, category=cat(), channel=rng.choice(synthetic.CHANNELS), db_path=db_path), repeat
+        ),
+        "search": timeit(lambda: list_cases(limit=50, q=f"{word()} {word()}", db_path=db_path), repeat),
+        "deep_offset": timeit(lambda: list_cases(limit=50, offset=n // 2, db_path=db_path), max(3, repeat // 5)),
+    }
+
+    def keyset_walk(pages: int = 20) -> None:
+        cursor = None
+        for _ in range(pages):
+            _, cursor = list_cases_page(limit=50, cursor=cursor, db_path=db_path)
+            if not cursor:
+                break
+    out["list_cases_page"] = {"walk_20_pages": timeit(keyset_walk, max(3, repeat // 5))}
+    out["count_cases"] = {"category_uncached": timeit(
+        lambda: count_cases(category=cat(), q=word(), db_path=db_path), repeat
+    )}
+
+    log(f"micro[{label}]: find_similar_cases")
+    queries = synthetic.query_campaigns(max(repeat, 10), seed=seed + 1)
+    t0 = time.perf_counter()
+    find_similar_cases(queries[0], top_k=3, db_path=db_path)
+    cold = time.perf_counter() - t0
+    it = iter(queries * 2)
+    out["find_similar_cases"] = {
+        "cold_s": round(cold, 3),
+        "warm": timeit(lambda: find_similar_cases(next(it), top_k=3, db_path=db_path), repeat, warmup=0),
+    }
+
+    log(f"micro[{label}]: export_jsonl")
+    t0 = time.perf_counter()
+    size = sum(len(chunk) for chunk in iter_export_jsonl(db_path=db_path))
+    dt = time.perf_counter() - t0
+    out["export_jsonl"] = {"seconds": round(dt, 3), "bytes": size, "rows_per_s": round(n / dt) if dt else 0}
+    return out
+
+def micro_import(rows: int, seed: int) -> Dict[str, Any]:
+    from app.db import import_jsonl_stream, init_db
+
+    log(f"micro: import_jsonl x{rows}")
+    lines = list(synthetic.iter_jsonl(rows, seed=seed + 7))
+    with tempfile.TemporaryDirectory(prefix="bce_bench_import_") as d:
+        db_path = str(Path(d) / "import.sqlite3")
+        init_db(db_path)
+        t0 = time.perf_counter()
+        fresh = import_jsonl_stream(lines, db_path=db_path)
+        fresh_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        dup = import_jsonl_stream(lines, db_path=db_path)
+        dup_s = time.perf_counter() - t0
+    return {
+        "rows": rows,
+        "fresh": {"seconds": round(fresh_s, 3), "rows_per_s": round(rows / fresh_s), "inserted": fresh["inserted"]},
+        "all_duplicates": {"seconds": round(dup_s, 3), "rows_per_s": round(rows / dup_s), "skipped": dup["skipped"]},
+    }
+
+def micro_excel(repeat: int, seed: int) -> Dict[str, Any]:
+    from app.excel import SHEET_NAME, TEMPLATE_COLUMNS, _write_xlsx, parse_template_rows, parse_template_xlsx
+
+    log("micro: parse_template_xlsx")
+    out = {}
+    for rows in (1, 1000):
+        workbook = _write_xlsx(SHEET_NAME, TEMPLATE_COLUMNS, synthetic.query_campaigns(rows, seed=seed + 3))
+        out[f"rows_{rows}"] = {
+            "bytes": len(workbook),
+            "parse_template_xlsx": timeit(lambda: parse_template_xlsx(workbook), repeat),
+            "parse_template_rows": timeit(lambda: parse_template_rows(workbook), max(3, repeat // 5)),
+        }
+    return out
+
+# -- main ----------------------------------------------------------------------
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["load", "micro"], help="run one part only")
+    parser.add_argument("--sizes", default="10k,100k,1m", help=f"library sizes ({', '.join(SIZES)})")
+    parser.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)))
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--repeat", type=int, default=30, help="samples per microbenchmark")
+    parser.add_argument("--import-rows", type=int, default=IMPORT_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="benchmark a running server instead of main:app in-process")
+    parser.add_argument("--out", help="result file (default: bench/results/<time>-<sha>.json)")
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    started = datetime.now(timezone.utc)
+    result: Dict[str, Any] = {
+        "meta": {
+            "git_sha": git_sha(),
+            "started_at": started.isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "provider": os.environ["LLM_PROVIDER"],
+            "seed": args.seed,
+        },
+    }
+
+    if args.only in (None, "load"):
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+        result["load"] = asyncio.run(run_load(levels, args.requests, args.url))
+
+    if args.only in (None, "micro"):
+        result["micro"] = {
+            "libraries": {s: micro_library(s, SIZES[s], args.repeat, args.seed) for s in sizes},
+            "import_jsonl": micro_import(args.import_rows, args.seed),
+            "parse_template_xlsx": micro_excel(args.repeat, args.seed),
+        }
+
+    result["meta"]["duration_s"] = round((datetime.now(timezone.utc) - started).total_seconds(), 1)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{started:%Y%m%dT%H%M%SZ}-{result['meta']['git_sha']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n")
+    print(out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Deterministic synthetic case libraries for the benchmarks.
+
+Cases are drawn from fixed vocabularies with a seeded RNG, so the same
+(size, seed) always produces the same library, and are loaded through
+app.db.import_jsonl_stream: building a library is itself the bulk-import path.
+Built libraries are kept under bench/.cache/ and reused while the schema
+version matches.
+"""
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple, get_args
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import MIGRATIONS, close_thread_connections, import_jsonl_stream, init_db  # noqa: E402
+from app.llm_offline import OFFLINE_DECISION_MAP  # noqa: E402
+from app.models import DecisionType, DecisionWindow, PrimaryTension  # noqa: E402
+
+CACHE_DIR = ROOT / "bench" / ".cache"
+
+CATEGORIES = [
+    "Retail", "QSR", "Automotive", "Finance", "Telecom", "Travel", "Grocery", "Beauty",
+    "Pharma", "Gaming", "Streaming", "Insurance", "Home Improvement", "Fashion", "Beverage", "Electronics",
+]
+MARKETS = [
+    "US - NYC", "US - LA", "US - Chicago", "US - Houston", "US - Miami", "UK - London", "UK - Manchester",
+    "DE - Berlin", "FR - Paris", "AU - Sydney", "CA - Toronto", "IN - Mumbai", "JP - Tokyo", "BR - Sao Paulo",
+]
+CHANNELS = ["DOOH", "Display", "Social", "CTV", "Audio", "Search", "OOH", "Video", "Native", "Email", "Print", "Radio"]
+WORDS = """
+commuter footfall promo weekend loyalty basket detour corridor transit store visit value urgency
+habit switch trial premium discount launch awareness consideration conversion route dayparting
+evening lunch morning family student traveller shopper driver parent professional fan gamer
+neighbourhood mall airport station stadium campus downtown suburb retail park drive-thru
+convenience certainty novelty familiarity reward effort price identity status safety trust
+message creative offer bundle coupon countdown limited fresh seasonal holiday payday rainy sunny
+""".split()
+
+DECISION_TYPES = list(get_args(DecisionType))
+TENSIONS = list(get_args(PrimaryTension))
+WINDOWS = list(get_args(DecisionWindow))
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def synthetic_campaign(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "Category": rng.choice(CATEGORIES),
+        "Objective": _sentence(rng, rng.randint(6, 12)),
+        "Channels": ", ".join(rng.sample(CHANNELS, rng.randint(1, 3))),
+        "Market": rng.choice(MARKETS),
+        "Flight_Dates": "2026-02-01 to 2026-02-28",
+        "Audience_Logic": _sentence(rng, rng.randint(8, 16)),
+        "Creative_Notes": _sentence(rng, rng.randint(4, 10)),
+        "Measurement_Type": rng.choice(["Footfall", "Sales lift", "Brand lift", "Web visits"]),
+        "Key_Result": "Directional: uplift observed",
+        "POI_Context": _sentence(rng, rng.randint(4, 8)),
+        "Notes": "",
+    }
+
+def synthetic_case(rng: random.Random, i: int) -> Dict[str, Any]:
+    campaign = synthetic_campaign(rng)
+    dm = dict(OFFLINE_DECISION_MAP)
+    dm["decision_type"] = rng.choice(DECISION_TYPES)
+    dm["primary_tension"] = rng.choice(TENSIONS)
+    dm["decision_window"] = rng.choice(WINDOWS)
+    dm["decision_being_influenced"] = _sentence(rng, rng.randint(8, 14))
+    brief = "\n".join(_sentence(rng, rng.randint(10, 20)) for _ in range(rng.randint(6, 12)))
+    day = i % 365
+    return {
+        "created_at": f"2025-{1 + day // 31 % 12:02d}-{1 + day % 28:02d} {i % 24:02d}:{i % 60:02d}:{i % 59:02d}",
+        "category": campaign["Category"],
+        "market": campaign["Market"],
+        "channels": campaign["Channels"],
+        "objective": campaign["Objective"],
+        "decision_type": dm["decision_type"],
+        "primary_tension": dm["primary_tension"],
+        "decision_window": dm["decision_window"],
+        # The case number makes every row unique for the content-hash dedup.
+        "input_json": json.dumps({"source": "synthetic", "n": i, "campaign": campaign}, ensure_ascii=False),
+        "decision_map_json": json.dumps(dm, ensure_ascii=False),
+        "brief_text": brief,
+    }
+
+def iter_jsonl(n: int, seed: int = 0, start: int = 0) -> Iterator[str]:
+    rng = random.Random(seed * 1_000_003 + start)
+    for i in range(start, start + n):
+        yield json.dumps(synthetic_case(rng, i), ensure_ascii=False)
+
+def query_campaigns(n: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [synthetic_campaign(rng) for _ in range(n)]
+
+def build_library(db_path: str, n: int, seed: int = 0) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    stats = import_jsonl_stream(iter_jsonl(n, seed), db_path=db_path)
+    return {"rows": n, "seconds": time.perf_counter() - t0, **{k: stats[k] for k in ("inserted", "skipped", "failed")}}
+
+def library(n: int, seed: int = 0, rebuild: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """Path to a cached library of n cases, building it first if needed."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f"library_{n}_{seed}.sqlite3"
+    if path.exists() and not rebuild:
+        try:
+            conn = sqlite3.connect(path)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            count = conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+            conn.close()
+            if version == len(MIGRATIONS) and count == n:
+                return str(path), {"rows": n, "cached": True}
+        except sqlite3.Error:
+            pass
+    close_thread_connections()
+    for p in CACHE_DIR.glob(path.name + "*"):
+        p.unlink()
+    init_db(str(path))
+    return str(path), {**build_library(str(path), n, seed), "cached": False}
@@ -1,21 +1,58 @@
+import asyncio
+import sys
+
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app import jobs
+from app.assets import CompressMiddleware, StaticAssets
+from app.limits import BodyLimitMiddleware
+from app.api import router as api_router
 from app.web import router as web_router
+from app.llm_router import aclose as llm_aclose
+from app.metrics import MetricsMiddleware, expose as expose_metrics
+from app.warmup import is_ready, readiness, warm_up
 
 
 app = FastAPI(title="Behavioral Context Engine", version="1.0")
 
-from pathlib import Path
+app.mount("/static", StaticAssets(), name="static")
+app.include_router(web_router)
+app.include_router(api_router)
+# Added last = outermost: metrics time the response including compression.
+app.add_middleware(BodyLimitMiddleware)
+app.add_middleware(CompressMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-BASE_DIR = Path(__file__).resolve().parent
+_background = set()
 
-app.mount(
-    "/static",
-    StaticFiles(directory=str(BASE_DIR / "static")),
-    name="static",
-)
-app.include_router(web_router)
+@app.on_event("startup")
+async def startup():
+    # Off the critical path: the port opens now, warm-up finishes in the background.
+    task = asyncio.create_task(warm_up())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    # Picks up jobs queued before a restart as well as new ones.
+    jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Workers first: a job cut off mid-run goes back to the queue before clients close.
+    await jobs.stop()
+    await llm_aclose()
+    # Persist the similarity index if this process built or extended it.
+    lexical = sys.modules.get("app.lexical")
+    if lexical is not None:
+        await asyncio.to_thread(lexical.save_all)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    return JSONResponse(readiness(), status_code=200 if is_ready() else 503)
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format 0.0.4.
+    return PlainTextResponse(expose_metrics(), media_type="text/plain; version=0.0.4")
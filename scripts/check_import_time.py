@@ -0,0 +1,72 @@
+"""
+Import-time budget for `main:app` (cold start on the Render starter plan).
+
+Runs `import main` in fresh interpreters and fails if the median exceeds the
+budget, or if any module that warm-up is supposed to load later is pulled onto
+the import path.
+
+Measured with this script on a dev container: ~990 ms median when app.excel
+imported pandas at module load, ~600 ms with the Excel stack deferred (most of
+what is left is FastAPI/pydantic itself). The budget leaves ~30% headroom for
+slower hosts; override it with IMPORT_BUDGET_MS.
+
+    python scripts/check_import_time.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = 800.0
+
+# Heavy modules that must stay off the import path of main:app, and the app's own
+# request-time modules that warm-up loads instead.
+DEFERRED_MODULES = [
+    "openai", "openpyxl", "numpy", "pandas", "httpx",
+    "app.dedup", "app.facets", "app.prompting", "app.retrieval",
+]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main  # noqa: F401
+elapsed = (time.perf_counter() - t0) * 1000
+print(json.dumps({"ms": elapsed, "modules": sorted(m for m in sys.modules if "." not in m or m.startswith("app."))}))
+"""
+
+def _run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    budget = float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS))
+    runs = [_run_once() for _ in range(max(1, args.runs))]
+    timings = sorted(r["ms"] for r in runs)
+    median = statistics.median(timings)
+
+    leaked = sorted(set(DEFERRED_MODULES) & set(runs[-1]["modules"]))
+
+    print(f"import main: median {median:.0f} ms, min {timings[0]:.0f} ms, max {timings[-1]:.0f} ms (budget {budget:.0f} ms)")
+    if leaked:
+        print(f"FAIL: deferred modules imported at startup: {', '.join(leaked)}")
+    if median > budget:
+        print("FAIL: import-time budget exceeded")
+    return 1 if (leaked or median > budget) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Recompress the case library's payloads with a dictionary trained on it.
+
+New cases are compressed with the newest dictionary as they are written, but
+the first one (from the migration) is plain zlib for a library that started
+empty. Run this once the library has a few hundred cases, and again whenever
+the prompts change enough that briefs read differently: it trains a fresh
+dictionary, rewrites older rows with it and VACUUMs the file. Safe to run
+next to the app. Compression itself is opt-in: set BCE_PAYLOAD_COMPRESSION=1
+for this run and for the app, or this only rewrites payloads back to raw.
+
+The migration that moves the payloads to their own table drops the old text
+columns from `cases`, but a library an earlier build migrated still has them.
+--drop-legacy-columns removes them (first, so the VACUUM reclaims them). That
+cannot be undone: take a backup and stop the app before using it.
+
+    python scripts/compact_library.py [--db PATH] [--no-vacuum] [--drop-legacy-columns]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import DEFAULT_DB_PATH, compact_payloads, drop_legacy_payload_columns  # noqa: E402
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--no-vacuum", action="store_true")
+    parser.add_argument("--drop-legacy-columns", action="store_true")
+    args = parser.parse_args()
+
+    if args.drop_legacy_columns:
+        dropped = drop_legacy_payload_columns(args.db)
+        print("legacy payload columns dropped" if dropped else "no legacy payload columns")
+    stats = compact_payloads(args.db, vacuum=not args.no_vacuum)
+    print(json.dumps(stats))
+    before, after = stats["bytes_before"], stats["bytes_after"]
+    print(f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB, {stats['rewritten']} payloads rewritten")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Module-level defaults (BCE_DB_PATH, the LLM cache path) are read at import
+# time, so point them at a scratch directory before anything from app is imported.
+_scratch = tempfile.mkdtemp(prefix="bce-tests-")
+os.environ["BCE_DB_PATH"] = os.path.join(_scratch, "library.sqlite3")
+os.environ["LLM_CACHE_PATH"] = os.path.join(_scratch, "llm_cache.sqlite3")
+os.environ["LLM_PROVIDER"] = "offline"
+os.environ.pop("LLM_OFFLINE_FALLBACK", None)
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pytest  # noqa: E402
+
+@pytest.fixture
+def db_path(tmp_path):
+    from app.db import init_db
+    path = str(tmp_path / "library.sqlite3")
+    init_db(path)
+    return path
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import db
+from app.api import parse_fields, project, wants
+
+CAMPAIGN = {"category": "Retail", "channels": "DOOH, Display", "market": "US - NYC", "audience_logic": "Commuters"}
+
+def _request(path, method="GET", **kwargs):
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(main())
+
+@pytest.mark.parametrize("fields, tree", [
+    ("", None),
+    (" , ", None),
+    ("headline", {"headline": {}}),
+    ("cases.id, cases.objective,next_cursor", {"cases": {"id": {}, "objective": {}}, "next_cursor": {}}),
+    ("dm,dm.decision_type", {"dm": {"decision_type": {}}}),
+])
+def test_parse_fields(fields, tree):
+    assert parse_fields(fields) == tree
+
+def test_project_keeps_the_asked_paths():
+    body = {"cases": [{"id": 1, "objective": "a", "brief_text": "x"}, {"id": 2, "brief_text": "y"}],
+            "next_cursor": None, "total": 2}
+    assert project(body, parse_fields("cases.id,cases.objective,next_cursor,missing")) == {
+        "cases": [{"id": 1, "objective": "a"}, {"id": 2}],
+        "next_cursor": None,
+    }
+    assert project(body, None) is body
+    assert project(body, parse_fields("total.value")) == {"total": 2}
+
+def test_wants():
+    assert wants(None, "brief")
+    assert wants(parse_fields("brief.text"), "brief")
+    assert not wants(parse_fields("headline"), "brief")
+
+def test_case_list_is_projected():
+    db.init_db()
+    db.insert_case({"campaign": {"Objective": "Projected"}}, "{}", "long brief", db_path=db.DEFAULT_DB_PATH)
+    r = _request("/api/v1/cases?limit=1&fields=cases.id,cases.objective,next_cursor")
+    assert r.status_code == 200
+    body = r.json()
+    assert set(body) == {"cases", "next_cursor"}
+    assert set(body["cases"][0]) == {"id", "objective"}
+
+    assert _request("/api/v1/cases?cursor=nonsense").status_code == 400
+    assert _request("/api/v1/cases/999999999").status_code == 404
+
+def test_generate_leaves_out_what_was_not_asked_for():
+    r = _request("/api/v1/generate?fields=headline,dm.decision_type", method="POST", json={**CAMPAIGN, "objective": "Visits"})
+    assert r.status_code == 200
+    body = r.json()
+    assert set(body) == {"headline", "dm"} and set(body["dm"]) == {"decision_type"}
+
+    r = _request("/api/v1/generate", method="POST", content=json.dumps(["not", "an", "object"]))
+    assert (r.status_code, r.json()) == (400, {"error": "Body must be a JSON object."})
@@ -0,0 +1,59 @@
+import asyncio
+import gzip
+
+import httpx
+
+from app.assets import IMMUTABLE, REVALIDATE, accepted_encodings, asset_url
+
+def _get(path, **headers):
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(main())
+
+def test_accepted_encodings():
+    def accepted(value):
+        return accepted_encodings([(b"accept-encoding", value.encode("latin-1"))])
+
+    assert accepted("gzip, deflate, br") == ["br", "gzip"]
+    assert accepted("br;q=0, gzip;q=0.5") == ["gzip"]
+    assert accepted("*") == ["br", "gzip"]
+    assert accepted("identity") == []
+    assert accepted_encodings([]) == []
+
+def test_fingerprinted_urls_are_immutable():
+    url = asset_url("styles.css")
+    assert url.startswith("/static/styles.") and url != "/static/styles.css"
+    r = _get(url, **{"accept-encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == IMMUTABLE
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+
+    plain = _get("/static/styles.css", **{"accept-encoding": "identity"})
+    assert plain.headers["cache-control"] == REVALIDATE
+    assert "content-encoding" not in plain.headers
+    # httpx decodes the gzip body: both are the same file.
+    assert r.content == plain.content
+
+    assert _get(url, **{"if-none-match": r.headers["etag"], "accept-encoding": "gzip"}).status_code == 304
+    assert _get("/static/missing.css").status_code == 404
+
+def test_html_pages_are_compressed():
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            # Read the raw bytes: httpx would otherwise decode them.
+            async with client.stream("GET", "/", headers={"accept-encoding": "gzip"}) as r:
+                return r, b"".join([chunk async for chunk in r.aiter_raw()])
+
+    r, raw = asyncio.run(main())
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) == len(raw)
+    assert asset_url("index.css") in gzip.decompress(raw).decode("utf-8")
+
+    assert "content-encoding" not in _get("/", **{"accept-encoding": "identity"}).headers
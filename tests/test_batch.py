@@ -0,0 +1,61 @@
+import asyncio
+from io import BytesIO
+
+import httpx
+
+from app.excel import SAMPLE_ROW, SHEET_NAME, TEMPLATE_COLUMNS, _write_xlsx, parse_template_rows
+
+def _workbook(*rows):
+    return _write_xlsx(SHEET_NAME, TEMPLATE_COLUMNS, rows)
+
+def test_every_row_is_parsed_and_bad_rows_are_numbered():
+    campaigns, errors = parse_template_rows(_workbook(
+        SAMPLE_ROW,
+        {},  # blank rows are skipped, not reported
+        {**SAMPLE_ROW, "Market": "", "Channels": " "},
+        {**SAMPLE_ROW, "Objective": "Second objective"},
+    ))
+    assert [c["Objective"] for c in campaigns] == [SAMPLE_ROW["Objective"], "Second objective"]
+    assert errors == ["Row 4: missing Channels, Market"]
+
+    assert parse_template_rows(_workbook()) == ([], [f"Excel sheet '{SHEET_NAME}' is empty."])
+
+def test_a_batch_runs_every_row_and_returns_a_results_workbook():
+    from main import app
+    from openpyxl import load_workbook
+
+    rows = [SAMPLE_ROW, {**SAMPLE_ROW, "Objective": "Launch awareness", "Channels": "Social"}]
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            r = await client.post("/batch", files={"excel": ("plan.xlsx", _workbook(*rows))})
+            assert r.status_code == 200
+            started = r.json()
+            assert started["total"] == 2
+            for _ in range(200):
+                status = (await client.get(started["status_url"])).json()
+                if status["status"] == "done":
+                    break
+                await asyncio.sleep(0.05)
+            return status, await client.get(started["results_url"])
+
+    status, results = asyncio.run(main())
+    assert (status["completed"], status["failed"], status["progress"]) == (2, 0, 1.0)
+    assert results.status_code == 200
+
+    sheet = load_workbook(BytesIO(results.content), read_only=True).active
+    header, *body = [list(r) for r in sheet.iter_rows(values_only=True)]
+    by_column = [dict(zip(header, r)) for r in body]
+    assert [r["Objective"] for r in by_column] == [SAMPLE_ROW["Objective"], "Launch awareness"]
+    assert all(r["brief"] and r["decision_type"] and not r["error"] for r in by_column)
+
+def test_a_workbook_with_bad_rows_is_refused_whole():
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/batch", files={"excel": ("plan.xlsx", _workbook(SAMPLE_ROW, {**SAMPLE_ROW, "Category": ""}))})
+
+    r = asyncio.run(main())
+    assert r.status_code == 422
+    assert r.json()["rows"] == ["Row 3: missing Category"]
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.db import _conn, channel_overlap, count_cases, insert_case, list_cases_page, normalize_channels
+
+def _add_case(db_path, channels):
+    campaign = {"Objective": "Visits", "Channels": channels}
+    return insert_case({"campaign": campaign}, json.dumps({"objective": "Visits"}), "brief", db_path=db_path)
+
+@pytest.mark.parametrize("channels, tokens", [
+    ("DOOH, Display ,dooh", ["dooh", "display"]),
+    (" Social ", ["social"]),
+    ("Audio,, ,TV", ["audio", "tv"]),
+    ("", []),
+    (None, []),
+])
+def test_normalize_channels(channels, tokens):
+    assert normalize_channels(channels) == tokens
+
+def test_insert_indexes_each_channel_once(db_path):
+    case_id = _add_case(db_path, "DOOH, Display ,dooh")
+    rows = _conn(db_path).execute(
+        "SELECT channel FROM case_channels WHERE case_id = ? ORDER BY channel", (case_id,)
+    ).fetchall()
+    assert [r[0] for r in rows] == ["display", "dooh"]
+
+def test_channel_filter_matches_whole_tokens(db_path):
+    a = _add_case(db_path, "DOOH, Display")
+    _add_case(db_path, "Social")
+    # A substring match on the raw column would also find "Display" for "play".
+    _add_case(db_path, "Play")
+
+    assert [r["id"] for r in list_cases_page(channel=" dooh ", db_path=db_path)[0]] == [a]
+    assert count_cases(channel="DISPLAY", db_path=db_path) == 1
+    assert count_cases(channel="play", db_path=db_path) == 1
+
+def test_channel_overlap(db_path):
+    a = _add_case(db_path, "DOOH, Display")
+    b = _add_case(db_path, "display, Social")
+    c = _add_case(db_path, "Audio")
+
+    overlap = channel_overlap(["dooh", "display"], db_path=db_path)
+    assert {k: sorted(v) for k, v in overlap.items()} == {a: ["display", "dooh"], b: ["display"]}
+    assert channel_overlap(["social", "audio"], [a, c], db_path=db_path) == {c: ["audio"]}
+    assert channel_overlap(["dooh"], [], db_path=db_path) == {}
+    assert channel_overlap([], db_path=db_path) == {}
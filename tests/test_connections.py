@@ -0,0 +1,48 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from app.db import _conn, close_thread_connections, count_cases, insert_case
+
+def test_a_thread_reuses_its_connection(db_path):
+    assert _conn(db_path) is _conn(db_path)
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(_conn(db_path)))
+    t.start()
+    t.join()
+    assert other[0] is not _conn(db_path)
+
+def test_connections_are_in_wal_mode(db_path):
+    conn = _conn(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+
+def test_closing_drops_the_thread_connections(db_path):
+    conn = _conn(db_path)
+    close_thread_connections()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    assert _conn(db_path) is not conn
+
+def test_concurrent_writers_wait_instead_of_failing(db_path):
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                insert_case({"campaign": {"Objective": f"{n}-{i}"}}, json.dumps({"n": n, "i": i}), "brief", db_path=db_path)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close_thread_connections()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert count_cases(db_path=db_path) == 80
@@ -0,0 +1,150 @@
+import asyncio
+import html
+import uuid
+
+import pytest
+
+from app import db, dedup
+from app.metrics import llm_stage, record_served, record_tokens, request_served, request_usage, usage_scope
+
+@pytest.fixture
+def key():
+    db.init_db()
+    return uuid.uuid4().hex
+
+def test_identical_calls_share_one_upstream_call(key):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*[dedup.call("pass_a", key, fn) for _ in range(3)])
+
+    assert asyncio.run(main()) == ["answer"] * 3
+    assert calls == [1]
+    assert dedup.in_flight() == 0
+
+def test_every_reader_reports_the_shared_call_usage(key):
+    async def fn():
+        await asyncio.sleep(0.05)
+        record_tokens("simulated", "m", 100, 20)
+        record_served("simulated", "m")
+        return "answer"
+
+    async def reader():
+        with usage_scope():
+            llm_stage.set("pass_b")
+            await dedup.call("pass_b", key, fn)
+            return request_usage(), request_served()
+
+    async def main():
+        return await asyncio.gather(reader(), reader())
+
+    for usage, served in asyncio.run(main()):
+        assert usage == {"prompt": 100, "cached": 0, "completion": 20}
+        assert served == {"pass_b": "simulated"}
+
+def test_an_error_reaches_every_reader(key):
+    async def fn():
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*[dedup.call("pass_a", key, fn) for _ in range(2)], return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert [str(e) for e in errors] == ["upstream down"] * 2
+    assert all(isinstance(e, ValueError) for e in errors)
+
+def test_a_cancelled_call_does_not_leave_readers_waiting(key):
+    async def fn():
+        await asyncio.sleep(10)
+
+    async def main():
+        readers = [asyncio.ensure_future(dedup.call("pass_a", key, fn)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        task = dedup._tasks[key]
+        task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*readers, return_exceptions=True), timeout=1)
+        return task, results
+
+    task, results = asyncio.run(main())
+    assert task.cancelled()
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert dedup.in_flight() == 0
+
+def test_idempotency_key_is_reserved_before_generating(key):
+    async def main():
+        assert await dedup.reserve(key, "h1") is None
+        with pytest.raises(dedup.IdempotencyInProgress) as pending:
+            await dedup.reserve(key, "h1")
+        with pytest.raises(dedup.IdempotencyConflict) as conflict:
+            await dedup.reserve(key, "h2")
+        await dedup.remember(key, "h1", {"brief": "b"})
+        return pending.value.status, conflict.value.status, await dedup.reserve(key, "h1")
+
+    assert asyncio.run(main()) == (409, 422, {"result": {"brief": "b"}})
+
+def test_concurrent_bodies_on_one_key(key):
+    async def main():
+        return await asyncio.gather(*[dedup.reserve(key, f"h{i}") for i in range(4)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert results.count(None) == 1
+    others = [r for r in results if r is not None]
+    assert all(type(r) is dedup.IdempotencyConflict and r.status == 422 for r in others)
+
+def test_a_released_or_abandoned_key_is_free_again(key, monkeypatch):
+    async def main():
+        assert await dedup.reserve(key, "h1") is None
+        await dedup.release(key, "h1")
+        assert await dedup.reserve(key, "h2") is None
+        monkeypatch.setattr(dedup, "ABANDONED_AFTER_S", 0.0)
+        return await dedup.reserve(key, "h3")
+
+    assert asyncio.run(main()) is None
+
+def test_api_replays_a_key_and_rejects_another_body_on_it(key):
+    import httpx
+    from main import app
+
+    campaign = {"category": "Retail", "channels": "DOOH, Display", "market": "US - NYC", "audience_logic": "Commuters"}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            post = lambda objective: client.post(  # noqa: E731
+                "/api/v1/generate?fields=headline",
+                json={**campaign, "objective": objective},
+                headers={"Idempotency-Key": key},
+            )
+            return await post("Drive visits"), await post("Drive visits"), await post("Something else")
+
+    first, again, other = asyncio.run(main())
+    assert first.status_code == again.status_code == 200
+    assert again.headers[dedup.REPLAYED_HEADER] == "true" and again.json() == first.json()
+    assert other.status_code == 422
+
+def test_a_key_is_shared_by_the_form_and_the_api(key):
+    import httpx
+    from main import app
+
+    campaign = {"category": "Retail", "channels": "DOOH", "market": "US - NYC", "audience_logic": "Commuters",
+                "objective": "Drive visits"}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            headers = {"Idempotency-Key": key}
+            api = await client.post("/api/v1/generate?fields=headline", json=campaign, headers=headers)
+            form = await client.post("/generate", data={**campaign, "tone": "Client-facing"}, headers=headers)
+            brief = await client.post("/api/v1/generate?fields=brief", json=campaign, headers=headers)
+            return api, form, brief
+
+    api, form, brief = asyncio.run(main())
+    assert api.status_code == form.status_code == brief.status_code == 200
+    # The form replays the API's result, and runs the Pass B the API skipped.
+    assert form.headers[dedup.REPLAYED_HEADER] == "true"
+    assert html.escape(api.json()["headline"]) in form.text
+    assert html.escape(brief.json()["brief"].splitlines()[0]) in form.text
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from app.db import insert_case, iter_export_jsonl
+from app.web import ClosingStreamingResponse
+
+def _add_case(db_path, objective):
+    insert_case({"campaign": {"Objective": objective}}, json.dumps({"objective": objective}), "brief", db_path=db_path)
+
+def _checkpoint(db_path):
+    # (busy, wal frames, frames checkpointed)
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    finally:
+        conn.close()
+
+def test_export_is_one_line_per_case(db_path):
+    _add_case(db_path, "one")
+    _add_case(db_path, "two")
+    lines = b"".join(iter_export_jsonl(db_path=db_path)).decode("utf-8").splitlines()
+    assert [json.loads(line)["objective"] for line in lines] == ["one", "two"]
+
+def test_closing_an_abandoned_export_releases_its_snapshot(db_path):
+    _add_case(db_path, "first")
+    chunks = iter_export_jsonl(db_path=db_path)
+    next(chunks)
+    _add_case(db_path, "written during the export")
+    _, log, done = _checkpoint(db_path)
+    assert done < log
+
+    chunks.close()
+    _, log, done = _checkpoint(db_path)
+    assert done == log
+
+def test_streaming_response_closes_its_source_on_disconnect():
+    closed = []
+
+    def endless():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield b"x" * 1024
+        finally:
+            closed.append(True)
+
+    async def receive():
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    response = ClosingStreamingResponse(endless(), media_type="application/x-ndjson")
+    asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.0"}}, receive, send))
+    assert closed == [True]
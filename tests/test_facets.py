@@ -0,0 +1,64 @@
+import json
+import random
+
+import pytest
+
+from app.db import count_cases, fts_enabled, import_jsonl_stream, insert_case
+from app.facets import FACETS, FILTERS, library_summary
+
+VALUES = {
+    "category": ["Retail", "Auto", "Food", ""],
+    "market": ["UK", "FR", "US - NYC"],
+    "decision_type": ["Routine", "Impulse capture", ""],
+    "primary_tension": ["Price", "Trust"],
+    "decision_window": ["Now", "Later", ""],
+}
+CHANNELS = ["DOOH", "Display", "Social", "Audio"]
+WORDS = ["commuters", "weekend", "flavour", "rewards"]
+
+def _library(db_path, n=200, seed=3):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        row = {f: rng.choice(values) for f, values in VALUES.items()}
+        row["channels"] = ", ".join(rng.sample(CHANNELS, rng.randrange(3)))
+        row["objective"] = f"{rng.choice(WORDS)} case {i}"
+        row["input_json"] = json.dumps({"n": i})
+        lines.append(json.dumps(row))
+    import_jsonl_stream(lines, db_path=db_path)
+    return rng
+
+def _assert_matches_sql(db_path, q=None, **active):
+    summary = library_summary(q=q, db_path=db_path, **active)
+    assert summary["total"] == count_cases(q=q, db_path=db_path, **active)
+    for f in FILTERS:
+        # Each facet is counted under every other active filter.
+        others = {k: v for k, v in active.items() if k != f}
+        options = VALUES[f] if f in FACETS else CHANNELS
+        expected = {v: count_cases(q=q, db_path=db_path, **others, **{f: v}) for v in options if v}
+        assert dict(summary["facets"][f]) == {v: n for v, n in expected.items() if n}, f
+
+def test_facet_counts_agree_with_sql_filters(db_path):
+    rng = _library(db_path)
+    _assert_matches_sql(db_path)
+    for _ in range(15):
+        active = {f: rng.choice(VALUES[f]) for f in rng.sample(FACETS, rng.randrange(1, 3))}
+        if rng.random() < 0.5:
+            active["channel"] = rng.choice(CHANNELS).lower()
+        _assert_matches_sql(db_path, **active)
+
+def test_facet_counts_follow_a_search(db_path):
+    if not fts_enabled(db_path):
+        pytest.skip("SQLite without FTS5")
+    _library(db_path)
+    _assert_matches_sql(db_path, q="commut")
+    _assert_matches_sql(db_path, q="weekend", category="Retail", channel="social")
+    assert library_summary(q="!!!", db_path=db_path)["total"] == 0
+
+def test_new_cases_are_counted(db_path):
+    _library(db_path, n=20)
+    before = library_summary(db_path=db_path, category="Retail")["total"]
+    insert_case({"campaign": {"Category": "Retail", "Channels": "TV"}}, "{}", "brief", db_path=db_path)
+    summary = library_summary(db_path=db_path, category="Retail")
+    assert summary["total"] == before + 1
+    assert ("TV", 1) in summary["facets"]["channel"]
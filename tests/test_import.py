@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import httpx
+
+from app.db import count_cases, import_jsonl_stream, iter_export_jsonl
+
+def _line(objective, **extra):
+    row = {
+        "created_at": "2025-06-01 09:30:00",
+        "objective": objective,
+        "input_json": json.dumps({"campaign": {"Objective": objective}}),
+        "decision_map_json": json.dumps({"objective": objective}),
+        "brief_text": f"Brief for {objective}.",
+    }
+    row.update(extra)
+    return json.dumps(row)
+
+def _write(path, *lines):
+    path.write_bytes(b"\n".join(line if isinstance(line, bytes) else line.encode("utf-8") for line in lines) + b"\n")
+    return path
+
+def test_a_file_is_imported_in_chunks(db_path, tmp_path):
+    jsonl = _write(
+        tmp_path / "cases.jsonl",
+        *[_line(f"case {i}") for i in range(5)],
+        "",
+        _line("case 0", id=99),  # the same case under another id
+        "{not json",
+        "[1, 2]",
+        b"\xff\xfe",
+    )
+    with open(jsonl, "rb") as f:
+        stats = import_jsonl_stream(f, db_path=db_path, chunk_rows=2)
+    assert {k: stats[k] for k in ("inserted", "skipped", "failed")} == {"inserted": 5, "skipped": 1, "failed": 3}
+    assert [e.split(":")[0] for e in stats["errors"]] == ["Line 8", "Line 9", "Line 10"]
+    assert "not a JSON object" in stats["errors"][1] and "not UTF-8" in stats["errors"][2]
+    assert count_cases(db_path=db_path) == 5
+
+    with open(jsonl, "rb") as f:
+        again = import_jsonl_stream(f, db_path=db_path, chunk_rows=2)
+    assert (again["inserted"], again["skipped"]) == (0, 6)
+
+def test_an_export_imports_into_another_library(db_path, tmp_path):
+    import_jsonl_stream([_line("kept"), _line("also kept")], db_path=db_path)
+    exported = _write(tmp_path / "export.jsonl", b"".join(iter_export_jsonl(db_path=db_path)).rstrip(b"\n"))
+
+    other = str(tmp_path / "other.sqlite3")
+    with open(exported, "rb") as f:
+        assert import_jsonl_stream(f, db_path=other)["inserted"] == 2
+    lines = b"".join(iter_export_jsonl(db_path=other)).decode("utf-8").splitlines()
+    assert [json.loads(line)["brief_text"] for line in lines] == ["Brief for kept.", "Brief for also kept."]
+
+def test_the_import_route_reads_an_uploaded_file():
+    from main import app
+    content = "\n".join([_line("uploaded one"), _line("uploaded two"), "oops"]).encode("utf-8")
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/library/import/jsonl", files={"file": ("cases.jsonl", content)})
+
+    r = asyncio.run(main())
+    assert r.status_code == 200
+    assert {k: r.json()[k] for k in ("inserted", "skipped", "failed")} == {"inserted": 2, "skipped": 0, "failed": 1}
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+from app import db, jobs
+
+def _enqueue(db_path, n, now=100.0):
+    ids = [f"job-{i}" for i in range(n)]
+    for i, job_id in enumerate(ids):
+        db.enqueue_job(job_id, "{}", now + i, db_path=db_path)
+    return ids
+
+def test_claim_takes_the_oldest_runnable_job(db_path):
+    first, second = _enqueue(db_path, 2)
+    job = db.claim_job(now=200.0, lease_s=60.0, db_path=db_path)
+    assert (job["id"], job["status"], job["attempts"], job["lease_until"]) == (first, "running", 1, 260.0)
+    assert db.claim_job(now=200.0, lease_s=60.0, db_path=db_path)["id"] == second
+    assert db.claim_job(now=200.0, lease_s=60.0, db_path=db_path) is None
+
+def test_a_retry_waits_for_its_backoff(db_path):
+    (job_id,) = _enqueue(db_path, 1)
+    db.claim_job(now=100.0, lease_s=60.0, db_path=db_path)
+    db.fail_job(job_id, "upstream down", now=110.0, retry_at=130.0, db_path=db_path)
+    assert db.claim_job(now=120.0, lease_s=60.0, db_path=db_path) is None
+    job = db.claim_job(now=130.0, lease_s=60.0, db_path=db_path)
+    assert (job["id"], job["attempts"], job["error"]) == (job_id, 2, "upstream down")
+
+def test_expired_leases_are_requeued_until_out_of_attempts(db_path):
+    a, b = _enqueue(db_path, 2)
+    db.claim_job(now=105.0, lease_s=10.0, db_path=db_path)
+    db.claim_job(now=105.0, lease_s=30.0, db_path=db_path)
+    assert db.requeue_expired_jobs(now=120.0, max_attempts=2, db_path=db_path) == 1
+    assert db.get_job(a, db_path=db_path)["status"] == "queued"
+    assert db.get_job(b, db_path=db_path)["status"] == "running"
+
+    # a is on its second attempt now, b still on its first.
+    db.claim_job(now=120.0, lease_s=10.0, db_path=db_path)
+    assert db.requeue_expired_jobs(now=200.0, max_attempts=2, db_path=db_path) == 1
+    assert db.get_job(a, db_path=db_path)["status"] == "failed"
+    assert db.job_counts(db_path=db_path) == {"queued": 1, "running": 0, "done": 0, "failed": 1}
+
+def test_a_released_job_gets_its_attempt_back(db_path):
+    (job_id,) = _enqueue(db_path, 1)
+    db.claim_job(now=100.0, lease_s=60.0, db_path=db_path)
+    db.release_job(job_id, now=110.0, db_path=db_path)
+    job = db.get_job(job_id, db_path=db_path)
+    assert (job["status"], job["attempts"], job["lease_until"]) == ("queued", 0, None)
+
+def test_concurrent_workers_never_claim_the_same_job(db_path):
+    ids = _enqueue(db_path, 40)
+    claimed = []
+
+    def worker():
+        while True:
+            job = db.claim_job(now=1000.0, lease_s=60.0, db_path=db_path)
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(ids)
+
+def test_a_job_runs_to_a_result():
+    db.init_db()
+    campaign = {"Category": "Retail", "Objective": "Drive visits", "Channels": "DOOH", "Market": "US"}
+
+    async def main():
+        job_id = await jobs.enqueue(campaign, {"source": "test", "campaign": campaign})
+        job = {**db.get_job(job_id), "attempts": 1}
+        await jobs._process(job)
+        return db.get_job(job_id)
+
+    job = asyncio.run(main())
+    assert job["status"] == "done"
+    result = jobs.job_result(job)
+    assert result["brief"] and result["dm"]
+    assert set(result["served"].values()) <= {"offline"}
+    assert result["input_used"]["campaign"] == campaign
+
+def test_a_failing_job_is_retried_then_failed(monkeypatch):
+    db.init_db()
+    monkeypatch.setenv("JOBS_MAX_ATTEMPTS", "2")
+
+    async def boom(job):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(jobs, "_run", boom)
+
+    async def main():
+        job_id = await jobs.enqueue({}, {})
+        await jobs._process({**db.get_job(job_id), "attempts": 1})
+        retried = db.get_job(job_id)
+        await jobs._process({**retried, "attempts": 2})
+        return retried, db.get_job(job_id)
+
+    retried, failed = asyncio.run(main())
+    assert (retried["status"], retried["error"]) == ("queued", "upstream down")
+    assert retried["available_at"] > retried["created_at"]
+    assert (failed["status"], failed["error"]) == ("failed", "upstream down")
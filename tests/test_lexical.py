@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+
+from app.db import insert_case
+from app.lexical import LexicalIndex, lexical_matches, tokenize
+from app.retrieval import find_similar_cases
+
+def _add_case(db_path, objective, brief, **campaign):
+    campaign = {"Objective": objective, **campaign}
+    return insert_case({"campaign": campaign}, json.dumps({"objective": objective}), brief, db_path=db_path)
+
+def test_tokenize_drops_stopwords_and_short_tokens():
+    assert tokenize("The Commuters, on a 2-for-1 OFFER at 10am!") == ["commuters", "offer", "10am"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+def test_rarer_and_repeated_words_rank_higher(db_path):
+    common = [_add_case(db_path, f"Store visits {i}", "Shoppers visit the store.") for i in range(5)]
+    rare = _add_case(db_path, "Store visits", "Commuters detour to the store.")
+    both = _add_case(db_path, "Store visits", "Commuters detour: commuters, commuters.")
+
+    top = LexicalIndex(db_path).top_k("commuters store", 3)
+    assert [case_id for case_id, _ in top[:2]] == [both, rare]
+    assert top[2][0] in common
+
+def test_matches_are_normalised_to_the_best_one(db_path):
+    a = _add_case(db_path, "Launch awareness", "Gamers respond to rewards.")
+    b = _add_case(db_path, "Launch awareness", "Gamers love rewards, rewards and more rewards.")
+    c = _add_case(db_path, "Drive visits", "Commuters detour.")
+
+    matches = lexical_matches("gamers rewards", 1, [a, c], db_path=db_path)
+    # The best match, plus the asked-for ids that share a word.
+    assert set(matches) == {a, b}
+    assert matches[b] == 1.0 and 0 < matches[a] < 1
+
+def test_the_index_catches_up_and_survives_a_reload(db_path):
+    index = LexicalIndex(db_path)
+    first = _add_case(db_path, "Drive visits", "Commuters detour.")
+    assert [i for i, _ in index.top_k("commuters", 5)] == [first]
+
+    second = _add_case(db_path, "Drive visits", "Commuters and more commuters.")
+    ids, scores = index.scores("commuters")
+    assert ids.tolist() == [first, second]
+    index.save()
+
+    reloaded = LexicalIndex(db_path)
+    assert reloaded.load()
+    ids2, scores2 = reloaded.scores("commuters")
+    assert ids2.tolist() == ids.tolist() and np.allclose(scores2, scores)
+
+def test_similar_wording_adds_to_the_score(db_path):
+    worded = _add_case(db_path, "Reach night-shift nurses", "Nurses leaving hospitals after night shifts.")
+    _add_case(db_path, "Grow app installs", "Gamers respond to rewards.")
+    similar = find_similar_cases({"Objective": "Night-shift nurses near hospitals"}, top_k=3, db_path=db_path)
+    assert [c["id"] for c in similar] == [worded]
+    assert similar[0]["match_reasons"][-1].startswith("Similar wording (100%")
@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import limits
+
+def _post(path, **kwargs):
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(path, **kwargs)
+
+    return asyncio.run(main())
+
+@pytest.fixture(autouse=True)
+def small_limits(monkeypatch):
+    monkeypatch.setattr(limits, "MAX_UPLOAD_BYTES", 2000)
+    monkeypatch.setattr(limits, "MAX_IMPORT_BYTES", 5000)
+
+def _multipart(content):
+    return (
+        b'--zz\r\nContent-Disposition: form-data; name="file"; filename="cases.jsonl"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n" + content + b"\r\n--zz--\r\n"
+    )
+
+def test_a_declared_length_over_the_cap_is_refused_up_front():
+    r = _post("/library/import/jsonl", files={"file": ("cases.jsonl", b"x" * 6000)})
+    assert r.status_code == 413
+    assert _post("/api/v1/generate", content=b"{" + b" " * 3000 + b"}").status_code == 413
+
+def test_a_chunked_body_is_cut_off_at_the_cap():
+    body = _multipart(b'{"objective": "x"}\n' * 600)
+
+    async def chunks():
+        for i in range(0, len(body), 1000):
+            yield body[i:i + 1000]
+
+    r = _post("/library/import/jsonl", content=chunks(), headers={"content-type": "multipart/form-data; boundary=zz"})
+    assert r.status_code == 413
+    assert "too large" in r.json()["error"]
+
+def test_bodies_under_the_cap_go_through():
+    r = _post("/library/import/jsonl", data={"jsonl": ""})
+    assert r.status_code == 400  # reached the route: nothing to import
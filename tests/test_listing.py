@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from app.db import _decode_cursor, _encode_cursor, count_cases, import_jsonl, insert_case, list_cases_page
+
+def _import(db_path, *cases):
+    lines = [json.dumps({"created_at": created_at, "objective": objective, "input_json": json.dumps({"o": objective})})
+             for created_at, objective in cases]
+    return import_jsonl("\n".join(lines), db_path=db_path)
+
+def _all_pages(db_path, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = list_cases_page(limit=limit, cursor=cursor, db_path=db_path, **filters)
+        pages.append([r["objective"] for r in rows])
+        if cursor is None:
+            return pages
+
+def test_cursor_round_trip():
+    cursor = _encode_cursor("2026-01-02 03:04:05", 42)
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == ("2026-01-02 03:04:05", 42)
+
+@pytest.mark.parametrize("cursor", ["not a cursor", _encode_cursor("x", 1)[:-3], "WzEsMiwzXQ"])
+def test_invalid_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        _decode_cursor(cursor)
+
+def test_pages_walk_the_library_newest_first(db_path):
+    # Equal timestamps are ordered by id, so no row is skipped or repeated at a page
+    # edge; a full last page has no cursor, so there is no empty page after it.
+    _import(db_path, *[("2026-01-01 00:00:00", f"old {i}") for i in range(4)])
+    _import(db_path, ("2026-03-01 00:00:00", "newest"), ("2026-02-01 00:00:00", "middle"))
+
+    assert _all_pages(db_path, limit=3) == [
+        ["newest", "middle", "old 3"],
+        ["old 2", "old 1", "old 0"],
+    ]
+
+def test_pages_with_a_filter_and_count(db_path):
+    _import(db_path, *[("2026-01-0%d 00:00:00" % (i + 1), f"visits {i}") for i in range(5)])
+    _import(db_path, ("2026-01-09 00:00:00", "awareness"))
+
+    assert _all_pages(db_path, limit=2, q="visits") == [["visits 4", "visits 3"], ["visits 2", "visits 1"], ["visits 0"]]
+    assert count_cases(q="visits", db_path=db_path) == 5
+
+    insert_case({"campaign": {"Objective": "more visits"}}, "{}", "brief", db_path=db_path)
+    assert count_cases(q="visits", db_path=db_path) == 6
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+from app.llm_cache import LLMCache
+
+def _cache(tmp_path, **kwargs):
+    return LLMCache(path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+def test_roundtrip_through_both_tiers(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    fresh = _cache(tmp_path)
+    assert fresh.get("k") == "v"
+    assert fresh.counters["disk_hits"] == 1
+    assert fresh.get("k") == "v"
+    assert fresh.counters["memory_hits"] == 1
+
+def test_expired_entries_miss(tmp_path):
+    cache = _cache(tmp_path, ttl_s=-1)
+    cache.set("k", "v")
+    assert cache.get("k") is None
+    assert cache.counters["misses"] == 1
+
+def test_async_disk_tier_runs_off_the_loop(tmp_path):
+    _cache(tmp_path).set("k", "v")
+    cache = _cache(tmp_path)
+    threads = []
+    get_disk = cache._get_disk
+
+    def spy(*args):
+        threads.append(threading.get_ident())
+        return get_disk(*args)
+
+    cache._get_disk = spy
+
+    async def main():
+        loop_thread = threading.get_ident()
+        assert await cache.aget("k") == "v"
+        assert await cache.aget("k") == "v"
+        assert await cache.aget("missing") is None
+        return loop_thread
+
+    loop_thread = asyncio.run(main())
+    # The second lookup was answered from memory; the other two went to a worker thread.
+    assert len(threads) == 2
+    assert loop_thread not in threads
+
+def test_aset_is_visible_in_memory_and_on_disk(tmp_path):
+    cache = _cache(tmp_path)
+    asyncio.run(cache.aset("k", "v"))
+    assert cache.counters["sets"] == 1
+    assert _cache(tmp_path).get("k") == "v"
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+from app import llm_router
+from app.llm_offline import OFFLINE_DECISION_MAP, generate_text_offline
+from app.metrics import request_served, usage_scope
+from app.models import DecisionMap
+
+def _map(n_signals):
+    dm = json.loads(json.dumps(OFFLINE_DECISION_MAP))
+    dm["observable_signals"] = dm["observable_signals"][:n_signals]
+    # Still a valid Pass A answer: observable_signals may be empty.
+    DecisionMap.model_validate(dm)
+    return dm
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3])
+def test_brief_lists_exactly_the_maps_signals(n):
+    dm = _map(n)
+    brief = generate_text_offline(decision_map_json=json.dumps(dm))
+    section = brief.split("Observable Signals\n")[1].split("\n\n")[0].splitlines()
+    if n == 0:
+        assert section == ["- None recorded in the decision map."]
+    else:
+        assert section == [f"- ({s['classification']}) {s['signal']}" for s in dm["observable_signals"]]
+
+def test_brief_tolerates_missing_sections():
+    brief = generate_text_offline(decision_map_json=json.dumps({"human_context": "Commuters"}))
+    assert "- Situation: Commuters" in brief
+    assert brief.rstrip().endswith("Medium")
+
+def test_fallback_answer_is_reported_as_offline(monkeypatch):
+    # A simulated upstream that always fails; the opt-in fallback answers instead.
+    monkeypatch.setenv("LLM_PROVIDER", "simulated")
+    monkeypatch.setenv("SIM_QUOTA_ERROR_RATE", "1")
+    monkeypatch.setenv("SIM_LATENCY_PASS_B", "fixed:0")
+    monkeypatch.setenv("SIM_TOKENS_PER_S", "1000000")
+    monkeypatch.setenv("LLM_OFFLINE_FALLBACK", "1")
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "1000")
+    dm_json = json.dumps(_map(1))
+
+    async def main():
+        with usage_scope():
+            text = await llm_router.agenerate_text(
+                model="m", system_instruction="s", user_prompt="u", decision_map_json=dm_json, stage="pass_b",
+            )
+            return text, request_served()
+
+    text, served = asyncio.run(main())
+    assert text == generate_text_offline(decision_map_json=dm_json)
+    assert served == {"pass_b": "offline"}
+    assert llm_router.answered_by(served) == "offline"
+
+def test_simulated_brief_follows_the_map_it_was_given():
+    from app.llm_simulated import _text, decision_map_for
+
+    for i in range(20):
+        dm = decision_map_for(f'{{"Objective": "Campaign {i}"}}')
+        brief = _text(json.dumps(dm))
+        assert dm["human_context"] in brief
+        for s in dm["observable_signals"]:
+            assert s["signal"] in brief
+        assert brief.count("\n- (") == len(dm["observable_signals"])
+        assert brief.rstrip().endswith(dm["confidence_assessment"]["level"])
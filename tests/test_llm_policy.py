@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from app import llm_policy
+
+PRIMARY = ("openai", "primary")
+BACKUP = ("openai", "backup")
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_MODEL", "backup")
+    monkeypatch.setenv("LLM_HEDGE_AFTER_S", "0.02")
+    monkeypatch.setenv("LLM_BUDGET_S", "5")
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("LLM_BREAKER_COOLDOWN_S", "0")
+    monkeypatch.delenv("LLM_OFFLINE_FALLBACK", raising=False)
+    monkeypatch.setattr(llm_policy, "_tracker", llm_policy.LatencyTracker())
+    llm_policy._breakers.clear()
+    yield
+    llm_policy._breakers.clear()
+
+def _target_fn(primary_behaviour):
+    calls = []
+
+    async def fn(target):
+        calls.append(target)
+        if target == PRIMARY:
+            return await primary_behaviour()
+        return "backup answer"
+
+    return fn, calls
+
+async def _fail():
+    raise RuntimeError("upstream down")
+
+async def _slow():
+    await asyncio.sleep(1)
+    return "primary answer"
+
+def test_breaker_opens_then_lets_one_trial_through():
+    b = llm_policy.CircuitBreaker(failures=2, cooldown_s=0)
+    assert b.allow() == "closed"
+    b.failure()
+    b.failure()
+    assert b.state() == "half_open"
+    assert b.allow() == "half_open"
+    assert b.allow() is None
+    b.success()
+    assert b.state() == "closed"
+
+def test_half_open_trial_that_loses_a_hedge_is_released():
+    async def main():
+        failing, _ = _target_fn(_fail)
+        # Opens the primary's breaker; the backup answers.
+        assert await llm_policy.call("pass_a", PRIMARY, failing) == ("backup answer", BACKUP)
+        assert llm_policy.breaker(PRIMARY).state() == "half_open"
+
+        slow, calls = _target_fn(_slow)
+        # The trial call is slow, the hedge wins and the trial is cancelled...
+        assert await llm_policy.call("pass_a", PRIMARY, slow) == ("backup answer", BACKUP)
+        assert llm_policy.breaker(PRIMARY).snapshot()["trial"] is False
+        # ...so the next calls still try the primary first.
+        for _ in range(3):
+            await llm_policy.call("pass_a", PRIMARY, slow)
+        return calls
+
+    calls = asyncio.run(main())
+    assert calls.count(PRIMARY) == 4
+
+def test_cancelled_call_releases_its_trial():
+    async def main():
+        failing, _ = _target_fn(_fail)
+        await llm_policy.call("pass_a", PRIMARY, failing)
+        slow, _ = _target_fn(_slow)
+        task = asyncio.create_task(llm_policy.call("pass_a", PRIMARY, slow))
+        await asyncio.sleep(0.01)
+        assert llm_policy.breaker(PRIMARY).snapshot()["trial"] is True
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert llm_policy.breaker(PRIMARY).snapshot()["trial"] is False
+
+def test_abandoned_trial_stream_is_released(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGE_MODEL")
+    llm_policy.breaker(PRIMARY).failure()
+    assert llm_policy.breaker(PRIMARY).state() == "half_open"
+
+    async def chunks(target):
+        for word in ("one ", "two ", "three"):
+            yield word
+            await asyncio.sleep(0.01)
+
+    async def main():
+        stream = llm_policy.stream("pass_b", PRIMARY, chunks)
+        assert await stream.__anext__() == "one "
+        assert llm_policy.breaker(PRIMARY).snapshot()["trial"] is True
+        await stream.aclose()
+
+    asyncio.run(main())
+    snapshot = llm_policy.breaker(PRIMARY).snapshot()
+    assert snapshot["trial"] is False
+    assert snapshot["state"] == "half_open"
+
+def test_upstream_errors_surface_without_the_opt_in(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGE_MODEL")
+    fn, _ = _target_fn(_fail)
+    with pytest.raises(RuntimeError, match="upstream down"):
+        asyncio.run(llm_policy.call("pass_a", PRIMARY, fn))
+
+def test_offline_fallback_reports_the_offline_target(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGE_MODEL")
+    monkeypatch.setenv("LLM_OFFLINE_FALLBACK", "1")
+
+    async def fn(target):
+        if target == llm_policy.OFFLINE:
+            return "canned"
+        raise RuntimeError("upstream down")
+
+    assert asyncio.run(llm_policy.call("pass_a", PRIMARY, fn)) == ("canned", llm_policy.OFFLINE)
@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+
+from app import metrics
+from app.db import get_case
+
+def _get(path):
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+
+    return asyncio.run(main())
+
+def _samples(name):
+    # Exposed sample lines of one metric, e.g. 'bce_db_query_seconds_count{op="get_case"} 3'.
+    return [line for line in metrics.expose().splitlines() if line.startswith(name)]
+
+def _count(name, **labels):
+    want = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    for line in _samples(name + "_count"):
+        if line.startswith(f"{name}_count{{{want}}} "):
+            return int(line.rsplit(" ", 1)[1])
+    return 0
+
+def test_exposition_format():
+    counter = metrics.Counter("t_total", "Help.", ("kind",))
+    counter.inc('say "hi"\n')
+    counter.inc('say "hi"\n', amount=2)
+    assert counter.expose() == ["# HELP t_total Help.", "# TYPE t_total counter", 't_total{kind="say \\"hi\\"\\n"} 3']
+
+    hist = metrics.Histogram("t_seconds", "Help.", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        hist.observe(v, "x")
+    assert hist.expose()[2:] == [
+        't_seconds_bucket{op="x",le="0.1"} 1',
+        't_seconds_bucket{op="x",le="1"} 2',
+        't_seconds_bucket{op="x",le="+Inf"} 3',
+        't_seconds_sum{op="x"} 5.550000',
+        't_seconds_count{op="x"} 3',
+    ]
+
+def test_server_timing_sums_repeated_stages():
+    header = metrics.server_timing([("db", 0.001), ("pass_a", 0.25), ("db", 0.002)], 0.3)
+    assert header == "db;dur=3.0, pass_a;dur=250.0, total;dur=300.0"
+
+def test_db_calls_are_labelled_by_function(db_path):
+    before = _count("bce_db_query_seconds", op="get_case")
+    get_case(1, db_path=db_path)
+    assert _count("bce_db_query_seconds", op="get_case") == before + 1
+
+def test_requests_are_labelled_by_route_template():
+    labels = {"method": "GET", "route": "/api/v1/cases/{case_id}", "status": "404"}
+    before = _count("bce_http_request_seconds", **labels)
+    r = _get("/api/v1/cases/424242")
+    assert r.status_code == 404
+    assert _count("bce_http_request_seconds", **labels) == before + 1
+
+    unmatched = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = _count("bce_http_request_seconds", **unmatched)
+    _get("/no/such/page/1")
+    assert _count("bce_http_request_seconds", **unmatched) == before + 1
+
+def test_responses_carry_server_timing():
+    r = _get("/api/v1/cases/424242")
+    entries = [e.split(";")[0] for e in r.headers["server-timing"].split(", ")]
+    assert entries == ["db", "total"]
+
+    r = _get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE bce_http_request_seconds histogram" in r.text
+
+def test_the_llm_stage_does_not_outlive_the_call():
+    from app.llm_router import agenerate_text, astream_text
+
+    args = dict(model="m", system_instruction="s", user_prompt="u", decision_map_json='{"decision_type": "Routine"}')
+
+    async def main():
+        seen = [await agenerate_text(**args, stage="pass_b") and metrics.llm_stage.get()]
+        async for _ in astream_text(**args, stage="pass_b"):
+            seen.append(metrics.llm_stage.get())
+        return seen + [metrics.llm_stage.get()]
+
+    seen = asyncio.run(main())
+    assert len(seen) > 2 and set(seen) == {""}
@@ -0,0 +1,66 @@
+import json
+import sqlite3
+
+from app import db
+
+def _baseline_library(path):
+    # The schema before any migration, holding cases written by that version.
+    conn = sqlite3.connect(path)
+    conn.executescript(db.SCHEMA_SQL)
+    rows = [
+        ("2025-06-01T09:30:00", "DOOH, Display ,dooh", "Drive store visits", "Commuters detour for the offer."),
+        ("2025-06-02 10:00:00", "Social", "Launch awareness", "Scrollers notice the flavour."),
+        ("2025-06-02 10:00:00", "Social", "Launch awareness", "Scrollers notice the flavour."),
+    ]
+    for created_at, channels, objective, brief in rows:
+        conn.execute(
+            """
+            INSERT INTO cases (created_at, channels, objective, input_json, decision_map_json, brief_text)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (created_at, channels, objective, json.dumps({"o": objective}), json.dumps({"objective": objective}), brief),
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+def _version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_a_new_library_gets_every_migration(db_path):
+    assert _version(db_path) == len(db.MIGRATIONS)
+
+def test_migrating_a_baseline_library_backfills_every_index(tmp_path):
+    path = _baseline_library(str(tmp_path / "library.sqlite3"))
+    db.init_db(path)
+    assert _version(path) == len(db.MIGRATIONS)
+    conn = db._conn(path)
+
+    # keyset: timestamps normalised so text order is time order
+    assert conn.execute("SELECT created_at FROM cases WHERE id = 1").fetchone()[0] == "2025-06-01 09:30:00"
+    # case_channels: parsed and de-duplicated
+    channels = conn.execute("SELECT channel FROM case_channels WHERE case_id = 1 ORDER BY channel").fetchall()
+    assert [r[0] for r in channels] == ["display", "dooh"]
+    assert db.list_cases_page(channel="social", db_path=path)[0][0]["id"] == 3
+    # content_hash: repeats share one, and an import of the same case is skipped
+    hashes = [r[0] for r in conn.execute("SELECT content_hash FROM cases ORDER BY id")]
+    assert hashes[1] == hashes[2] != hashes[0]
+    line = json.dumps({"input_json": json.dumps({"o": "Drive store visits"}),
+                       "decision_map_json": json.dumps({"objective": "Drive store visits"})})
+    assert db.import_jsonl(line, db_path=path) == 0
+    # FTS: rebuilt from the rows that were already there
+    if db.fts_enabled(path):
+        assert db.fts_match_ids("commuter detour", db_path=path) == [1]
+
+def test_migrations_run_once(tmp_path):
+    path = _baseline_library(str(tmp_path / "library.sqlite3"))
+    db.init_db(path)
+    db._initialized.discard(path)
+    db.init_db(path)
+    conn = db._conn(path)
+    assert conn.execute("SELECT COUNT(*) FROM case_channels").fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM case_payloads").fetchone()[0] == 3
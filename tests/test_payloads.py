@@ -0,0 +1,123 @@
+import json
+import sqlite3
+
+import pytest
+
+from app import db
+
+CASES = 60  # enough for the migration to train a dictionary (PAYLOAD_DICT_MIN_CASES)
+
+def _case(i):
+    campaign = {"Objective": f"Objective {i}", "Channels": "DOOH, Display"}
+    decision_map = {"decision_being_influenced": f"Whether to visit store {i}", "decision_type": "Habit disruption"}
+    brief = f"Executive Decision Headline\nCommuters near store {i} weigh a detour against the offer. marker{i}"
+    return {"campaign": campaign}, json.dumps(decision_map), brief
+
+def _baseline_library(path):
+    # A library as the app wrote it before the payloads moved to case_payloads.
+    conn = sqlite3.connect(path)
+    conn.executescript(db.SCHEMA_SQL)
+    for i in range(CASES):
+        input_used, decision_map_json, brief = _case(i)
+        conn.execute(
+            "INSERT INTO cases (channels, objective, input_json, decision_map_json, brief_text) VALUES (?, ?, ?, ?, ?)",
+            (input_used["campaign"]["Channels"], input_used["campaign"]["Objective"], json.dumps(input_used),
+             decision_map_json, brief),
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture(params=["0", "1"], ids=["raw", "compressed"])
+def compression(request, monkeypatch):
+    monkeypatch.setenv("BCE_PAYLOAD_COMPRESSION", request.param)
+    return request.param == "1"
+
+def test_migrating_a_library_keeps_its_text(tmp_path, compression):
+    path = _baseline_library(str(tmp_path / "library.sqlite3"))
+    db.init_db(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT MAX(codec) FROM case_payloads").fetchone()[0] == int(compression)
+    # The text is only in case_payloads now.
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(cases)").fetchall()}
+    assert not columns & set(db.PAYLOAD_COLUMNS)
+    conn.close()
+    assert not db.drop_legacy_payload_columns(path)
+
+    for i in range(CASES):
+        case = db.get_case(i + 1, db_path=path)
+        assert (json.loads(case["input_json"]), case["decision_map_json"], case["brief_text"]) == _case(i)
+
+    new_id = db.insert_case(*_case(CASES), db_path=path)
+    assert db.get_case(new_id, db_path=path)["brief_text"] == _case(CASES)[2]
+    exported = [json.loads(line) for line in db.export_jsonl(db_path=path).splitlines()]
+    assert [d["brief_text"] for d in exported] == [_case(i)[2] for i in range(CASES + 1)]
+    if db.fts_enabled(path):
+        assert db.fts_match_ids("marker7", db_path=path) == [8]
+
+def test_export_matches_cases_full(tmp_path, compression):
+    path = _baseline_library(str(tmp_path / "library.sqlite3"))
+    db.init_db(path)
+    rows = db._conn(path).execute("SELECT * FROM cases_full ORDER BY id").fetchall()
+    assert db.export_jsonl(db_path=path) == "".join(json.dumps(dict(r), ensure_ascii=False) + "\n" for r in rows)
+
+def _previous_build_library(path):
+    # A library an earlier build migrated: case_payloads, with the old columns still in `cases`.
+    db.init_db(_baseline_library(path))
+    db.close_thread_connections()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP VIEW IF EXISTS cases_fts_source")
+    for column in db.PAYLOAD_COLUMNS:
+        conn.execute(f"ALTER TABLE cases ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+    if db.fts_enabled(path):
+        conn.execute(db.FTS_SOURCE_SQL)
+    conn.commit()
+    conn.close()
+    # As a new process would open it.
+    db._initialized.discard(path)
+    return path
+
+def test_dropping_the_legacy_columns(tmp_path):
+    path = _previous_build_library(str(tmp_path / "library.sqlite3"))
+    db.init_db(path)
+    assert db.get_case(db.insert_case(*_case(CASES), db_path=path), db_path=path)["brief_text"] == _case(CASES)[2]
+    assert db.drop_legacy_payload_columns(path)
+    assert not db.drop_legacy_payload_columns(path)
+
+    columns = {r[1] for r in db._conn(path).execute("PRAGMA table_info(cases)").fetchall()}
+    assert not columns & set(db.PAYLOAD_COLUMNS)
+    assert db.get_case(3, db_path=path)["brief_text"] == _case(2)[2]
+    assert db.import_jsonl(json.dumps({"objective": "imported", "brief_text": "b"}), db_path=path) == 1
+    assert db.get_case(CASES + 2, db_path=path)["brief_text"] == "b"
+
+def test_a_new_library_has_no_legacy_columns(db_path):
+    assert not db.drop_legacy_payload_columns(db_path)
+
+@pytest.mark.parametrize("layout", ["new", "migrated"])
+def test_database_download_reads_without_the_app(tmp_path, compression, layout):
+    path = str(tmp_path / "library.sqlite3")
+    if layout == "migrated":
+        _baseline_library(path)
+    db.init_db(path)
+    if layout == "new":
+        for i in range(CASES):
+            db.insert_case(*_case(i), db_path=path)
+
+    copy = tmp_path / "download.sqlite3"
+    copy.write_bytes(db.export_db_bytes(path))
+
+    # Plain sqlite3: no bce_unpack registered.
+    conn = sqlite3.connect(str(copy))
+    rows = conn.execute("SELECT input_json, decision_map_json, brief_text FROM cases ORDER BY id").fetchall()
+    assert [(json.loads(r[0]), r[1], r[2]) for r in rows] == [_case(i) for i in range(CASES)]
+    if db.fts_enabled(path):
+        hit = conn.execute(
+            "SELECT rowid, highlight(cases_fts, 2, '[', ']') FROM cases_fts WHERE cases_fts MATCH 'marker5'"
+        ).fetchall()
+        assert hit[0][0] == 6 and "[marker5]" in hit[0][1]
+    conn.close()
+
+    # And the app takes the copy back as a library.
+    db.init_db(str(copy))
+    assert db.get_case(6, db_path=str(copy))["brief_text"] == _case(5)[2]
@@ -0,0 +1,37 @@
+import json
+
+from app.prompting import compact_json, count_tokens, pass_a_prompt, pass_b_prompt
+
+CAMPAIGN = {
+    "Category": "Retail",
+    "Objective": "Drive in-store visits",
+    "Channels": "DOOH, Display",
+    "Market": "US - NYC",
+    "Flight_Dates": "",
+    "Notes": None,
+}
+
+def test_the_system_prefix_is_the_same_for_every_request():
+    a = pass_a_prompt(CAMPAIGN)
+    b = pass_a_prompt({**CAMPAIGN, "Objective": "Launch awareness"})
+    assert a.system == b.system
+    assert "Launch awareness" in b.user and "Launch awareness" not in b.system
+
+def test_the_campaign_is_sent_compact_without_blank_fields():
+    prompt = pass_a_prompt(CAMPAIGN)
+    sent = {k: v for k, v in CAMPAIGN.items() if v}
+    assert compact_json(sent) in prompt.user
+    assert "Flight_Dates" not in prompt.user and "Notes" not in prompt.user
+    assert prompt.tokens == count_tokens(prompt.system) + count_tokens(prompt.user)
+
+def test_pass_b_repacks_the_pretty_decision_map():
+    dm = {"decision_type": "Routine", "signals": {"time": ["weekday"], "place": []}, "notes": ""}
+    prompt = pass_b_prompt(json.dumps(dm, indent=2))
+    assert '{"decision_type":"Routine","signals":{"time":["weekday"]}}' in prompt.user
+    assert pass_b_prompt(json.dumps(dm)).tokens == prompt.tokens
+
+def test_token_counts_grow_with_the_text():
+    assert count_tokens("") == 0
+    short, long = count_tokens("Drive visits"), count_tokens("Drive visits " * 50)
+    assert 0 < short < long
+    assert count_tokens(compact_json(CAMPAIGN)) < count_tokens(json.dumps(CAMPAIGN, indent=2))
@@ -0,0 +1,87 @@
+import json
+import random
+
+from app import retrieval
+from app.db import import_jsonl_stream, iter_cases_after
+from app.retrieval import CaseIndex, find_similar_cases, score_similarity
+
+def _case(created_at, **cols):
+    row = {"created_at": created_at, "input_json": json.dumps(cols), "decision_map_json": "{}", "brief_text": ""}
+    row.update(cols)
+    return json.dumps(row)
+
+def _library(db_path, *rows):
+    import_jsonl_stream(rows, db_path=db_path)
+
+def test_equal_scores_prefer_the_newest_case_across_field_combinations(db_path):
+    # Both score 25 (same decision type vs same market); the older case has the
+    # lower id and its combination is enumerated first.
+    _library(
+        db_path,
+        _case("2023-01-01 09:00:00", market="UK", decision_type="Routine"),
+        _case("2024-06-01 09:00:00", market="FR", decision_type="Impulse capture"),
+    )
+    query = {"Market": "UK", "Decision_Type": "Impulse capture"}
+    assert CaseIndex(db_path).top_k(query, 1) == [2]
+    assert [c["id"] for c in find_similar_cases(query, top_k=2, db_path=db_path)] == [2, 1]
+
+def test_ties_follow_created_at_not_id(db_path):
+    # An import can bring an old case in under a newer id.
+    _library(
+        db_path,
+        _case("2024-06-01 09:00:00", category="Retail", objective="Newer"),
+        _case("2022-01-01 09:00:00", category="Retail", objective="Older"),
+    )
+    query = {"Category": "Retail"}
+    assert CaseIndex(db_path).top_k(query, 2) == [1, 2]
+    assert [c["id"] for c in find_similar_cases(query, top_k=2, db_path=db_path)] == [1, 2]
+
+def test_higher_scores_still_come_first(db_path):
+    _library(
+        db_path,
+        _case("2022-01-01 09:00:00", category="Retail", market="UK"),
+        _case("2024-06-01 09:00:00", category="Retail", market="FR"),
+    )
+    query = {"Category": "Retail", "Market": "UK"}
+    assert CaseIndex(db_path).top_k(query, 2) == [1, 2]
+
+def test_index_catches_up_incrementally(db_path):
+    index = CaseIndex(db_path)
+    _library(db_path, _case("2022-01-01 09:00:00", category="Retail"))
+    assert index.top_k({"Category": "Retail"}, 5) == [1]
+    _library(db_path, _case("2023-01-01 09:00:00", category="Retail", market="UK"))
+    assert index.top_k({"Category": "Retail"}, 5) == [2, 1]
+
+def test_score_weights_come_from_fields(monkeypatch):
+    monkeypatch.setattr(retrieval, "FIELDS", [("Market", "market", 7, "Same market")])
+    query = {"Category": "Retail", "Market": "UK", "Channels": "DOOH, Display, Social, Audio"}
+    cand = {"category": "retail", "market": " uk", "channels": "dooh,display,social,audio"}
+    assert score_similarity(query, cand) == (7 + retrieval.CHANNEL_CAP, [
+        "Same market", "Channel overlap: audio, display, dooh, social",
+    ])
+
+def test_top_k_matches_a_full_scan(db_path):
+    rng = random.Random(7)
+    pick = lambda *values: rng.choice(values)  # noqa: E731
+    rows = [
+        _case(
+            f"202{rng.randrange(5)}-0{rng.randrange(1, 10)}-1{rng.randrange(10)} 09:00:00",
+            category=pick("Retail", "Auto", "Food"), market=pick("UK", "FR", "US", ""),
+            decision_type=pick("Routine", "Impulse capture"), decision_window=pick("Now", "Later", ""),
+            channels=", ".join(rng.sample(["DOOH", "Display", "Social", "Audio", "TV"], rng.randrange(4))),
+        )
+        for _ in range(300)
+    ]
+    _library(db_path, *rows)
+    columns = "id, created_at, category, market, decision_type, decision_window, channels"
+    cases = [dict(r) for r in iter_cases_after(0, columns=columns, db_path=db_path)]
+    index = CaseIndex(db_path)
+    for _ in range(40):
+        query = {
+            "Category": pick("Retail", "Auto"), "Market": pick("UK", "US", ""),
+            "Decision_Type": pick("Routine", ""), "Decision_Window": pick("Now", ""),
+            "Channels": pick("DOOH, Social", "Audio", "TV, Display, DOOH", ""),
+        }
+        scored = [(score_similarity(query, c)[0], c["created_at"], c["id"]) for c in cases]
+        expected = [case_id for score, _, case_id in sorted(scored, reverse=True) if score > 0][:10]
+        assert index.top_k(query, 10) == expected
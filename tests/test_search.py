@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from app.db import _fts_query, count_cases, fts_enabled, fts_match_ids, insert_case, list_cases_page
+
+def _add_case(db_path, objective, brief):
+    return insert_case({"campaign": {"Objective": objective}}, json.dumps({"objective": objective}), brief, db_path=db_path)
+
+@pytest.mark.parametrize("q, match", [
+    ("commuters", '"commuters"*'),
+    ("  go-now offer ", '"go"* "now"* "offer"*'),
+    ('store OR "visit" NOT -x*', '"store"* "OR"* "visit"* "NOT"* "x"*'),
+    ("café", '"café"*'),
+    ("", ""),
+    ("-- ()", ""),
+])
+def test_fts_query_keeps_words_and_drops_operators(q, match):
+    assert _fts_query(q) == match
+
+def test_search_matches_every_word_as_a_prefix(db_path):
+    if not fts_enabled(db_path):
+        pytest.skip("SQLite without FTS5")
+    a = _add_case(db_path, "Drive store visits", "Commuters detour for the weekend offer.")
+    b = _add_case(db_path, "Launch awareness", "Commuters notice the new flavour.")
+    _add_case(db_path, "Grow app installs", "Gamers respond to rewards.")
+
+    assert fts_match_ids("commut", db_path=db_path) == [a, b]
+    assert fts_match_ids("commuters weekend", db_path=db_path) == [a]
+    assert fts_match_ids('"weekend" OR gamers', db_path=db_path) == []
+    assert fts_match_ids(" ", db_path=db_path) is None
+
+    rows, _ = list_cases_page(q="commut", db_path=db_path)
+    assert [r["id"] for r in rows] == [b, a]
+
+def test_a_query_without_words_matches_nothing(db_path):
+    if not fts_enabled(db_path):
+        pytest.skip("SQLite without FTS5")
+    _add_case(db_path, "Drive store visits", "Commuters detour for the weekend offer!!!")
+    assert list_cases_page(q="!!!", db_path=db_path)[0] == []
+    assert count_cases(q="!!!", db_path=db_path) == 0
+    assert fts_match_ids("!!!", db_path=db_path) == []
+
+def test_a_search_pages_by_rank_with_snippets(db_path):
+    if not fts_enabled(db_path):
+        pytest.skip("SQLite without FTS5")
+    ids = [_add_case(db_path, f"Case {n}", "tunnels " * n + "and the rest of the brief") for n in range(1, 6)]
+    _add_case(db_path, "Unrelated", "Gamers respond to rewards.")
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = list_cases_page(limit=2, cursor=cursor, q="tunnels", db_path=db_path)
+        seen += rows
+        if cursor is None:
+            break
+    # More mentions rank higher, whatever the insertion order.
+    assert [r["id"] for r in seen] == ids[::-1]
+    assert all("[tunnels]" in r["snippet"] for r in seen)
+    assert "rank" not in seen[0]
+
+    _, newest_cursor = list_cases_page(limit=1, db_path=db_path)
+    with pytest.raises(ValueError):
+        list_cases_page(cursor=newest_cursor, q="tunnels", db_path=db_path)
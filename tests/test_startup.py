@@ -0,0 +1,18 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Same list as scripts/check_import_time.py, without the timing part.
+DEFERRED_MODULES = [
+    "openai", "openpyxl", "numpy", "pandas", "httpx",
+    "app.dedup", "app.facets", "app.prompting", "app.retrieval",
+]
+
+def test_import_main_leaves_request_time_modules_unloaded():
+    probe = "import json, sys, main; print(json.dumps(sorted(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=str(ROOT), capture_output=True, text=True, check=True)
+    loaded = set(json.loads(out.stdout.strip().splitlines()[-1]))
+    assert not loaded & set(DEFERRED_MODULES)
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import httpx
+
+FORM = {
+    "category": "Retail",
+    "objective": "Drive in-store visits",
+    "channels": "DOOH, Display",
+    "market": "US - NYC",
+    "audience_logic": "Commuters passing retail corridors",
+}
+
+def _events(form):
+    from main import app
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/generate/stream", data=form)
+
+    r = asyncio.run(main())
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in r.text.split("\n\n"):
+        if block:
+            event, data = block.split("\n", 1)
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+def test_sections_come_first_then_tokens_then_done():
+    events = _events(FORM)
+    names = [name for name, _ in events]
+    assert names[0] == "sections" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"}
+
+    sections = events[0][1]
+    assert sections["headline"] and sections["dm"]
+    assert sections["input_used"]["source"] == "manual"
+    assert sections["input_used"]["campaign"]["Audience_Logic"] == FORM["audience_logic"]
+    assert "".join(data for name, data in events if name == "token").strip()
+    assert events[-1][1]["provider"] == "offline"
+
+def test_a_bad_input_ends_the_stream_with_an_error():
+    events = _events({**FORM, "market": " "})
+    assert [name for name, _ in events] == ["error"]
+    assert "Market" in events[0][1]["message"]